@@ -1,8 +1,18 @@
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
 from rest_framework.exceptions import AuthenticationFailed
+from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
+from tasks.profiling import timed
+
+from .tokens import STAMP_CLAIM, acached_stamp, aremember_stamp, cached_stamp, remember_stamp
+
 class CookieJWTAuthentication(JWTAuthentication):
+    @timed('auth')
     def authenticate(self, request):
         if self._non_loggedin_request(request):
             return None
@@ -10,9 +20,9 @@ class CookieJWTAuthentication(JWTAuthentication):
         access_token = request.COOKIES.get('access_token')
         
         if access_token:
-            request.META['HTTP_AUTHORIZATION'] = f'Bearer {access_token}'
             try:
-                return super().authenticate(request)
+                validated_token = self.get_validated_token(access_token.encode())
+                return self.get_user(validated_token), validated_token
             except Exception:
                 raise AuthenticationFailed(
                     "Your session has expired. Please log in again."
@@ -22,6 +32,50 @@ class CookieJWTAuthentication(JWTAuthentication):
                 "You are not logged in. Please log in to access this resource."
             )
     
+    @timed('auth')
+    async def aauthenticate(self, request):
+        """
+        Async counterpart of `authenticate` for async views.
+
+        Token validation is pure CPU; only the user lookup touches the
+        database, through the async ORM.
+        """
+        if self._non_loggedin_request(request):
+            return None
+
+        access_token = request.COOKIES.get('access_token')
+        if not access_token:
+            raise AuthenticationFailed(
+                "You are not logged in. Please log in to access this resource."
+            )
+
+        try:
+            validated_token = self.get_validated_token(access_token.encode())
+            return await self.aget_user(validated_token), validated_token
+        except Exception:
+            raise AuthenticationFailed(
+                "Your session has expired. Please log in again."
+            )
+
+    async def aget_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        try:
+            user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
     def _non_loggedin_request(self, request):
         swagger_paths = [
             '/swagger/',
@@ -36,4 +90,68 @@ class CookieJWTAuthentication(JWTAuthentication):
         
         path = request.path
         return any(swagger_path in path for swagger_path in swagger_paths)
-    
\ No newline at end of file
+    
+
+
+class StatelessCookieJWTAuthentication(CookieJWTAuthentication):
+    """
+    Cookie JWT authentication that usually skips the user query.
+
+    Tokens issued by `StampedRefreshToken` carry `is_staff` and a stamp of the
+    user's password/is_staff/is_active. While that stamp matches the one
+    cached for the user, `request.user` is a `TokenUser` built from the
+    claims. A missing, expired (`JWT_USER_STAMP_TIMEOUT`) or different stamp
+    falls back to the regular database lookup, which re-caches it.
+    """
+
+    def get_user(self, validated_token):
+        token_user = self._token_user(validated_token)
+        if token_user is not None:
+            return token_user
+        user = super().get_user(validated_token)
+        remember_stamp(user)
+        return user
+
+    async def aget_user(self, validated_token):
+        token_user = await self._atoken_user(validated_token)
+        if token_user is not None:
+            return token_user
+        user = await super().aget_user(validated_token)
+        await aremember_stamp(user)
+        return user
+
+    def _token_user(self, validated_token):
+        user_id, stamp = self._claims(validated_token)
+        if stamp is not None and cached_stamp(user_id) == stamp:
+            return TokenUser(validated_token)
+        return None
+
+    async def _atoken_user(self, validated_token):
+        user_id, stamp = self._claims(validated_token)
+        if stamp is not None and await acached_stamp(user_id) == stamp:
+            return TokenUser(validated_token)
+        return None
+
+    def _claims(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or 'is_staff' not in validated_token:
+            return None, None
+        return user_id, validated_token.get(STAMP_CLAIM)
+
+
+def get_cookie_authentication_class():
+    """The cookie authentication class selected by `JWT_STATELESS_AUTH`."""
+    if getattr(settings, 'JWT_STATELESS_AUTH', False):
+        return StatelessCookieJWTAuthentication
+    return CookieJWTAuthentication
+
+
+class CookieAuthenticationMixin:
+    """
+    For API views authenticated by the JWT cookie. The class is looked up on
+    every request rather than at import, so a change to `JWT_STATELESS_AUTH`
+    (e.g. `override_settings` in tests) applies straight away.
+    """
+
+    def get_authenticators(self):
+        return [get_cookie_authentication_class()()]
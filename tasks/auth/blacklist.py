@@ -0,0 +1,269 @@
+"""
+Bloom filter in front of simplejwt's `BlacklistedToken` table.
+
+Refresh and logout check every refresh token against the blacklist. Almost
+all of those tokens are not blacklisted, so the filter answers "definitely
+not blacklisted" from memory and only possible members (real ones plus a
+`JWT_BLACKLIST_FILTER_ERROR_RATE` share of false positives) reach the
+database.
+
+* `LocalBloomFilter` keeps the bits in a bytearray; only writes made by the
+  same process are seen. Another worker's logout would go unnoticed, so it
+  is only used when `JWT_BLACKLIST_FILTER_SINGLE_PROCESS` says there is
+  exactly one server process; otherwise the blacklist is checked in the
+  database.
+* `RedisBloomFilter` keeps them in one Redis string (GETBIT/SETBIT), shared by
+  every worker process.
+
+A filter is filled from the table of unexpired blacklisted tokens in a
+background thread, started when the server loads (`warm_blacklist_filter`,
+called from tasks/wsgi.py and tasks/asgi.py) or, failing that, by the first
+lookup. `add` is called once every blacklist write commits. Until the
+rebuild finishes, lookups fall back to the database; no request waits for it.
+"""
+import hashlib
+import logging
+import math
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from tasks import metrics
+
+logger = logging.getLogger(__name__)
+
+READY_KEY = 'auth:blacklist:bloom:ready'
+BITS_KEY = 'auth:blacklist:bloom:bits'
+LOCK_KEY = 'auth:blacklist:bloom:lock'
+TOKEN_COUNTS_KEY = 'auth:token_counts'
+
+
+def bloom_size(capacity, error_rate):
+    """Optimal (bit count, hash count) for `capacity` items at `error_rate`."""
+    bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return bits, hashes
+
+
+def bit_positions(jti, bits, hashes):
+    # Kirsch-Mitzenmacher double hashing over one 128-bit digest.
+    digest = hashlib.blake2b(jti.encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+def blacklisted_jtis(chunk_size=10000):
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+    return (
+        BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+        .values_list('token__jti', flat=True)
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+class LocalBloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.bits, self.hashes = bloom_size(capacity, error_rate)
+        self._array = bytearray((self.bits + 7) // 8)
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self.ready = False
+
+    def add(self, jti):
+        with self._lock:
+            for position in bit_positions(jti, self.bits, self.hashes):
+                self._array[position >> 3] |= 1 << (position & 7)
+
+    def might_contain(self, jti):
+        """False means "not blacklisted"; None means the filter is still being built."""
+        if not self.ready:
+            return None
+        array = self._array
+        return all(array[p >> 3] & (1 << (p & 7)) for p in bit_positions(jti, self.bits, self.hashes))
+
+    def rebuild(self):
+        with self._rebuild_lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        # Writes during the rebuild go straight into the same bits, so none are lost.
+        with self._lock:
+            self.ready = False
+            self._array = bytearray(len(self._array))
+        for jti in blacklisted_jtis():
+            self.add(jti)
+        self.ready = True
+
+    def ensure_ready(self):
+        """Start a background rebuild unless the filter is ready or one is already running."""
+        if not self.ready and self._rebuild_lock.acquire(blocking=False):
+            _in_background(self._rebuild, self._rebuild_lock.release)
+
+
+class RedisBloomFilter:
+    def __init__(self, url, capacity, error_rate):
+        import redis
+
+        self.bits, self.hashes = bloom_size(capacity, error_rate)
+        self._redis = redis.Redis.from_url(url)
+
+    def add(self, jti):
+        pipe = self._redis.pipeline(transaction=False)
+        for position in bit_positions(jti, self.bits, self.hashes):
+            pipe.setbit(BITS_KEY, position, 1)
+        pipe.execute()
+
+    def might_contain(self, jti):
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.exists(READY_KEY)
+        for position in bit_positions(jti, self.bits, self.hashes):
+            pipe.getbit(BITS_KEY, position)
+        ready, *bits = pipe.execute()
+        if not ready:
+            return None
+        return all(bits)
+
+    def rebuild(self):
+        with self._redis.lock(LOCK_KEY, timeout=600):
+            self._rebuild()
+
+    def _rebuild(self, batch_size=1000):
+        self._redis.delete(READY_KEY, BITS_KEY)
+        pipe = self._redis.pipeline(transaction=False)
+        for count, jti in enumerate(blacklisted_jtis(), start=1):
+            for position in bit_positions(jti, self.bits, self.hashes):
+                pipe.setbit(BITS_KEY, position, 1)
+            if count % batch_size == 0:
+                pipe.execute()
+        pipe.set(READY_KEY, 1)
+        pipe.execute()
+
+    def ensure_ready(self):
+        """Start a background rebuild unless the key is ready or another process is rebuilding."""
+        if self._redis.exists(READY_KEY):
+            return
+        lock = self._redis.lock(LOCK_KEY, timeout=600)
+        if lock.acquire(blocking=False):
+            _in_background(self._rebuild, lock.release)
+
+
+def _in_background(rebuild, release):
+    def run():
+        try:
+            rebuild()
+        except Exception:
+            logger.exception('could not build the blacklist filter; lookups keep using the database')
+        finally:
+            release()
+            connection.close()
+
+    threading.Thread(target=run, name='blacklist-filter-rebuild', daemon=True).start()
+
+
+_filter = None
+_filter_lock = threading.Lock()
+
+
+def get_blacklist_filter(build=True):
+    """
+    The process-wide filter, or None when `JWT_BLACKLIST_FILTER` is off.
+
+    With `build=True` a background rebuild is started if the filter is not
+    ready yet; either way it may still be empty, in which case
+    `might_contain` returns None. That is also enough for `add`, since a
+    later rebuild reads committed blacklist rows anyway.
+    """
+    global _filter
+    with _filter_lock:
+        if _filter is None:
+            _filter = _make_filter()
+        bloom = _filter
+    if bloom is not None and build:
+        bloom.ensure_ready()
+    return bloom
+
+
+def warm_blacklist_filter():
+    """Start building the filter at server startup instead of on the first refresh."""
+    try:
+        get_blacklist_filter()
+    except Exception:
+        logger.exception('could not start the blacklist filter; lookups use the database')
+
+
+def reset_blacklist_filter():
+    global _filter
+    with _filter_lock:
+        _filter = None
+
+
+def _make_filter():
+    kind = getattr(settings, 'JWT_BLACKLIST_FILTER', None)
+    capacity = getattr(settings, 'JWT_BLACKLIST_FILTER_CAPACITY', 1_000_000)
+    error_rate = getattr(settings, 'JWT_BLACKLIST_FILTER_ERROR_RATE', 0.001)
+    if kind == 'redis':
+        return RedisBloomFilter(settings.REDIS_URL, capacity, error_rate)
+    if kind == 'local':
+        if not getattr(settings, 'JWT_BLACKLIST_FILTER_SINGLE_PROCESS', False):
+            # Another worker's blacklist writes would never reach this filter.
+            logger.warning("JWT_BLACKLIST_FILTER='local' needs JWT_BLACKLIST_FILTER_SINGLE_PROCESS; "
+                           'checking the blacklist in the database instead')
+            return None
+        return LocalBloomFilter(capacity, error_rate)
+    return None
+
+
+def is_blacklisted(jti):
+    """Blacklist membership, asking the database only when the filter can't rule `jti` out."""
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+    bloom = get_blacklist_filter()
+    if bloom is not None and bloom.might_contain(jti) is False:
+        return False
+    return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+def remember_blacklisted(jti):
+    bloom = get_blacklist_filter(build=False)
+    if bloom is not None:
+        bloom.add(jti)
+
+
+def token_counts(refresh=False):
+    """
+    Unexpired outstanding tokens and blacklisted tokens (unexpired, expired)
+    for /metrics. The three COUNTs are cached for `JWT_TOKEN_METRICS_TTL`
+    seconds so scrapes don't repeat them; `refresh` recounts, which the prune
+    job does after deleting.
+    """
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+    counts = None if refresh else cache.get(TOKEN_COUNTS_KEY)
+    if counts is None:
+        now = timezone.now()
+        counts = (
+            OutstandingToken.objects.filter(expires_at__gt=now).count(),
+            BlacklistedToken.objects.filter(token__expires_at__gt=now).count(),
+            BlacklistedToken.objects.filter(token__expires_at__lte=now).count(),
+        )
+        cache.set(TOKEN_COUNTS_KEY, counts, getattr(settings, 'JWT_TOKEN_METRICS_TTL', 60))
+    return counts
+
+
+@metrics.register_collector
+def _token_metrics(families):
+    outstanding, blacklisted, expired = token_counts()
+    return {
+        'jwt_outstanding_tokens': metrics.family('gauge', 'Refresh tokens issued and not yet expired.', [
+            ['jwt_outstanding_tokens', {}, outstanding],
+        ]),
+        'jwt_blacklisted_tokens': metrics.family('gauge', 'Blacklisted refresh tokens, by whether they have expired.', [
+            ['jwt_blacklisted_tokens', {'expired': 'false'}, blacklisted],
+            ['jwt_blacklisted_tokens', {'expired': 'true'}, expired],
+        ]),
+    }
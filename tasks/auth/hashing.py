@@ -0,0 +1,180 @@
+"""
+Password hashing and verification off the request worker.
+
+PBKDF2 costs tens of milliseconds of CPU per call. With
+`PASSWORD_HASH_WORKERS > 0` login and registration hash in a process pool of
+that size, so a burst of sign-ins competes for those processes instead of
+the CPU time of workers serving task traffic. Async code can await the pool
+(`amake_password`, `acheck_password`) without tying up a thread.
+
+Either way, at most `PASSWORD_HASH_MAX_PENDING` hashes may be queued or
+running; beyond that callers get `PasswordHashingBusy` (503 with
+Retry-After) straight away instead of piling up.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth import hashers
+from rest_framework.exceptions import APIException
+
+
+class PasswordHashingBusy(APIException):
+    status_code = 503
+    default_detail = 'Too many sign-in requests right now. Please retry shortly.'
+    default_code = 'password_hashing_busy'
+
+    def __init__(self, wait=1):
+        super().__init__()
+        self.wait = wait  # DRF's exception handler turns this into Retry-After
+
+
+def _init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+
+    django.setup()
+
+
+def _make_password(raw_password):
+    return hashers.make_password(raw_password)
+
+
+def _check_password(raw_password, encoded):
+    """Return `(is_correct, rehashed)`; `rehashed` is set when the stored hash is outdated."""
+    rehashed = []
+    is_correct = hashers.check_password(
+        raw_password, encoded, setter=lambda password: rehashed.append(hashers.make_password(password))
+    )
+    return is_correct, rehashed[0] if rehashed else None
+
+
+class PasswordHasherPool:
+    def __init__(self, workers=0, max_pending=32):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHashingBusy()
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def call(self, fn, *args):
+        if not self.workers:
+            with self.slot():
+                return fn(*args)
+        return self._submit(fn, *args).result()
+
+    async def acall(self, fn, *args):
+        if not self.workers:
+            return await sync_to_async(self.call, thread_sensitive=False)(fn, *args)
+        return await asyncio.wrap_future(self._submit(fn, *args))
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHashingBusy()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: forking a threaded server can deadlock the child.
+                self._executor = ProcessPoolExecutor(
+                    self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'tasks.settings'),),
+                )
+            return self._executor
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PasswordHasherPool(
+                workers=getattr(settings, 'PASSWORD_HASH_WORKERS', 0),
+                max_pending=getattr(settings, 'PASSWORD_HASH_MAX_PENDING', 32),
+            )
+        return _pool
+
+
+def reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = None
+
+
+def make_password(raw_password):
+    return get_pool().call(_make_password, raw_password)
+
+
+def check_password(raw_password, encoded):
+    return get_pool().call(_check_password, raw_password, encoded)
+
+
+async def amake_password(raw_password):
+    return await get_pool().acall(_make_password, raw_password)
+
+
+async def acheck_password(raw_password, encoded):
+    return await get_pool().acall(_check_password, raw_password, encoded)
+
+
+def authenticate_user(request, username, password):
+    """
+    `authenticate(request, username=..., password=...)` with the hashing done by the pool.
+
+    Without workers this is plain `authenticate()` under the pending-hash
+    limit. With workers it mirrors `ModelBackend`: unknown users still pay
+    for one hash, inactive users are refused, outdated hashes are upgraded.
+    """
+    pool = get_pool()
+    if not pool.workers:
+        with pool.slot():
+            return authenticate(request, username=username, password=password)
+
+    UserModel = get_user_model()
+    try:
+        user = UserModel._default_manager.get_by_natural_key(username)
+    except UserModel.DoesNotExist:
+        make_password(password)
+        return None
+
+    is_correct, rehashed = check_password(password, user.password)
+    if not is_correct or not getattr(user, 'is_active', True):
+        return None
+    if rehashed:
+        user.password = rehashed
+        user.save(update_fields=['password'])
+    return user
@@ -0,0 +1,31 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from auth.pruning import prune_expired_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Delete expired outstanding/blacklisted JWT refresh tokens in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--pause", type=float, default=0.0,
+                            help="Seconds to sleep between batches")
+        parser.add_argument("--every", type=int,
+                            help="Keep running, pruning every N seconds")
+
+    def handle(self, *args, **options):
+        while True:
+            result = prune_expired_tokens(batch_size=options["batch_size"], pause=options["pause"])
+            logger.info("Pruned expired tokens: %s", result.as_dict())
+            self.stdout.write(self.style.SUCCESS(
+                f"Removed {result.outstanding} outstanding and {result.blacklisted} blacklisted tokens "
+                f"in {result.batches} batches, {result.elapsed:.2f}s"
+            ))
+            if not options["every"]:
+                return
+            time.sleep(options["every"])
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Index simplejwt's outstanding tokens by expiry, for prune_expired_tokens and blacklist rebuilds."""
+
+    dependencies = [
+        ('token_blacklist', '0013_alter_blacklistedtoken_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS token_outstanding_expires_idx '
+                'ON token_blacklist_outstandingtoken (expires_at, id)',
+            reverse_sql='DROP INDEX IF EXISTS token_outstanding_expires_idx',
+        ),
+    ]
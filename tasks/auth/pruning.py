@@ -0,0 +1,55 @@
+import time
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .blacklist import token_counts
+
+
+@dataclass
+class PruneResult:
+    outstanding: int = 0
+    blacklisted: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+
+    def as_dict(self):
+        return {
+            'outstanding': self.outstanding,
+            'blacklisted': self.blacklisted,
+            'batches': self.batches,
+            'elapsed': round(self.elapsed, 3),
+        }
+
+
+def prune_expired_tokens(batch_size=1000, pause=0.0, now=None):
+    """
+    Delete expired outstanding tokens and their blacklist entries.
+
+    Works through `token_outstanding_expires_idx` in batches of `batch_size`,
+    one short transaction each, sleeping `pause` seconds in between so other
+    writers get the table back. Unlike simplejwt's `flushexpiredtokens`, no
+    single statement touches more than one batch.
+    """
+    cutoff = now or timezone.now()
+    result = PruneResult()
+    started = time.perf_counter()
+    while True:
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lte=cutoff)
+            .order_by('expires_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        with transaction.atomic():
+            result.blacklisted += BlacklistedToken.objects.filter(token_id__in=ids).delete()[0]
+            result.outstanding += OutstandingToken.objects.filter(id__in=ids).delete()[0]
+        result.batches += 1
+        if pause and len(ids) == batch_size:
+            time.sleep(pause)
+    result.elapsed = time.perf_counter() - started
+    token_counts(refresh=True)  # publish the new gauges now rather than after their TTL
+    return result
@@ -1,6 +1,12 @@
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from django.contrib.auth.models import User
 
+from .hashing import make_password
+from .tokens import StampedRefreshToken
+
 
 class RegisterSerializer(serializers.Serializer):
     first_name = serializers.CharField()
@@ -30,13 +36,15 @@ class RegisterSerializer(serializers.Serializer):
     def create(self, validated_data):
         validated_data.pop("confirm_password")
 
-        user = User.objects.create_user(
-            username=validated_data["email"],
+        # What create_user() does, with the hashing done by auth.hashing's pool.
+        user = User(
+            username=User.normalize_username(validated_data["email"]),
             first_name=validated_data["first_name"],
             last_name=validated_data["last_name"],
-            email=validated_data["email"],
-            password=validated_data["password"],
+            email=User.objects.normalize_email(validated_data["email"]),
+            password=make_password(validated_data["password"]),
         )
+        user.save()
 
         return user
 
@@ -47,6 +55,33 @@ class LoginSerializer(serializers.Serializer):
 class LogoutSerializer(serializers.Serializer):
     refresh = serializers.CharField(required=False)  
 
+class CookieTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Rotates (and blacklists) refresh tokens per SIMPLE_JWT, keeping the stamped claims.
+
+    Same steps as simplejwt's `validate`, but the user is loaded once, through
+    `StampedRefreshToken.user`, instead of once per step.
+    """
+    token_class = StampedRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        user = refresh.user
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+
+        data = {"access": str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data["refresh"] = str(refresh)
+        return data
+
+
 class UserResponseSerializer(serializers.Serializer):
     id = serializers.IntegerField()
     email = serializers.EmailField()
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .blacklist import remember_blacklisted
+from .tokens import forget_stamp, remember_stamp
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def refresh_user_stamp(sender, instance, **kwargs):
+    # Tokens minted before a password/is_staff/is_active change stop matching at once.
+    remember_stamp(instance)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def drop_user_stamp(sender, instance, **kwargs):
+    forget_stamp(instance.pk)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def add_to_blacklist_filter(sender, instance, created, **kwargs):
+    if created:
+        jti = instance.token.jti
+        transaction.on_commit(lambda: remember_blacklisted(jti))
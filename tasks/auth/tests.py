@@ -1,11 +1,37 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient, APIRequestFactory
 from rest_framework.response import Response
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from tasks.queries import QueryBudgetExceeded, assert_max_queries
+
+from .auth import StatelessCookieJWTAuthentication
+from .blacklist import (
+	LocalBloomFilter, get_blacklist_filter, is_blacklisted, reset_blacklist_filter, token_counts,
+)
+from .hashing import acheck_password, amake_password, get_pool, reset_pool
+from .pruning import prune_expired_tokens
+from .throttling import MemoryBuckets, parse_rate, reset_buckets
+
 from .serializers import RegisterSerializer
+from .tokens import StampedRefreshToken
+from .views import LoginAPI, RefreshTokenAPI
 from .utils import set_tokens_cookies, delete_tokens_cookies
 
 
@@ -135,3 +161,304 @@ class AuthTests(TestCase):
 		self.assertIn('access_token', logout_resp.cookies)
 		self.assertTrue(logout_resp.cookies['access_token'].value == '' or logout_resp.cookies['access_token']['max-age'] == '0')
 
+
+
+class StatelessCookieJWTAuthenticationTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.factory = APIRequestFactory()
+		self.user = User.objects.create_user(username='stateless@example.com', password='pass12345', is_staff=True)
+
+	def authenticate(self, token):
+		request = self.factory.get('/api/tasks/')
+		request.COOKIES = {'access_token': str(token.access_token)}
+		user, _ = StatelessCookieJWTAuthentication().authenticate(request)
+		return user
+
+	def test_current_stamp_skips_user_query(self):
+		token = StampedRefreshToken.for_user(self.user)
+		with self.assertNumQueries(0):
+			user = self.authenticate(token)
+		self.assertIsInstance(user, TokenUser)
+		self.assertEqual(user.id, str(self.user.pk))
+		self.assertTrue(user.is_staff)
+
+	def test_stale_claims_fall_back_to_database(self):
+		token = StampedRefreshToken.for_user(self.user)
+		self.user.is_staff = False
+		self.user.save()
+
+		with self.assertNumQueries(1):
+			user = self.authenticate(token)
+		self.assertIsInstance(user, User)
+		self.assertFalse(user.is_staff)
+
+	def test_expired_stamp_is_reloaded_and_cached(self):
+		token = StampedRefreshToken.for_user(self.user)
+		cache.clear()
+
+		with self.assertNumQueries(1):
+			self.assertIsInstance(self.authenticate(token), User)
+		with self.assertNumQueries(0):
+			self.assertIsInstance(self.authenticate(token), TokenUser)
+
+	def test_unstamped_token_uses_database(self):
+		token = RefreshToken.for_user(self.user)
+		with self.assertNumQueries(1):
+			user = self.authenticate(token)
+		self.assertIsInstance(user, User)
+
+	def test_inactive_user_is_rejected(self):
+		token = StampedRefreshToken.for_user(self.user)
+		self.user.is_active = False
+		self.user.save()
+
+		with self.assertRaises(AuthenticationFailed):
+			self.authenticate(token)
+
+	def test_task_views_follow_the_setting_per_request(self):
+		client = APIClient()
+		client.cookies['access_token'] = str(StampedRefreshToken.for_user(self.user).access_token)
+		for stateless, user_loads in ((True, 0), (False, 1)):
+			with self.subTest(stateless=stateless), override_settings(JWT_STATELESS_AUTH=stateless), \
+					CaptureQueriesContext(connection) as ctx:
+				self.assertEqual(client.get('/api/tasks/').status_code, 200)
+			loads = [q['sql'] for q in ctx.captured_queries if 'FROM "auth_user"' in q['sql']]
+			self.assertEqual(len(loads), user_loads)
+
+
+@override_settings(JWT_BLACKLIST_FILTER='local', JWT_BLACKLIST_FILTER_SINGLE_PROCESS=True)
+class TokenBlacklistFilterTests(TestCase):
+	def setUp(self):
+		reset_blacklist_filter()
+		self.addCleanup(reset_blacklist_filter)
+		self.client = APIClient()
+		self.user = User.objects.create_user(username='rotate@example.com', email='rotate@example.com', password='pass12345')
+
+	def build_filter(self):
+		bloom = get_blacklist_filter(build=False)
+		bloom.rebuild()
+		return bloom
+
+	def test_bloom_filter_has_no_false_negatives(self):
+		bloom = LocalBloomFilter(capacity=1000, error_rate=0.01)
+		bloom.rebuild()
+		members = [f'member-{i}' for i in range(1000)]
+		for jti in members:
+			bloom.add(jti)
+
+		self.assertTrue(all(bloom.might_contain(jti) for jti in members))
+		false_positives = sum(bool(bloom.might_contain(f'other-{i}')) for i in range(10000))
+		self.assertLess(false_positives, 300)
+
+	def test_filter_is_rebuilt_from_blacklist_table(self):
+		token = StampedRefreshToken.for_user(self.user)
+		token.blacklist()
+		bloom = self.build_filter()
+		self.assertTrue(bloom.might_contain(str(token['jti'])))
+
+	def test_valid_refresh_token_skips_blacklist_query(self):
+		raw = str(StampedRefreshToken.for_user(self.user))
+		self.build_filter()
+		with self.assertNumQueries(0):
+			StampedRefreshToken(raw)
+
+	def test_refresh_rotates_and_blacklists_old_token(self):
+		old = str(StampedRefreshToken.for_user(self.user))
+		self.build_filter()
+		self.client.cookies['refresh_token'] = old
+
+		with self.captureOnCommitCallbacks(execute=True):
+			response = self.client.post('/refresh/')
+		self.assertEqual(response.status_code, 200)
+		self.assertNotEqual(response.cookies['refresh_token'].value, old)
+
+		self.client.cookies['refresh_token'] = old
+		response = self.client.post('/refresh/')
+		self.assertEqual(response.status_code, 400)
+
+	def test_lookups_use_the_database_while_the_filter_builds(self):
+		token = StampedRefreshToken.for_user(self.user)
+		token.blacklist()
+		bloom = get_blacklist_filter(build=False)
+		bloom._rebuild_lock.acquire()  # a rebuild is running elsewhere
+		try:
+			with self.assertNumQueries(1):
+				self.assertTrue(is_blacklisted(str(token['jti'])))
+			self.assertFalse(bloom.ready)
+		finally:
+			bloom._rebuild_lock.release()
+
+	@override_settings(JWT_BLACKLIST_FILTER_SINGLE_PROCESS=False)
+	def test_local_filter_needs_a_single_process(self):
+		with self.assertLogs('auth.blacklist', 'WARNING'):
+			self.assertIsNone(get_blacklist_filter())
+
+
+class AuthQueryBudgetTests(TestCase):
+	def setUp(self):
+		reset_buckets()
+		self.client = APIClient()
+		self.user = User.objects.create_user(username='budget@example.com', email='budget@example.com', password='pass12345')
+
+	def test_login_within_budget(self):
+		with assert_max_queries(LoginAPI.query_budget, repeat_threshold=2):
+			response = self.client.post('/login/', {'email': 'budget@example.com', 'password': 'pass12345'}, format='json')
+		self.assertEqual(response.status_code, 200)
+
+	def test_refresh_within_budget(self):
+		self.client.cookies['refresh_token'] = str(StampedRefreshToken.for_user(self.user))
+		with assert_max_queries(RefreshTokenAPI.query_budget):
+			self.assertEqual(self.client.post('/refresh/').status_code, 200)
+
+	def test_refresh_loads_the_user_once(self):
+		self.client.cookies['refresh_token'] = str(StampedRefreshToken.for_user(self.user))
+		with CaptureQueriesContext(connection) as ctx:
+			self.assertEqual(self.client.post('/refresh/').status_code, 200)
+		user_loads = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT') and 'FROM "auth_user"' in q['sql']]
+		self.assertEqual(len(user_loads), 1, user_loads)
+
+	def test_refresh_for_a_deleted_user_is_rejected(self):
+		self.client.cookies['refresh_token'] = str(StampedRefreshToken.for_user(self.user))
+		self.user.delete()
+		# As for an inactive user: AuthenticationFailed, a 403 on this unauthenticated view.
+		self.assertEqual(self.client.post('/refresh/').status_code, 403)
+
+	def test_view_over_budget_fails_the_test(self):
+		self.client.cookies['refresh_token'] = str(StampedRefreshToken.for_user(self.user))
+		original = RefreshTokenAPI.query_budget
+		RefreshTokenAPI.query_budget = 1
+		try:
+			with self.assertRaisesMessage(QueryBudgetExceeded, 'over its budget of 1'):
+				self.client.post('/refresh/')
+		finally:
+			RefreshTokenAPI.query_budget = original
+
+
+class PruneExpiredTokensTests(TestCase):
+	def setUp(self):
+		now = timezone.now()
+		self.expired = [
+			OutstandingToken.objects.create(jti=f'expired-{i}', token='', expires_at=now - timedelta(hours=1))
+			for i in range(5)
+		]
+		self.live = OutstandingToken.objects.create(jti='live', token='', expires_at=now + timedelta(days=1))
+		for token in self.expired[:3] + [self.live]:
+			BlacklistedToken.objects.create(token=token)
+
+	def test_prunes_only_expired_tokens_in_batches(self):
+		result = prune_expired_tokens(batch_size=2)
+		self.assertEqual((result.outstanding, result.blacklisted, result.batches), (5, 3, 3))
+		self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), ['live'])
+		self.assertTrue(BlacklistedToken.objects.filter(token=self.live).exists())
+
+	def test_token_counts_are_cached_until_the_next_prune(self):
+		token_counts(refresh=True)
+		with self.assertNumQueries(0):
+			self.assertEqual(token_counts(), (1, 1, 3))
+
+		prune_expired_tokens(batch_size=10)
+		with self.assertNumQueries(0):
+			self.assertEqual(token_counts(), (1, 1, 0))
+
+	def test_command_reports_counts(self):
+		out = StringIO()
+		call_command('prune_expired_tokens', '--batch-size', '10', stdout=out)
+		self.assertIn('Removed 5 outstanding and 3 blacklisted tokens', out.getvalue())
+
+	@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+	def test_expiry_scan_uses_index(self):
+		query = OutstandingToken.objects.filter(expires_at__lte=timezone.now()).order_by('expires_at', 'id')
+		sql, params = query.values_list('id', flat=True)[:10].query.sql_with_params()
+		with connection.cursor() as cursor:
+			cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+			plan = ' '.join(str(row) for row in cursor.fetchall())
+		self.assertIn('token_outstanding_expires_idx', plan)
+
+
+class PasswordHashingPoolTests(TestCase):
+	def setUp(self):
+		reset_pool()
+		reset_buckets()
+		self.addCleanup(reset_pool)
+		self.client = APIClient()
+		User.objects.create_user(username='hash@example.com', email='hash@example.com', password='mypassword')
+
+	def login(self, password='mypassword'):
+		return self.client.post('/login/', {'email': 'hash@example.com', 'password': password}, format='json')
+
+	@override_settings(PASSWORD_HASH_MAX_PENDING=1)
+	def test_saturated_pool_returns_503_with_retry_after(self):
+		with get_pool().slot():
+			response = self.login()
+		self.assertEqual(response.status_code, 503)
+		self.assertEqual(response['Retry-After'], '1')
+		self.assertEqual(self.login().status_code, 200)
+
+	@override_settings(PASSWORD_HASH_WORKERS=1)
+	def test_login_and_register_hash_in_worker_process(self):
+		self.assertEqual(self.login().status_code, 200)
+		self.assertEqual(self.login('wrong').status_code, 401)
+
+		response = self.client.post('/register/', {
+			'first_name': 'Pool', 'last_name': 'User', 'email': 'pool@example.com',
+			'password': 'Password123', 'confirm_password': 'Password123',
+		}, format='json')
+		self.assertEqual(response.status_code, 201)
+		self.assertTrue(User.objects.get(username='pool@example.com').check_password('Password123'))
+
+	@override_settings(PASSWORD_HASH_WORKERS=1)
+	def test_async_callers_await_the_pool(self):
+		async def scenario():
+			encoded = await amake_password('secret')
+			return await acheck_password('secret', encoded)
+
+		self.assertEqual(async_to_sync(scenario)(), (True, None))
+
+
+def throttle_rates(**rates):
+	return override_settings(REST_FRAMEWORK={
+		**settings.REST_FRAMEWORK,
+		'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], **rates},
+	})
+
+
+class TokenBucketThrottleTests(TestCase):
+	def setUp(self):
+		reset_buckets()
+		self.addCleanup(reset_buckets)
+		self.client = APIClient()
+
+	def test_bucket_allows_burst_then_reports_wait(self):
+		buckets = MemoryBuckets()
+		self.assertEqual([buckets.take('k', 2, 1.0) for _ in range(2)], [0, 0])
+		wait = buckets.take('k', 2, 1.0)
+		self.assertGreater(wait, 0.9)
+		self.assertLessEqual(wait, 1.0)
+		self.assertEqual(buckets.take('other', 2, 1.0), 0)
+
+	def test_parse_rate(self):
+		self.assertEqual(parse_rate('10/min'), (10, 10 / 60))
+		self.assertEqual(parse_rate('5/second'), (5, 5.0))
+
+	@throttle_rates(login='2/min')
+	def test_login_is_throttled_per_email_with_retry_after(self):
+		payload = {'email': 'limit@example.com', 'password': 'wrong'}
+		for _ in range(2):
+			self.assertEqual(self.client.post('/login/', payload, format='json').status_code, 401)
+
+		response = self.client.post('/login/', payload, format='json')
+		self.assertEqual(response.status_code, 429)
+		self.assertTrue(1 <= int(response['Retry-After']) <= 30)
+
+		other = {'email': 'other@example.com', 'password': 'wrong'}
+		self.assertEqual(self.client.post('/login/', other, format='json').status_code, 401)
+
+	@throttle_rates(task_write='1/min')
+	def test_task_writes_are_throttled_per_user_but_reads_are_not(self):
+		user = User.objects.create_user(username='writer@example.com', password='pass12345')
+		self.client.cookies['access_token'] = str(StampedRefreshToken.for_user(user).access_token)
+
+		self.assertEqual(self.client.post('/api/tasks/', {'title': 'One'}, format='json').status_code, 201)
+		self.assertEqual(self.client.post('/api/tasks/', {'title': 'Two'}, format='json').status_code, 429)
+		self.assertEqual(self.client.get('/api/tasks/').status_code, 200)
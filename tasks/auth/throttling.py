@@ -0,0 +1,173 @@
+"""
+Token-bucket throttling for DRF views.
+
+Each scope's rate ("10/min") gives the bucket size (10) and the refill speed
+(10 tokens per minute); a request spends one token, so short bursts up to the
+bucket size pass and sustained traffic is held to the rate. Rates live in
+`REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']` like DRF's own throttles; a view
+can pick its scope with `throttle_scope`.
+
+Buckets are kept in Redis and updated by one Lua script call (atomic, one
+round trip) when `THROTTLE_BACKEND` is "redis", and in a process-local dict
+otherwise. Rejected requests get 429 with `Retry-After`.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'10/min' -> (capacity 10, refill 10/60 tokens per second)."""
+    count, period = rate.split('/')
+    return int(count), int(count) / PERIODS[period[0]]
+
+
+class MemoryBuckets:
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        """Spend one token; return 0 if allowed, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - ts) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)  # least recently used
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisBuckets:
+    def __init__(self, url):
+        import redis
+
+        self._script = redis.Redis.from_url(url).register_script(TOKEN_BUCKET_LUA)
+
+    def take(self, key, capacity, rate):
+        return float(self._script(keys=[key], args=[capacity, rate]))
+
+
+_buckets = None
+_buckets_lock = threading.Lock()
+
+
+def get_buckets():
+    global _buckets
+    with _buckets_lock:
+        if _buckets is None:
+            if getattr(settings, 'THROTTLE_BACKEND', 'memory') == 'redis':
+                _buckets = RedisBuckets(settings.REDIS_URL)
+            else:
+                _buckets = MemoryBuckets()
+        return _buckets
+
+
+def reset_buckets():
+    global _buckets
+    with _buckets_lock:
+        _buckets = None
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle keyed on client IP; subclasses key on the user or the submitted email."""
+    scope = None
+
+    def get_scope(self, view):
+        return getattr(view, 'throttle_scope', None) or self.scope
+
+    def get_ident_key(self, request):
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+        capacity, refill = parse_rate(rate)
+        key = f'throttle:{scope}:{self.get_ident_key(request)}'
+        self._wait = get_buckets().take(key, capacity, refill)
+        return self._wait == 0
+
+    def wait(self):
+        return self._wait
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return super().get_ident_key(request)
+
+
+class EmailTokenBucketThrottle(TokenBucketThrottle):
+    """Keys on the submitted email, so spreading guesses for one account over many IPs does not help."""
+
+    def get_ident_key(self, request):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if isinstance(email, str) and email:
+            return f'email:{email.strip().lower()}'
+        return super().get_ident_key(request)
+
+
+class LoginRateThrottle(EmailTokenBucketThrottle):
+    scope = 'login'
+
+
+class LoginIPRateThrottle(TokenBucketThrottle):
+    scope = 'login_ip'
+
+
+class RegisterRateThrottle(TokenBucketThrottle):
+    scope = 'register'
+
+
+class RefreshRateThrottle(TokenBucketThrottle):
+    scope = 'refresh'
+
+
+class WriteRateThrottle(UserTokenBucketThrottle):
+    """Limits unsafe methods only; reads are served from cache and stay unthrottled."""
+    scope = 'task_write'
+
+    def allow_request(self, request, view):
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            return True
+        return super().allow_request(request, view)
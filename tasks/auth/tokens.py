@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch, get_md5_hash_password
+
+from .blacklist import is_blacklisted
+
+STAMP_CLAIM = 'ver'
+_NOT_LOADED = object()
+
+
+def user_stamp(user):
+    """Changes whenever the password, is_staff or is_active of `user` changes."""
+    return get_md5_hash_password(f'{user.password}|{user.is_staff}|{user.is_active}')[:16]
+
+
+class StampedRefreshToken(RefreshToken):
+    """
+    Refresh token carrying `is_staff` and the user's stamp.
+
+    Both claims are copied into its access tokens, so
+    `StatelessCookieJWTAuthentication` can authorize requests from the token
+    alone while the stamp is still current. Blacklist checks go through the
+    Bloom filter in `auth.blacklist`.
+
+    The token's user is loaded at most once (`user`): a refresh checks it,
+    blacklists the token and outstands its successor, and simplejwt would
+    load it for each step.
+    """
+    _user = _NOT_LOADED
+
+    @property
+    def user(self):
+        """The user named by the token, or None if there is no such user."""
+        if self._user is _NOT_LOADED:
+            user_id = self.payload.get(api_settings.USER_ID_CLAIM)
+            self._user = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        return self._user
+
+    def check_blacklist(self):
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def _outstanding(self):
+        # The user is a callable default: only loaded when the row has to be created.
+        return OutstandingToken.objects.get_or_create(
+            jti=self.payload[api_settings.JTI_CLAIM],
+            defaults={
+                'user': lambda: self.user,
+                'created_at': self.current_time,
+                'token': str(self),
+                'expires_at': datetime_from_epoch(self.payload['exp']),
+            },
+        )
+
+    def blacklist(self):
+        token, _ = self._outstanding()
+        return BlacklistedToken.objects.get_or_create(token=token)
+
+    def outstand(self):
+        return self._outstanding()
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['is_staff'] = user.is_staff
+        token[STAMP_CLAIM] = user_stamp(user)
+        return token
+
+
+def _stamp_cache():
+    return caches[getattr(settings, 'JWT_USER_STAMP_CACHE_ALIAS', 'default')]
+
+
+def _stamp_key(user_id):
+    return f'auth:stamp:{user_id}'
+
+
+def _stamp_timeout():
+    return getattr(settings, 'JWT_USER_STAMP_TIMEOUT', 60)
+
+
+def cached_stamp(user_id):
+    return _stamp_cache().get(_stamp_key(user_id))
+
+
+async def acached_stamp(user_id):
+    return await _stamp_cache().aget(_stamp_key(user_id))
+
+
+def remember_stamp(user):
+    _stamp_cache().set(_stamp_key(user.pk), user_stamp(user), _stamp_timeout())
+
+
+async def aremember_stamp(user):
+    await _stamp_cache().aset(_stamp_key(user.pk), user_stamp(user), _stamp_timeout())
+
+
+def forget_stamp(user_id):
+    _stamp_cache().delete(_stamp_key(user_id))
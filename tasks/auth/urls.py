@@ -1,9 +1,10 @@
 from django.urls import path
-from .views import RegisterView, LoginAPI, LogoutAPI, ProfileAPI
+from .views import RegisterView, LoginAPI, LogoutAPI, RefreshTokenAPI, ProfileAPI
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginAPI.as_view(), name='login'),
     path('logout/', LogoutAPI.as_view(), name='logout'),
+    path('refresh/', RefreshTokenAPI.as_view(), name='refresh'),
     path('profile/', ProfileAPI.as_view(), name='profile'),
 ]
\ No newline at end of file
@@ -4,9 +4,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from rest_framework.response import Response
 from drf_spectacular.utils import extend_schema, OpenApiExample, OpenApiResponse
-from django.contrib.auth import authenticate
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework import status
@@ -14,11 +12,15 @@ from .utils import set_tokens_cookies, delete_tokens_cookies
 from rest_framework.generics import GenericAPIView
 
 from .auth import CookieJWTAuthentication
+from .hashing import authenticate_user
+from .throttling import LoginIPRateThrottle, LoginRateThrottle, RefreshRateThrottle, RegisterRateThrottle
+from .tokens import StampedRefreshToken
 
 # Import all serializers
 from .serializers import (
     RegisterSerializer, 
     LoginSerializer, 
+    CookieTokenRefreshSerializer,
     LogoutSerializer,
     LoginResponseSerializer,
     RegisterResponseSerializer,
@@ -32,6 +34,8 @@ from .serializers import (
 class RegisterView(GenericAPIView):
     authentication_classes = []   
     permission_classes = [AllowAny]
+    throttle_classes = [RegisterRateThrottle]
+    query_budget = 3
     serializer_class = RegisterSerializer
 
     @extend_schema(
@@ -73,7 +77,7 @@ class RegisterView(GenericAPIView):
         if serializer.is_valid():
             user = serializer.save()
             
-            refresh = RefreshToken.for_user(user)
+            refresh = StampedRefreshToken.for_user(user)
             
             response_data = {
                 "message": "User registered successfully",
@@ -100,6 +104,8 @@ class RegisterView(GenericAPIView):
 @method_decorator(csrf_exempt, name='dispatch')
 class LoginAPI(GenericAPIView):
     permission_classes = [AllowAny]
+    throttle_classes = [LoginRateThrottle, LoginIPRateThrottle]
+    query_budget = 2
     serializer_class = LoginSerializer
 
     @extend_schema(
@@ -143,12 +149,12 @@ class LoginAPI(GenericAPIView):
         email = serializer.validated_data['email']
         password = serializer.validated_data['password']
 
-        user = authenticate(request, username=email, password=password)
+        user = authenticate_user(request, username=email, password=password)
 
         if user is None:
             return Response({"error": "Invalid email or password"}, status=status.HTTP_401_UNAUTHORIZED)
 
-        refresh = RefreshToken.for_user(user)
+        refresh = StampedRefreshToken.for_user(user)
         
         response_data = {
             "message": "Login successful",
@@ -175,6 +181,7 @@ class LoginAPI(GenericAPIView):
 class LogoutAPI(GenericAPIView):
     permission_classes = [IsAuthenticated]
     authentication_classes = [CookieJWTAuthentication, JWTAuthentication]  # Both for fallback
+    query_budget = 8
     serializer_class = LogoutSerializer
 
     @extend_schema(
@@ -200,7 +207,7 @@ class LogoutAPI(GenericAPIView):
             
             if refresh_token:
                 try:
-                    token = RefreshToken(refresh_token)
+                    token = StampedRefreshToken(refresh_token)
                     token.blacklist()
                 except TokenError:
                     pass
@@ -220,7 +227,10 @@ class LogoutAPI(GenericAPIView):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class RefreshTokenAPI(GenericAPIView):
+    authentication_classes = []
     permission_classes = [AllowAny]
+    throttle_classes = [RefreshRateThrottle]
+    query_budget = 11
     serializer_class = LogoutSerializer
 
     @extend_schema(
@@ -247,7 +257,9 @@ class RefreshTokenAPI(GenericAPIView):
             if not refresh_token:
                 return Response({"error": "Refresh token not found"}, status=status.HTTP_400_BAD_REQUEST)
             
-            token = RefreshToken(refresh_token)
+            serializer = CookieTokenRefreshSerializer(data={"refresh": refresh_token})
+            serializer.is_valid(raise_exception=True)
+            tokens = serializer.validated_data
             
             response = Response({
                 "message": "Token refreshed successfully"
@@ -255,8 +267,8 @@ class RefreshTokenAPI(GenericAPIView):
             
             response = set_tokens_cookies(
                 response, 
-                str(token.access_token), 
-                str(token)
+                tokens["access"], 
+                tokens.get("refresh", refresh_token)
             )
             
             return response
@@ -271,6 +283,7 @@ class RefreshTokenAPI(GenericAPIView):
 class ProfileAPI(GenericAPIView):
     permission_classes = [IsAuthenticated]
     authentication_classes = [CookieJWTAuthentication, JWTAuthentication] 
+    query_budget = 1
     serializer_class = None
 
     @extend_schema(
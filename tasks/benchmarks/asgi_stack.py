@@ -0,0 +1,125 @@
+"""
+DRF (sync) vs ASGI-native (async) task views, driven through tasks.asgi's
+ASGI handler in-process at a fixed number of concurrent requests.
+
+    python -m benchmarks.asgi_stack --rows 20000 --concurrency 200 --requests 2000
+
+Both stacks are mounted side by side (/sync/... and /async/...), so one run
+compares them on the same data. The response cache is off unless --cache is
+given, so every request reaches the ORM. With SQLite every query still runs
+on Django's single sync thread either way; the async stack's gain is that
+waiting requests cost a coroutine instead of a blocked worker thread.
+"""
+import argparse
+import asyncio
+import sys
+import time
+import types
+
+from benchmarks.common import make_client, print_row, seed_tasks, setup_django
+
+
+def install_urlconf():
+    from django.urls import path
+
+    from task_manager.async_views import AsyncTaskDetailView, AsyncTaskListCreateView
+    from task_manager.views import TaskDetailAPI, TaskListCreateAPI
+
+    module = types.ModuleType("benchmarks_asgi_urls")
+    module.urlpatterns = [
+        path("sync/tasks/", TaskListCreateAPI.as_view()),
+        path("sync/tasks/<int:pk>/", TaskDetailAPI.as_view()),
+        path("async/tasks/", AsyncTaskListCreateView.as_view()),
+        path("async/tasks/<int:pk>/", AsyncTaskDetailView.as_view()),
+    ]
+    sys.modules[module.__name__] = module
+    return module.__name__
+
+
+async def call(app, path, query, cookie):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"testserver"), (b"cookie", cookie)],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+    body_sent = False
+    status = None
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()  # never disconnects; Django cancels this when the response is done
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    return status, (time.perf_counter() - start) * 1000
+
+
+async def load(app, stack, cookie, total, concurrency, detail_pk):
+    semaphore = asyncio.Semaphore(concurrency)
+    targets = [
+        (f"/{stack}/tasks/", "page=2"),
+        (f"/{stack}/tasks/", "completed=true&pagination=cursor"),
+        (f"/{stack}/tasks/{detail_pk}/", ""),
+    ]
+
+    async def one(i):
+        async with semaphore:
+            path, query = targets[i % len(targets)]
+            return await call(app, path, query, cookie)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+
+    errors = sum(1 for status, _ in results if status != 200)
+    samples = [latency for _, latency in results]
+    print_row(f"{stack} c={concurrency}", samples)
+    print(f"{'':<40} {total / elapsed:8.0f} req/s  errors={errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--cache", action="store_true", help="leave the task response cache on")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.core.asgi import get_asgi_application
+
+    from task_manager.models import Task
+
+    settings.ROOT_URLCONF = install_urlconf()
+    settings.TASK_CACHE_ENABLED = args.cache
+    seed_tasks(args.rows)
+    client = make_client()
+    cookie = f"access_token={client.cookies['access_token'].value}".encode()
+    detail_pk = Task.objects.order_by("id").values_list("id", flat=True).first()
+
+    app = get_asgi_application()
+    for concurrency in args.concurrency:
+        for stack in ("sync", "async"):
+            asyncio.run(load(app, stack, cookie, args.requests, concurrency, detail_pk))
+
+
+if __name__ == "__main__":
+    main()
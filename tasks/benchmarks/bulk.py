@@ -0,0 +1,50 @@
+"""
+Bulk endpoint vs one request per task, for create and delete.
+
+    python -m benchmarks.bulk --items 1000 --batch 500
+"""
+import argparse
+import time
+
+from benchmarks.common import make_client, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    from task_manager.models import Task
+
+    client = make_client(is_staff=True)
+    payload = [{"title": f"Task {i}", "description": "imported"} for i in range(args.items)]
+
+    def report(label, elapsed):
+        print(f"{label:<28} {elapsed * 1000:9.1f}ms  {args.items / elapsed:10.0f} tasks/s")
+
+    start = time.perf_counter()
+    for item in payload:
+        client.post("/api/tasks/", item, format="json")
+    report("create, per item", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for pk in list(Task.objects.values_list("id", flat=True)):
+        client.delete(f"/api/tasks/{pk}/")
+    report("delete, per item", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for offset in range(0, args.items, args.batch):
+        client.post("/api/tasks/bulk/", payload[offset:offset + args.batch], format="json")
+    report(f"create, bulk x{args.batch}", time.perf_counter() - start)
+
+    ids = list(Task.objects.values_list("id", flat=True))
+    start = time.perf_counter()
+    for offset in range(0, len(ids), args.batch):
+        client.delete("/api/tasks/bulk/", {"ids": ids[offset:offset + args.batch]}, format="json")
+    report(f"delete, bulk x{args.batch}", time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Shared setup for the offline benchmark scripts.
+
+Every script runs against a throwaway in-memory test database, never against
+`db.sqlite3`. Run them from the `tasks/` directory, e.g.
+
+    python -m benchmarks.pagination --rows 200000
+"""
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tasks.settings")
+
+
+def setup_django(database=None):
+    """Create the throwaway test database; with `database` (an SQLite path) it is kept and reused."""
+    import django
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    django.setup()
+    setup_test_environment()
+    if database:
+        settings.DATABASES["default"].setdefault("TEST", {})["NAME"] = str(database)
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=bool(database))
+
+
+def make_client(email="bench@example.com", is_staff=False):
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIClient
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    user = User.objects.filter(username=email).first()
+    if user is None:
+        user = User.objects.create_user(username=email, email=email, password="bench-pass", is_staff=is_staff)
+    refresh = RefreshToken.for_user(user)
+    client = APIClient()
+    client.cookies["access_token"] = str(refresh.access_token)
+    client.cookies["refresh_token"] = str(refresh)
+    return client
+
+
+def seed_tasks(rows, batch_size=5000, description=""):
+    from task_manager.models import Task
+
+    for start in range(0, rows, batch_size):
+        Task.objects.bulk_create(
+            Task(title=f"Task {i}", description=description, completed=bool(i % 2))
+            for i in range(start, min(start + batch_size, rows))
+        )
+
+
+def timed(fn, repeat=20):
+    """Call `fn` `repeat` times and return per-call latencies in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "p50": statistics.median(ordered),
+        "p95": percentile(ordered, 0.95),
+        "p99": percentile(ordered, 0.99),
+        "mean": statistics.fmean(ordered),
+    }
+
+
+def print_row(label, samples):
+    stats = summarize(samples)
+    print(f"{label:<40} p50={stats['p50']:8.2f}ms  p95={stats['p95']:8.2f}ms  mean={stats['mean']:8.2f}ms")
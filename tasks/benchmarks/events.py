@@ -0,0 +1,52 @@
+"""
+Cost of idle SSE subscribers and publish fan-out latency (in-process broker).
+
+    python -m benchmarks.events --clients 10000
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from benchmarks.common import setup_django
+
+
+async def run(clients, events_count):
+    from task_manager import events
+
+    broker = events.InProcessBroker(queue_size=events_count + 1)
+
+    tracemalloc.start()
+    subscriptions = [await broker.subscribe() for _ in range(clients)]
+    streams = [events.stream(s, broker, heartbeat=30) for s in subscriptions]
+    for stream in streams:
+        await anext(stream)  # park every connection on its queue
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{clients} idle subscribers: {current / clients:8.0f} bytes each")
+
+    start = time.perf_counter()
+    for i in range(events_count):
+        broker.publish("updated", {"id": i})
+    await asyncio.sleep(0)
+    delivered = sum(s.queue.qsize() for s in subscriptions)
+    elapsed = time.perf_counter() - start
+    print(f"{events_count} events -> {delivered} deliveries in {elapsed * 1000:.1f}ms "
+          f"({delivered / elapsed:,.0f} deliveries/s)")
+
+    for stream in streams:
+        await stream.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--events", type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    asyncio.run(run(args.clients, args.events))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Export throughput and peak Python memory for growing table sizes.
+
+Peak memory should stay roughly flat as --rows grows.
+
+    python -m benchmarks.export --rows 10000 100000 500000
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.common import make_client, seed_tasks, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--description-size", type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from task_manager.models import Task
+
+    client = make_client()
+    seeded = 0
+    for rows in sorted(args.rows):
+        seed_tasks(rows - seeded, description="x" * args.description_size)
+        seeded = rows
+        assert Task.objects.count() == rows
+
+        for query in ("export_format=ndjson", "export_format=csv", "export_format=ndjson&gzip=true"):
+            tracemalloc.start()
+            start = time.perf_counter()
+            response = client.get(f"/api/tasks/export/?{query}")
+            size = sum(len(chunk) for chunk in response.streaming_content)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(
+                f"{rows:>9} rows  {query:<32} {elapsed:7.2f}s  {rows / elapsed:9.0f} rows/s  "
+                f"{size / 1e6:8.1f}MB out  peak {peak / 1e6:6.1f}MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+JSON encode/decode throughput on real task list pages: DRF's stdlib
+JSONRenderer/JSONParser vs FastJSONRenderer/FastJSONParser (orjson).
+
+    python -m benchmarks.json_codec --page-sizes 10 100 1000
+
+Pages are built the way GET /api/tasks/ builds them (values_list rows, raw
+datetimes) and, for comparison, from TaskSerializer (pre-formatted strings).
+"""
+import argparse
+import io
+
+from benchmarks.common import print_row, seed_tasks, setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--description-size", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from task_manager import renderers
+    from task_manager.models import Task
+    from task_manager.serializers import TaskPageSerializer, TaskSerializer
+
+    if renderers.orjson is None:
+        print("orjson is not installed: FastJSON* fall back to the stdlib and should match DRF's classes")
+
+    seed_tasks(max(args.page_sizes), description="x" * args.description_size)
+    ordered = Task.objects.order_by("-created_at", "-id")
+    codecs = {
+        "stdlib": (JSONRenderer(), JSONParser()),
+        "orjson": (renderers.FastJSONRenderer(), renderers.FastJSONParser()),
+    }
+
+    for size in args.page_sizes:
+        page_serializer = TaskPageSerializer()
+        pages = {
+            "fast path": {"results": page_serializer.serialize(list(page_serializer.prepare(ordered)[:size]))},
+            "TaskSerializer": {"results": TaskSerializer(ordered[:size], many=True).data},
+        }
+        for codec_label, (renderer, json_parser) in codecs.items():
+            for page_label, page in pages.items():
+                print_row(f"encode {codec_label}, {page_label}, page={size}",
+                          timed(lambda: renderer.render(page), args.repeat))
+            body = codecs["orjson"][0].render(pages["fast path"])
+            print_row(f"decode {codec_label}, page={size} ({len(body) // 1024} KiB)",
+                      timed(lambda: json_parser.parse(io.BytesIO(body)), args.repeat))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,495 @@
+"""
+Load test: a mix of task and auth requests at a fixed concurrency, with
+p50/p95/p99 latency and throughput per operation, compared against a
+stored baseline.
+
+    python -m benchmarks.loadtest --dataset 10k --concurrency 20 --requests 4000
+    python -m benchmarks.loadtest --dataset 10k --save-baseline   # after an intended change
+
+Each of the `--concurrency` virtual users is a staff user that logs in
+once, then issues requests back to back, drawing each one from `--mix`:
+- list: GET /api/tasks/?page=N
+- detail: GET /api/tasks/<id>/
+- create: POST /api/tasks/
+- update: PUT /api/tasks/<id>/
+- delete: DELETE /api/tasks/<id>/
+- login: POST /login/
+- refresh: POST /refresh/
+
+Updates and deletes only touch tasks the run created itself, and the tasks
+it created but did not delete are deleted once it ends, so a `--database`
+dataset keeps the same tasks between runs (deletes leave tombstones). The
+request sequence is fixed by `--seed`.
+
+Datasets (`--dataset`, or `--tasks` / `--users`):
+- 10k: 10k tasks, 1k users
+- 1m: 1M tasks, 100k users
+- 10m: 10M tasks, 1M users
+
+They are generated with `bulk_create` and one shared password hash. By
+default they go into a throwaway SQLite file. The in-memory test database
+would fail concurrent writes with "table is locked". `--database PATH`
+keeps the file instead; later runs reuse it and only add missing rows.
+
+Transport: by default requests go through `tasks.asgi` in-process, with
+throttling off (`--throttle` keeps it) and no network. `--url` targets a
+local server instead. Start that server on the same file:
+
+    python -m benchmarks.loadtest --dataset 1m --database /tmp/load-1m.sqlite3 --generate-only
+    SQLITE_PATH=/tmp/load-1m.sqlite3 uvicorn tasks.asgi:application --workers 4
+    python -m benchmarks.loadtest --dataset 1m --database /tmp/load-1m.sqlite3 --url http://127.0.0.1:8000
+
+A server keeps its throttles, so expect 429s on login and refresh; they
+are counted under `statuses`.
+
+Baselines: results go to `--output` as JSON. They are compared with
+`--baseline`, which defaults to benchmarks/baselines/loadtest-<dataset>.json
+when that file exists. A p95/p99 latency increase or a throughput drop
+beyond `--tolerance`, or a higher error rate (non-2xx share) than the
+baseline's, is reported as a regression, and the exit status is 1.
+Baselines are machine-specific, so record your own with `--save-baseline`
+before comparing. A run with 5xx responses or connection errors is not
+saved as a baseline.
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import logging
+import platform
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from benchmarks.common import print_row, setup_django, summarize
+
+DATASETS = {
+    "10k": (10_000, 1_000),
+    "1m": (1_000_000, 100_000),
+    "10m": (10_000_000, 1_000_000),
+}
+DEFAULT_MIX = "list=40,detail=25,create=10,update=10,delete=5,login=5,refresh=5"
+PASSWORD = "load-test-pass"
+STAFF_EVERY = 10  # every 10th user is staff, so virtual users may update and delete
+BASELINES = Path(__file__).resolve().parent / "baselines"
+WORDS = (
+    "report", "review", "deploy", "invoice", "meeting", "budget", "release", "migrate", "design", "audit",
+    "quarterly", "client", "backlog", "roadmap", "follow-up", "draft", "schema", "onboarding", "renewal", "metrics",
+)
+
+
+def email(index):
+    return f"load{index}@example.com"
+
+
+def generate(tasks, users, seed, batch_size=10000):
+    """Add tasks and users until there are `tasks` / `users` of them; content depends only on `seed` and index."""
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from django.db import transaction
+
+    from task_manager.models import Task
+
+    password = make_password(PASSWORD)
+    existing = User.objects.filter(username__startswith="load").count()
+    for start in range(existing, users, batch_size):
+        with transaction.atomic():
+            User.objects.bulk_create(
+                User(username=email(i), email=email(i), password=password, is_staff=i % STAFF_EVERY == 0)
+                for i in range(start, min(start + batch_size, users))
+            )
+        progress("users", min(start + batch_size, users), users)
+
+    existing = Task.objects.count()
+    for start in range(existing, tasks, batch_size):
+        rng = random.Random(f"{seed}:{start}")
+        with transaction.atomic():
+            Task.objects.bulk_create(
+                Task(
+                    title=" ".join(rng.choices(WORDS, k=rng.randint(2, 6))),
+                    description=" ".join(rng.choices(WORDS, k=rng.randint(0, 60))),
+                    completed=rng.random() < 0.4,
+                )
+                for _ in range(start, min(start + batch_size, tasks))
+            )
+        progress("tasks", min(start + batch_size, tasks), tasks)
+
+
+def progress(label, done, total):
+    print(f"\rgenerating {label}: {done}/{total}", end="\n" if done == total else "", file=sys.stderr, flush=True)
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in Client.operations:
+            raise SystemExit(f"unknown operation {name!r}; choose from {', '.join(Client.operations)}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+class InProcessTransport:
+    """Calls the ASGI application directly: no sockets, same middleware stack as a real server."""
+
+    def __init__(self):
+        from django.core.asgi import get_asgi_application
+
+        self.app = get_asgi_application()
+
+    async def request(self, client, method, path, query="", body=None):
+        payload = b"" if body is None else json.dumps(body).encode()
+        headers = [(b"host", b"testserver"), (b"content-type", b"application/json"),
+                   (b"content-length", str(len(payload)).encode())]
+        if client.cookies:
+            headers.append((b"cookie", "; ".join(f"{k}={v}" for k, v in client.cookies.items()).encode()))
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": headers,
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        }
+        body_sent = False
+        response = {"status": None, "headers": [], "body": []}
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": payload, "more_body": False}
+            await asyncio.Event().wait()  # never disconnects; Django cancels this when the response is done
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [(k.decode().lower(), v.decode()) for k, v in message["headers"]]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return response["status"], response["headers"], b"".join(response["body"])
+
+
+class HTTPTransport:
+    """Talks to a running server over keep-alive HTTP/1.1, one connection per virtual user."""
+
+    def __init__(self, url, concurrency):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def _send(self, client, method, path, body):
+        if client.connection is None:
+            client.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        headers = {"Content-Type": "application/json"}
+        if client.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in client.cookies.items())
+        try:
+            client.connection.request(method, path, None if body is None else json.dumps(body), headers)
+            response = client.connection.getresponse()
+            return response.status, [(k.lower(), v) for k, v in response.getheaders()], response.read()
+        except (OSError, http.client.HTTPException):
+            client.connection.close()
+            client.connection = None
+            raise
+
+    async def request(self, client, method, path, query="", body=None):
+        target = f"{path}?{query}" if query else path
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, self._send, client, method, target, body
+        )
+
+
+class Client:
+    """One virtual user: its cookies, its own tasks and a seeded request sequence."""
+
+    operations = ("list", "detail", "create", "update", "delete", "login", "refresh")
+
+    def __init__(self, transport, index, user_index, seed, dataset):
+        self.transport = transport
+        self.email = email(user_index)
+        self.rng = random.Random(f"{seed}:client:{index}")
+        self.dataset = dataset
+        self.cookies = {}
+        self.created = []
+        self.connection = None
+
+    async def call(self, method, path, query="", body=None):
+        status, headers, content = await self.transport.request(self, method, path, query, body)
+        for name, value in headers:
+            if name == "set-cookie":
+                for morsel in SimpleCookie(value).values():
+                    self.cookies[morsel.key] = morsel.value
+        return status, content
+
+    async def login(self):
+        status, _ = await self.call("POST", "/login/", body={"email": self.email, "password": PASSWORD})
+        return status
+
+    async def refresh(self):
+        status, _ = await self.call("POST", "/refresh/")
+        return status
+
+    async def list(self):
+        page = self.rng.randint(1, self.dataset["pages"])
+        status, _ = await self.call("GET", "/api/tasks/", f"page={page}")
+        return status
+
+    async def detail(self):
+        pk = self.rng.randint(self.dataset["min_id"], self.dataset["max_id"])
+        status, _ = await self.call("GET", f"/api/tasks/{pk}/")
+        return status
+
+    async def create(self):
+        body = {"title": f"{self.rng.choice(WORDS)} {self.rng.randrange(10 ** 6)}", "description": "load test"}
+        status, content = await self.call("POST", "/api/tasks/", body=body)
+        if status == 201:
+            self.created.append(json.loads(content)["id"])
+        return status
+
+    async def update(self):
+        pk = self.rng.choice(self.created)
+        status, _ = await self.call("PUT", f"/api/tasks/{pk}/", body={"completed": self.rng.random() < 0.5})
+        return status
+
+    async def delete(self):
+        status, _ = await self.call("DELETE", f"/api/tasks/{self.created.pop()}/")
+        return status
+
+
+async def cleanup(clients):
+    """Delete the tasks the run created and did not delete."""
+    async def delete_created(client):
+        while client.created:
+            try:
+                await client.delete()
+            except (OSError, http.client.HTTPException):
+                pass
+
+    await asyncio.gather(*(delete_created(client) for client in clients))
+
+
+async def drive(clients, mix, total, warmup):
+    """Run `total` requests spread over the clients, one in flight per client; returns ({op: samples}, statuses, seconds)."""
+    names, weights = list(mix), list(mix.values())
+    samples = {name: [] for name in names}
+    statuses = {name: {} for name in names}
+    remaining = warmup + total
+
+    async def worker(client):
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            recorded = remaining < total
+            name = client.rng.choices(names, weights)[0]
+            if name in ("update", "delete") and not client.created:
+                # Untimed setup: only tasks this run created are modified.
+                if await client.create() != 201:
+                    continue
+            start = time.perf_counter()
+            try:
+                status = await getattr(client, name)()
+            except (OSError, http.client.HTTPException):
+                status = "connection error"
+            elapsed = (time.perf_counter() - start) * 1000
+            if recorded:
+                samples[name].append(elapsed)
+                statuses[name][str(status)] = statuses[name].get(str(status), 0) + 1
+
+    for client in clients:
+        if await client.login() != 200:
+            raise SystemExit(f"could not log in as {client.email}; was the dataset generated with this seed?")
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(client) for client in clients))
+    return samples, statuses, time.perf_counter() - start
+
+
+def report(samples, statuses, seconds):
+    results = {}
+    everything = []
+    for name, latencies in samples.items():
+        if not latencies:
+            continue
+        everything += latencies
+        errors = sum(count for status, count in statuses[name].items() if not status.startswith("2"))
+        results[name] = {
+            **{key: round(value, 3) for key, value in summarize(latencies).items()},
+            "count": len(latencies),
+            "errors": errors,
+            "throughput": round(len(latencies) / seconds, 1),
+            "statuses": statuses[name],
+        }
+        print_row(name, latencies)
+        print(f"{'':<40} {results[name]['throughput']:8.1f} req/s  errors={errors}  {statuses[name]}")
+    results["all"] = {
+        **{key: round(value, 3) for key, value in summarize(everything).items()},
+        "count": len(everything),
+        "errors": sum(result["errors"] for result in results.values()),
+        "throughput": round(len(everything) / seconds, 1),
+    }
+    print_row("all", everything)
+    print(f"{'':<40} {results['all']['throughput']:8.1f} req/s  errors={results['all']['errors']}")
+    return results
+
+
+def error_rate(result):
+    return result["errors"] / result["count"] if result["count"] else 0.0
+
+
+def server_errors(results):
+    """["op status: count"] for the 5xx responses and connection errors in `results`."""
+    return [
+        f"{name} {status}: {count}"
+        for name, result in results["operations"].items()
+        for status, count in result.get("statuses", {}).items()
+        if not status[0].isdigit() or status.startswith("5")
+    ]
+
+
+def compare(results, baseline, tolerance):
+    """Print the change per operation; returns the regressions as strings."""
+    regressions = []
+    print(f"\nvs baseline ({baseline['meta'].get('recorded', '?')}, tolerance {tolerance:.0%}):")
+    for key in ("tasks", "users", "concurrency", "mix", "transport", "throttle"):
+        if baseline["meta"].get(key) != results["meta"][key]:
+            print(f"  note: {key} differs ({baseline['meta'].get(key)} in the baseline, {results['meta'][key]} now)")
+    for name, current in results["operations"].items():
+        previous = baseline["operations"].get(name)
+        if previous is None:
+            continue
+        changes = []
+        for key in ("p50", "p95", "p99", "throughput"):
+            if not previous[key]:
+                continue
+            change = current[key] / previous[key] - 1
+            changes.append(f"{key} {change:+7.1%}")
+            worse = change < -tolerance if key == "throughput" else (key != "p50" and change > tolerance)
+            if worse:
+                regressions.append(f"{name} {key}: {previous[key]} -> {current[key]}")
+        before, now = error_rate(previous), error_rate(current)
+        changes.append(f"errors {before:.2%} -> {now:.2%}")
+        if now > before:
+            regressions.append(f"{name} error rate: {before:.2%} -> {now:.2%}")
+        print(f"  {name:<10} " + "  ".join(changes))
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return regressions
+
+
+async def run(args, mix, dataset):
+    transport = HTTPTransport(args.url, args.concurrency) if args.url else InProcessTransport()
+    staff = max(1, args.users // STAFF_EVERY)
+    clients = [
+        Client(transport, i, (i % staff) * STAFF_EVERY, args.seed, dataset)
+        for i in range(args.concurrency)
+    ]
+    try:
+        return await drive(clients, mix, args.requests, args.warmup)
+    finally:
+        await cleanup(clients)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", choices=DATASETS, default="10k")
+    parser.add_argument("--tasks", type=int, help="override the dataset's task count")
+    parser.add_argument("--users", type=int, help="override the dataset's user count")
+    parser.add_argument("--database", help="keep the dataset in this SQLite file and reuse it")
+    parser.add_argument("--generate-only", action="store_true")
+    parser.add_argument("--url", help="drive a running server instead of the in-process ASGI app")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--warmup", type=int, default=200, help="requests sent first and not recorded")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--throttle", action="store_true", help="keep rate limiting on (in-process only)")
+    parser.add_argument("--output", help="write the results as JSON here")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the dataset's baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+    default_tasks, default_users = DATASETS[args.dataset]
+    args.tasks = args.tasks or default_tasks
+    args.users = args.users or default_users
+    mix = parse_mix(args.mix)
+    if args.url and not args.database:
+        parser.error("--url needs --database: the file the server was started on (SQLITE_PATH)")
+
+    scratch = None if args.database else tempfile.TemporaryDirectory()
+    setup_django(args.database or Path(scratch.name) / "loadtest.sqlite3")
+    try:
+        measure(args, mix)
+    finally:
+        if scratch is not None:
+            scratch.cleanup()
+
+
+def measure(args, mix):
+    import django
+    from django.conf import settings
+    from django.db import connection
+    from django.db.models import Max, Min
+    from django.test.utils import override_settings
+
+    from task_manager.models import Task
+    from task_manager.pagination import TaskPagination
+
+    started = time.perf_counter()
+    generate(args.tasks, args.users, args.seed)
+    print(f"dataset ready in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    if args.generate_only:
+        return
+    logging.getLogger("django.request").setLevel(logging.CRITICAL)  # 5xx are counted in the statuses instead
+    if not args.throttle:
+        override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {}}).enable()
+
+    bounds = Task.objects.aggregate(min_id=Min("id"), max_id=Max("id"))
+    dataset = {**bounds, "pages": max(1, min(args.tasks // TaskPagination.page_size, 1000))}
+    samples, statuses, seconds = asyncio.run(run(args, mix, dataset))
+
+    results = {
+        "meta": {
+            "recorded": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "dataset": args.dataset, "tasks": args.tasks, "users": args.users,
+            "concurrency": args.concurrency, "requests": args.requests, "mix": mix, "seed": args.seed,
+            "transport": args.url or "in-process asgi", "throttle": args.throttle,
+            "python": platform.python_version(), "django": django.get_version(),
+            "database": f"{connection.vendor} {connection.Database.sqlite_version}"
+            if connection.vendor == "sqlite" else connection.vendor,
+            "machine": f"{platform.machine()} {platform.system()}",
+        },
+        "operations": report(samples, statuses, seconds),
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2) + "\n")
+
+    default_baseline = BASELINES / f"loadtest-{args.dataset}.json"
+    if args.save_baseline:
+        errors = server_errors(results)
+        if errors:
+            sys.exit(f"not saving a baseline with server errors: {', '.join(errors)}")
+        BASELINES.mkdir(exist_ok=True)
+        default_baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"baseline saved to {default_baseline}")
+        return
+    baseline_path = Path(args.baseline) if args.baseline else default_baseline
+    if baseline_path.exists():
+        if compare(results, json.loads(baseline_path.read_text()), args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Task-list latency while other threads hammer password verification, with
+hashing inline vs in the process pool (PASSWORD_HASH_WORKERS).
+
+    python -m benchmarks.login_storm --storm-threads 16 --workers 4
+
+The storm calls `auth.hashing.authenticate_user`, i.e. the CPU-heavy part of
+POST /login/, so SQLite write locking from token minting does not muddy
+the numbers. Saturation 503s are counted, not retried.
+"""
+import argparse
+import threading
+
+from benchmarks.common import make_client, print_row, seed_tasks, setup_django, timed
+
+
+def storm(stop, counts):
+    from auth.hashing import PasswordHashingBusy, authenticate_user
+
+    while not stop.is_set():
+        try:
+            authenticate_user(None, "storm@example.com", "storm-pass")
+            counts["logins"] += 1
+        except PasswordHashingBusy:
+            counts["busy"] += 1
+
+
+def measure(client, label, storm_threads):
+    stop = threading.Event()
+    counts = {"logins": 0, "busy": 0}
+    threads = [threading.Thread(target=storm, args=(stop, counts)) for _ in range(storm_threads)]
+    for thread in threads:
+        thread.start()
+    try:
+        samples = timed(lambda: client.get("/api/tasks/?page=2"), repeat=200)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    print_row(label, samples)
+    print(f"{'':<40} logins={counts['logins']}  busy(503)={counts['busy']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--storm-threads", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+
+    from auth import hashing
+
+    settings.TASK_CACHE_ENABLED = False
+    seed_tasks(args.rows)
+    User.objects.create_user(username="storm@example.com", password="storm-pass")
+    client = make_client()
+
+    print_row("no storm", timed(lambda: client.get("/api/tasks/?page=2"), repeat=200))
+    for workers in (0, args.workers):
+        settings.PASSWORD_HASH_WORKERS = workers
+        hashing.reset_pool()
+        hashing.make_password("warm-up")  # start the worker processes outside the measurement
+        measure(client, f"storm, workers={workers}", args.storm_threads)
+    hashing.reset_pool()
+
+
+if __name__ == "__main__":
+    main()
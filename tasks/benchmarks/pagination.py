@@ -0,0 +1,47 @@
+"""
+Deep-page latency: PageNumberPagination (COUNT + OFFSET) vs keyset cursors.
+
+    python -m benchmarks.pagination --rows 200000 --page-size 50
+"""
+import argparse
+
+from benchmarks.common import make_client, print_row, seed_tasks, setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from task_manager.models import Task
+    from task_manager.pagination import encode_cursor
+
+    seed_tasks(args.rows)
+    client = make_client()
+    url = "/api/tasks/"
+    ordered = Task.objects.order_by("-created_at", "-id")
+
+    last_page = max(1, args.rows // args.page_size)
+    for fraction in (0, 0.5, 0.99):
+        page = max(1, int(last_page * fraction))
+        offset = (page - 1) * args.page_size
+        print_row(
+            f"page mode,   page {page}",
+            timed(lambda: client.get(url, {"page": page, "page_size": args.page_size}), args.repeat),
+        )
+
+        params = {"pagination": "cursor", "page_size": args.page_size}
+        if offset:
+            anchor = ordered.values("created_at", "id")[offset - 1]
+            params["cursor"] = encode_cursor(anchor["created_at"], anchor["id"])
+        print_row(
+            f"cursor mode, offset {offset}",
+            timed(lambda: client.get(url, params), args.repeat),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+?q= search: FTS5 index vs an icontains scan over title and description.
+
+    python -m benchmarks.search --rows 100000
+
+Descriptions are random words from a small vocabulary, so some terms are
+common and some rare. The icontains rows run the same query the fallback
+uses on databases without a search index. Note that icontains is unranked:
+for a common term it can stop after the first 20 hits in created_at order,
+while the ranked FTS query has to score every match; for rare terms it
+scans the whole table and FTS wins by an order of magnitude.
+"""
+import argparse
+import random
+
+from benchmarks.common import make_client, print_row, setup_django, timed
+
+WORDS = ("alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima mike november oscar papa "
+         "quebec romeo sierra tango uniform victor whiskey xray yankee zulu report budget review deploy").split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--words", type=int, default=30, help="words per description")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+
+    from task_manager import search
+    from task_manager.models import Task
+
+    settings.TASK_CACHE_ENABLED = False
+    rng = random.Random(42)
+    rare = "zanzibar"
+    for start in range(0, args.rows, 5000):
+        Task.objects.bulk_create(
+            Task(title=f"Task {i} {rng.choice(WORDS)}",
+                 description=" ".join(rng.choices(WORDS, k=args.words)) + (f" {rare}" if i % 1000 == 0 else ""))
+            for i in range(start, min(start + 5000, args.rows))
+        )
+    print(f"FTS5 available: {search.has_fts()}")
+
+    client = make_client()
+    ordered = Task.objects.order_by("-created_at", "-id")
+    for term in ("report", rare, "alpha bravo"):
+        print_row(f"FTS5      q={term!r}", timed(lambda: list(search.search(ordered, term)[:20]), args.repeat))
+        print_row(f"icontains q={term!r}",
+                  timed(lambda: list(search.icontains_search(ordered, term)[:20]), args.repeat))
+        print_row(f"GET /api/tasks/?q={term}", timed(lambda: client.get("/api/tasks/", {"q": term}), args.repeat))
+
+if __name__ == "__main__":
+    main()
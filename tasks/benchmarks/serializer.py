@@ -0,0 +1,41 @@
+"""
+List-page serialization: TaskSerializer(many=True) over model instances vs
+the values_list fast path (TaskPageSerializer), with and without ?fields=.
+
+    python -m benchmarks.serializer --page-sizes 10 100 1000
+
+Each sample fetches and serializes one page (query included), the part of a
+list request that grows with the page size.
+"""
+import argparse
+
+from benchmarks.common import print_row, seed_tasks, setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--description-size", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from task_manager.models import Task
+    from task_manager.serializers import TaskPageSerializer, TaskSerializer
+
+    seed_tasks(max(args.page_sizes), description="x" * args.description_size)
+    ordered = Task.objects.order_by("-created_at", "-id")
+
+    def fast_page(size, fields=None):
+        serializer = TaskPageSerializer(fields, fast=True)
+        return serializer.serialize(list(serializer.prepare(ordered)[:size]))
+
+    for size in args.page_sizes:
+        print_row(f"ModelSerializer, page={size}",
+                  timed(lambda: TaskSerializer(list(ordered[:size]), many=True).data, args.repeat))
+        print_row(f"values_list, page={size}", timed(lambda: fast_page(size), args.repeat))
+        print_row(f"values_list id,title,completed, page={size}",
+                  timed(lambda: fast_page(size, ("id", "title", "completed")), args.repeat))
+
+if __name__ == "__main__":
+    main()
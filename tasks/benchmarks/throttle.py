@@ -0,0 +1,44 @@
+"""
+Cost of one token-bucket throttle check (auth/throttling.py).
+
+    python -m benchmarks.throttle            # in-memory buckets
+    REDIS_URL=redis://localhost:6379/0 python -m benchmarks.throttle
+"""
+import argparse
+
+from benchmarks.common import print_row, setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--checks", type=int, default=20000)
+    parser.add_argument("--keys", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from auth.throttling import TokenBucketThrottle, reset_buckets
+
+    class BenchThrottle(TokenBucketThrottle):
+        scope = "task_write"
+
+    reset_buckets()
+    factory = APIRequestFactory()
+    requests = [
+        Request(factory.post("/api/tasks/", REMOTE_ADDR=f"10.0.{i // 256}.{i % 256}"))
+        for i in range(args.keys)
+    ]
+    throttle = BenchThrottle()
+    position = iter(range(10 ** 12))
+
+    def check():
+        throttle.allow_request(requests[next(position) % len(requests)], None)
+
+    print_row(f"{settings.THROTTLE_BACKEND} allow_request", timed(check, repeat=args.checks))
+
+
+if __name__ == "__main__":
+    main()
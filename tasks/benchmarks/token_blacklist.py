@@ -0,0 +1,84 @@
+"""
+Refresh-token blacklist checks with and without the Bloom filter, against a
+large token_blacklist table.
+
+    python -m benchmarks.token_blacklist --rows 1000000
+
+Reports the cost of the blacklist check alone (decoding a valid, never
+blacklisted refresh token) and the throughput of POST /refresh/, which also
+rotates and blacklists the presented token.
+"""
+import argparse
+import time
+import uuid
+from datetime import timedelta
+
+from benchmarks.common import print_row, setup_django, timed
+
+
+def seed_blacklist(rows, batch_size=50000):
+    from django.utils import timezone
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+    expires_at = timezone.now() + timedelta(days=7)
+    for start in range(0, rows, batch_size):
+        count = min(batch_size, rows - start)
+        outstanding = OutstandingToken.objects.bulk_create(
+            OutstandingToken(jti=uuid.uuid4().hex, token="", expires_at=expires_at) for _ in range(count)
+        )
+        BlacklistedToken.objects.bulk_create(BlacklistedToken(token=token) for token in outstanding)
+
+
+def refresh_loop(client, token, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        client.cookies["refresh_token"] = token
+        response = client.post("/refresh/")
+        assert response.status_code == 200, response.content
+        token = response.cookies["refresh_token"].value
+    return count / (time.perf_counter() - start), token
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--refreshes", type=int, default=300)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIClient
+
+    from auth import blacklist
+    from auth.tokens import StampedRefreshToken
+
+    start = time.perf_counter()
+    seed_blacklist(args.rows)
+    print(f"seeded {args.rows} blacklisted tokens in {time.perf_counter() - start:.1f}s")
+
+    user = User.objects.create_user(username="bench@example.com", password="bench-pass")
+    raw = str(StampedRefreshToken.for_user(user))
+    client = APIClient()
+    token = str(StampedRefreshToken.for_user(user))  # rotated by refresh_loop, unlike `raw`
+
+    for mode in (None, "local"):
+        settings.JWT_BLACKLIST_FILTER = mode
+        settings.JWT_BLACKLIST_FILTER_SINGLE_PROCESS = True
+        settings.JWT_BLACKLIST_FILTER_CAPACITY = max(args.rows * 2, 1000)
+        blacklist.reset_blacklist_filter()
+        start = time.perf_counter()
+        bloom = blacklist.get_blacklist_filter(build=False)
+        if bloom is not None:
+            bloom.rebuild()
+        label = mode or "database only"
+        if mode:
+            print(f"{label}: filter built in {time.perf_counter() - start:.1f}s")
+
+        print_row(f"{label}: blacklist check", timed(lambda: StampedRefreshToken(raw), repeat=2000))
+        throughput, token = refresh_loop(client, token, args.refreshes)
+        print(f"{label}: POST /refresh/ {throughput:8.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
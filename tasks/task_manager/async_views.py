@@ -0,0 +1,219 @@
+"""
+ASGI-native versions of `TaskListCreateAPI` and `TaskDetailAPI`.
+
+DRF views are synchronous, so under an ASGI server every request to them is
+handed off to a worker thread. These views run on the event loop instead and
+reach the database through Django's async ORM (`aget`, `acount`, `async for`,
+`asave`), authenticating with the cookie JWT class's `aauthenticate`.
+
+They reuse the sync stack's serializer, filter, paginators, response cache
+and ETag helpers, and answer with the same payloads and status codes.
+Enable them with `TASK_API_STACK = 'async'`.
+"""
+from math import ceil
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django_filters.utils import translate_validation
+from rest_framework.exceptions import APIException, AuthenticationFailed
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+
+from auth.auth import get_cookie_authentication_class
+from auth.throttling import WriteRateThrottle
+
+from . import cache as task_cache
+from . import conditional
+from . import events
+from . import search
+from .filters import TaskFilter
+from .idempotency import arun_idempotent
+from .models import Task
+from .pagination import get_task_paginator
+from .permissions import IsAdminOrReadOnly
+from .renderers import FastJSONParser, FastJSONRenderer
+from .serializers import TaskPageSerializer, TaskSerializer, parse_fields
+
+
+def render(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type="application/json")
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncTaskView(View):
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [WriteRateThrottle]
+    http_method_names = ["get", "post", "put", "delete", "options"]
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request, parsers=[FastJSONParser(), FormParser(), MultiPartParser()])
+
+        try:
+            authenticated = await get_cookie_authentication_class()().aauthenticate(request._request)
+        except AuthenticationFailed as exc:
+            return render({"detail": exc.detail}, status=401)
+        if authenticated is None:
+            return render({"detail": "Authentication credentials were not provided."}, status=401)
+        request.user, request.auth = authenticated
+
+        for permission in self.permission_classes:
+            if not permission().has_permission(request, self):
+                return render({"detail": "You do not have permission to perform this action."}, status=403)
+
+        for throttle_class in self.throttle_classes:
+            throttle = throttle_class()
+            if not await sync_to_async(throttle.allow_request)(request, self):
+                wait = throttle.wait()
+                response = render({"detail": f"Request was throttled. Expected available in {ceil(wait)} seconds."},
+                                  status=429)
+                response["Retry-After"] = str(ceil(wait))
+                return response
+
+        handler = getattr(self, request.method.lower(), None)
+        if request.method.lower() not in self.http_method_names or handler is None:
+            return render({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+
+        try:
+            return await handler(request, *args, **kwargs)
+        except APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, (dict, list)) else {"detail": exc.detail}
+            return render(detail, status=exc.status_code)
+
+    async def options(self, request, *args, **kwargs):
+        response = HttpResponse(status=200)
+        response["Allow"] = ", ".join(m.upper() for m in self.http_method_names if hasattr(self, m))
+        return response
+
+
+class AsyncTaskListCreateView(AsyncTaskView):
+    http_method_names = ["get", "post", "options"]
+
+    async def get(self, request):
+        cache_key = await task_cache.alist_key(request) if task_cache.is_enabled() else None
+        entry = await task_cache.alookup(cache_key) if cache_key else None
+
+        if entry is None:
+            etag = await conditional.alist_etag(request)
+        else:
+            etag = entry["etag"]
+
+        # Checked before the page is counted, fetched or serialized.
+        response = conditional.not_modified(request, etag, None)
+        if response is not None:
+            return response
+
+        if entry is None:
+            if request.query_params.get("q"):
+                # Warm the FTS probe off the event loop; `search()` then only reads it.
+                await search.ahas_fts(Task.objects.db)
+            filterset = TaskFilter(request.query_params, queryset=Task.objects.order_by("-created_at", "-id"),
+                                   request=request)
+            if not filterset.is_valid():
+                raise translate_validation(filterset.errors)
+            queryset = filterset.qs
+
+            page_serializer = TaskPageSerializer(parse_fields(request))
+            paginator = get_task_paginator(request)
+            page = await paginator.apaginate_queryset(page_serializer.prepare(queryset), request)
+            data = paginator.get_paginated_response(page_serializer.serialize(page)).data
+            if cache_key:
+                await task_cache.astore(cache_key, {"data": data, "etag": etag})
+        else:
+            data = entry["data"]
+        return conditional.add_validators(render(data), etag, None)
+
+    async def post(self, request):
+        return await arun_idempotent(request, lambda: self.create(request))
+
+    async def create(self, request):
+        serializer = TaskSerializer(data=request.data)
+        if not serializer.is_valid():
+            return render(serializer.errors, status=400)
+
+        task = Task(**serializer.validated_data)
+        await task.asave()
+        data = TaskSerializer(task).data
+        await events.apublish("created", data)
+        return render(data, status=201)
+
+
+class AsyncTaskDetailView(AsyncTaskView):
+    permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+
+    async def get_object(self, pk):
+        return await Task.objects.filter(pk=pk).afirst()
+
+    async def get(self, request, pk):
+        cache_key = await task_cache.adetail_key(pk) if task_cache.is_enabled() else None
+        entry = await task_cache.alookup(cache_key) if cache_key else None
+
+        if entry is None:
+            if conditional.has_conditional_headers(request):
+                etag, last_modified = await conditional.adetail_validators(pk)
+                if etag is None:
+                    return render({"error": "Task not found"}, status=404)
+                response = conditional.not_modified(request, etag, last_modified)
+                if response is not None:
+                    return response
+
+            task = await self.get_object(pk)
+            if not task:
+                return render({"error": "Task not found"}, status=404)
+
+            etag, last_modified = conditional.task_validators(task)
+            data = TaskSerializer(task).data
+            if cache_key:
+                await task_cache.astore(cache_key, {"data": data, "etag": etag, "last_modified": last_modified})
+        else:
+            data, etag, last_modified = entry["data"], entry["etag"], entry["last_modified"]
+            response = conditional.not_modified(request, etag, last_modified)
+            if response is not None:
+                return response
+
+        return conditional.add_validators(render(data), etag, last_modified)
+
+    async def put(self, request, pk):
+        task = await self.get_object(pk)
+        if not task:
+            return render({"error": "Task not found"}, status=404)
+
+        expected = conditional.if_match(request, task.pk)
+        if expected is not None and task.updated_at not in expected:
+            return conditional.precondition_failed(*conditional.task_validators(task))
+
+        serializer = TaskSerializer(task, data=request.data, partial=True)
+        if not serializer.is_valid():
+            return render(serializer.errors, status=400)
+
+        changes = conditional.changed_fields(task, serializer.validated_data)
+        if changes:
+            queryset = Task.objects.filter(pk=task.pk)
+            if expected is not None:
+                queryset = queryset.filter(updated_at=task.updated_at)
+            changes["updated_at"] = timezone.now()
+            if not await queryset.aupdate(**changes):
+                etag, last_modified = await conditional.adetail_validators(task.pk)
+                if etag is None:
+                    return render({"error": "Task not found"}, status=404)
+                return conditional.precondition_failed(etag, last_modified)
+            for field, value in changes.items():
+                setattr(task, field, value)
+
+        data = TaskSerializer(task).data
+        if changes:
+            await events.apublish("updated", data)
+        return conditional.add_validators(render(data), *conditional.task_validators(task))
+
+    async def delete(self, request, pk):
+        task = await self.get_object(pk)
+        if not task:
+            return render({"error": "Task not found"}, status=404)
+
+        await task.adelete()
+        await events.apublish("deleted", {"id": pk})
+        return HttpResponse(status=204)
@@ -0,0 +1,159 @@
+"""
+Read-through response cache for the task endpoints.
+
+Entries are keyed under a global "generation" number. Any write to `Task`
+bumps the generation, which orphans every cached page at once; the orphans
+simply age out through the cache timeout.
+"""
+import hashlib
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+
+from tasks import metrics
+
+GENERATION_KEY = "tasks:generation"
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def as_dict(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+stats = CacheStats()
+
+
+@metrics.register_process_collector
+def _cache_metrics():
+    counts = stats.as_dict()
+    return {
+        "task_cache_requests_total": metrics.family("counter", "Task response cache lookups, by result.", [
+            ["task_cache_requests_total", {"result": "hit"}, counts["hits"]],
+            ["task_cache_requests_total", {"result": "miss"}, counts["misses"]],
+        ]),
+    }
+
+
+@metrics.register_collector
+def _cache_hit_ratio(families):
+    counts = {labels["result"]: value for _, labels, value in families["task_cache_requests_total"]["samples"]}
+    lookups = counts.get("hit", 0) + counts.get("miss", 0)
+    return {
+        "task_cache_hit_ratio": metrics.family("gauge", "Share of task cache lookups that hit, since start.", [
+            ["task_cache_hit_ratio", {}, counts.get("hit", 0) / lookups if lookups else 0.0],
+        ]),
+    }
+
+
+def is_enabled():
+    return getattr(settings, "TASK_CACHE_ENABLED", True)
+
+
+def get_cache():
+    return caches[getattr(settings, "TASK_CACHE_ALIAS", "default")]
+
+
+def get_generation():
+    cache = get_cache()
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Seed from the clock so a lost generation never reuses an old number.
+        cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    cache = get_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_task_cache(**kwargs):
+    """Drop every cached task response. Usable directly as a signal receiver."""
+    bump_generation()
+    if connection.in_atomic_block:
+        # A reader may cache pre-commit rows under the new generation; bump again once visible.
+        transaction.on_commit(bump_generation)
+
+
+async def aget_generation():
+    cache = get_cache()
+    generation = await cache.aget(GENERATION_KEY)
+    if generation is None:
+        await cache.aadd(GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = await cache.aget(GENERATION_KEY)
+    return generation
+
+
+def _list_digest(request):
+    params = sorted(request.query_params.lists())
+    return hashlib.md5(
+        f"{request.get_host()}?{urlencode(params, doseq=True)}".encode()
+    ).hexdigest()
+
+
+def list_key(request):
+    return f"tasks:{get_generation()}:list:{_list_digest(request)}"
+
+
+async def alist_key(request):
+    return f"tasks:{await aget_generation()}:list:{_list_digest(request)}"
+
+
+def detail_key(pk):
+    return f"tasks:{get_generation()}:detail:{pk}"
+
+
+async def adetail_key(pk):
+    return f"tasks:{await aget_generation()}:detail:{pk}"
+
+
+def lookup(key):
+    data = get_cache().get(key)
+    if data is None:
+        stats.miss()
+    else:
+        stats.hit()
+    return data
+
+
+def store(key, data):
+    get_cache().set(key, data, timeout=getattr(settings, "TASK_CACHE_TIMEOUT", 300))
+
+
+async def alookup(key):
+    data = await get_cache().aget(key)
+    if data is None:
+        stats.miss()
+    else:
+        stats.hit()
+    return data
+
+
+async def astore(key, data):
+    await get_cache().aset(key, data, timeout=getattr(settings, "TASK_CACHE_TIMEOUT", 300))
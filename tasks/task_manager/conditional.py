@@ -0,0 +1,127 @@
+"""
+ETag / Last-Modified validators for the task endpoints.
+
+Detail validators are computed from `updated_at` with one small query and
+never from the serialized body, so an unchanged poll ends in a bodiless 304.
+A list's ETag is a digest of the query parameters, the newest `updated_at`
+and the newest tombstone id, read with one indexed lookup before the page is
+counted, fetched or serialized. Every write moves one of the two (updates
+stamp `updated_at`, deletes leave a tombstone), so any change to any page
+changes the tag. Lists carry no Last-Modified: a date alone can't say that a
+row has gone.
+
+Writes honour `If-Match`: the detail ETag encodes `updated_at` to the
+microsecond, so the update runs as one `UPDATE ... WHERE id = %s AND
+updated_at = %s` and a writer holding a stale ETag gets 412 instead of
+silently overwriting someone else's change.
+"""
+import hashlib
+import re
+from datetime import datetime, timedelta, timezone
+
+from django.db.models import F, Func, Subquery
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags, quote_etag
+
+from .models import Task, TaskTombstone
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def has_conditional_headers(request):
+    return "HTTP_IF_NONE_MATCH" in request.META or "HTTP_IF_MODIFIED_SINCE" in request.META
+
+
+def task_validators(task):
+    return _detail_etag(task.pk, task.updated_at), task.updated_at
+
+
+def detail_validators(pk):
+    updated_at = Task.objects.filter(pk=pk).values_list("updated_at", flat=True).first()
+    if updated_at is None:
+        return None, None
+    return _detail_etag(pk, updated_at), updated_at
+
+
+async def adetail_validators(pk):
+    updated_at = await Task.objects.filter(pk=pk).values_list("updated_at", flat=True).afirst()
+    if updated_at is None:
+        return None, None
+    return _detail_etag(pk, updated_at), updated_at
+
+
+def list_etag(request):
+    return _list_etag(request, _list_state().first())
+
+
+async def alist_etag(request):
+    return _list_etag(request, await _list_state().afirst())
+
+
+def _list_state():
+    # One row: the newest updated_at (a seek on task_updated_idx) and MAX(id) of the tombstones.
+    latest_tombstone = TaskTombstone.objects.annotate(latest=Func(F("id"), function="MAX")).values("latest")
+    return Task.objects.order_by("-updated_at").values_list("updated_at", Subquery(latest_tombstone))
+
+
+def _list_etag(request, state):
+    updated_at, tombstone_id = state or (None, None)  # no tasks: every page is empty
+    params = sorted(request.query_params.lists())
+    digest = hashlib.md5(f"{params}|{updated_at and updated_at.isoformat()}|{tombstone_id}".encode())
+    return quote_etag(digest.hexdigest())
+
+
+def not_modified(request, etag, last_modified):
+    """Return a 304 (or 412) response if the request's preconditions say so, else None."""
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=last_modified and int(last_modified.timestamp()),
+    )
+    if response is not None and response.status_code == 304:
+        add_validators(response, etag, last_modified)
+    return response
+
+
+def if_match(request, pk):
+    """
+    The `updated_at` values named by the request's If-Match for task `pk`.
+
+    None means no precondition (header absent or `*`); an empty list means
+    no tag can match, e.g. one minted for another task. Weak tags count too:
+    they are our strong tags weakened by the compression middleware, and
+    still name one version of the task.
+    """
+    header = request.headers.get("If-Match")
+    if header is None:
+        return None
+    etags = parse_etags(header)
+    if etags == ["*"]:
+        return None
+    pattern = re.compile(rf'(?:W/)?"{pk}-(\d+)"')
+    return [_EPOCH + int(match[1]) * _MICROSECOND for match in map(pattern.fullmatch, etags) if match]
+
+
+def precondition_failed(etag, last_modified):
+    response = JsonResponse({"error": "Task was modified since it was read; fetch it and retry"}, status=412)
+    return add_validators(response, etag, last_modified)
+
+
+def changed_fields(task, validated_data):
+    """The subset of `validated_data` that differs from `task`, i.e. the columns worth writing."""
+    return {field: value for field, value in validated_data.items() if getattr(task, field) != value}
+
+
+def add_validators(response, etag, last_modified):
+    if etag:
+        response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
+
+
+def _detail_etag(pk, updated_at):
+    # Integer arithmetic, not timestamp(): If-Match maps the tag back to the exact value.
+    return quote_etag(f"{pk}-{(updated_at - _EPOCH) // _MICROSECOND}")
@@ -0,0 +1,304 @@
+"""
+Task change events for the Server-Sent Events feed.
+
+Writes publish `created` / `updated` / `deleted` events once their transaction
+commits. Each process keeps one `FanoutHub` that hands events to every open
+SSE connection through a small bounded queue, so an idle client costs one
+queue and a heartbeat timer rather than a poll loop.
+
+Two brokers feed the hub:
+
+* `InProcessBroker` numbers events itself and keeps a replay buffer; enough
+  for a single process and for tests.
+* `RedisBroker` appends to a capped Redis stream (ids and replay) and
+  fans out through Redis pub/sub, so every worker process sees every event.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+CHANNEL = "tasks:events"
+STREAM = "tasks:events:log"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Event:
+    id: str
+    type: str
+    data: dict
+
+    def to_sse(self):
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data, default=str)}\n\n"
+
+    def to_json(self):
+        return json.dumps({"id": self.id, "type": self.type, "data": self.data}, default=str)
+
+    @classmethod
+    def from_json(cls, raw):
+        payload = json.loads(raw)
+        return cls(payload["id"], payload["type"], payload["data"])
+
+
+class Subscription:
+    """One SSE connection's bounded inbox, owned by the event loop that created it."""
+
+    def __init__(self, maxsize):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def push(self, event):
+        # Runs on self.loop. A full queue means the client is not keeping up:
+        # stop feeding it and let the stream tell it to reconnect and resume.
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class FanoutHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+
+    def add(self, subscription):
+        with self._lock:
+            self._subscriptions.add(subscription)
+
+    def remove(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def dispatch(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, event)
+            except RuntimeError:  # loop already closed
+                self.remove(subscription)
+
+
+class InProcessBroker:
+    def __init__(self, replay_size=1000, queue_size=100):
+        self.hub = FanoutHub()
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._history = deque(maxlen=replay_size)
+
+    def id_key(self, event_id):
+        return int(event_id)
+
+    def publish(self, event_type, data):
+        with self._lock:
+            event = Event(str(next(self._ids)), event_type, data)
+            self._history.append(event)
+        self.hub.dispatch(event)
+        return event
+
+    async def subscribe(self):
+        subscription = Subscription(self.queue_size)
+        self.hub.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.hub.remove(subscription)
+
+    async def replay(self, last_event_id):
+        """
+        Events after `last_event_id`, or None if the id can't be resumed from:
+        some events were already dropped from history, or the id was handed out
+        by an earlier process (ids restart at 1 with the history).
+        """
+        last = self.id_key(last_event_id)
+        with self._lock:
+            history = list(self._history)
+        if not history or last > self.id_key(history[-1].id) or last < self.id_key(history[0].id) - 1:
+            return None
+        return [event for event in history if self.id_key(event.id) > last]
+
+
+class RedisBroker:
+    def __init__(self, url, replay_size=1000, queue_size=100):
+        import redis
+
+        self.url = url
+        self.hub = FanoutHub()
+        self.queue_size = queue_size
+        self.replay_size = replay_size
+        self._redis = redis.Redis.from_url(url)
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def id_key(self, event_id):
+        millis, _, seq = event_id.partition("-")
+        return int(millis), int(seq or 0)
+
+    def publish(self, event_type, data):
+        payload = json.dumps({"type": event_type, "data": data}, default=str)
+        event_id = self._redis.xadd(
+            STREAM, {"event": payload}, maxlen=self.replay_size, approximate=True
+        ).decode()
+        event = Event(event_id, event_type, data)
+        self._redis.publish(CHANNEL, event.to_json())
+        return event
+
+    async def subscribe(self):
+        self._ensure_listener()
+        subscription = Subscription(self.queue_size)
+        self.hub.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.hub.remove(subscription)
+
+    async def replay(self, last_event_id):
+        from redis import asyncio as aioredis
+        from redis.exceptions import ResponseError
+
+        client = aioredis.Redis.from_url(self.url, decode_responses=True)
+        try:
+            try:
+                info = await client.xinfo_stream(STREAM)
+            except ResponseError:  # no stream any more, the id is from before it was dropped
+                return None
+            last = self.id_key(last_event_id)
+            if last > self.id_key(info["last-generated-id"]):
+                return None  # never handed out by this stream
+            # Redis 7+ reports the newest id trimmed away; past the client's position means a gap.
+            trimmed = info.get("max-deleted-entry-id")
+            if trimmed and self.id_key(trimmed) > last:
+                return None
+            entries = await client.xrange(STREAM, min=f"({last_event_id}")
+        finally:
+            await client.aclose()
+
+        events = []
+        for entry_id, fields in entries:
+            payload = json.loads(fields["event"])
+            events.append(Event(entry_id, payload["type"], payload["data"]))
+        return events
+
+    def _ensure_listener(self):
+        # One pub/sub connection per process, shared by every SSE connection.
+        with self._listener_lock:
+            if self._listener is None or self._listener.done():
+                self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def _listen(self):
+        from redis import asyncio as aioredis
+
+        client = aioredis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(CHANNEL)
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    self.hub.dispatch(Event.from_json(message["data"]))
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = _make_broker()
+        return _broker
+
+
+def reset_broker():
+    global _broker
+    with _broker_lock:
+        _broker = None
+
+
+def _make_broker():
+    kind = getattr(settings, "TASK_EVENTS_BROKER", "inprocess")
+    options = {
+        "replay_size": getattr(settings, "TASK_EVENTS_REPLAY_SIZE", 1000),
+        "queue_size": getattr(settings, "TASK_EVENTS_QUEUE_SIZE", 100),
+    }
+    if kind == "redis":
+        return RedisBroker(settings.REDIS_URL, **options)
+    return InProcessBroker(**options)
+
+
+def publish(event_type, data):
+    """Publish now; a broker error is logged, never raised, since the write it reports has committed."""
+    try:
+        get_broker().publish(event_type, data)
+    except Exception:
+        logger.exception("Could not publish task %s event", event_type)
+
+
+def publish_on_commit(event_type, data):
+    """Publish once the current transaction commits, so rolled-back writes never reach clients."""
+    transaction.on_commit(lambda: publish(event_type, data))
+
+
+async def apublish(event_type, data):
+    """Publish from async views, whose async ORM writes have already committed when they return."""
+    await sync_to_async(publish)(event_type, data)
+
+
+async def stream(subscription, broker, last_event_id=None, heartbeat=15, reset=False):
+    """Async generator of SSE frames for one connection; `reset` opens with a reset event."""
+    try:
+        yield f"retry: {int(heartbeat * 1000)}\n\n"
+
+        last_seen = None
+        if reset:
+            yield "event: reset\ndata: {}\n\n"
+        elif last_event_id:
+            replayed = await broker.replay(last_event_id)
+            if replayed is None:
+                yield "event: reset\ndata: {}\n\n"
+            else:
+                last_seen = broker.id_key(last_event_id)
+                for event in replayed:
+                    last_seen = broker.id_key(event.id)
+                    yield event.to_sse()
+
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                if subscription.overflowed:
+                    yield "event: overflow\ndata: {}\n\n"
+                    return
+                yield ": heartbeat\n\n"
+                continue
+
+            key = broker.id_key(event.id)
+            if last_seen is not None and key <= last_seen:
+                continue  # already sent during replay
+            last_seen = key
+            yield event.to_sse()
+
+            if subscription.overflowed and subscription.queue.empty():
+                yield "event: overflow\ndata: {}\n\n"
+                return
+    finally:
+        broker.unsubscribe(subscription)
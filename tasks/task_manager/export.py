@@ -0,0 +1,75 @@
+"""
+Row streams for the task export endpoint.
+
+Rows are read with `values_list(...).iterator(chunk_size=...)`, so neither
+model instances nor the full result set are ever held in memory; output is
+yielded one chunk of rows at a time.
+"""
+import csv
+import json
+import zlib
+
+EXPORT_FIELDS = ["id", "title", "description", "completed", "created_at", "updated_at"]
+
+
+def format_datetime(value):
+    # Same representation as TaskSerializer's DateTimeField.
+    value = value.isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def iter_rows(queryset, chunk_size):
+    return queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def iter_ndjson(queryset, chunk_size):
+    dumps = json.dumps
+    lines = []
+    for pk, title, description, completed, created_at, updated_at in iter_rows(queryset, chunk_size):
+        lines.append(dumps({
+            "id": pk,
+            "title": title,
+            "description": description,
+            "completed": completed,
+            "created_at": format_datetime(created_at),
+            "updated_at": format_datetime(updated_at),
+        }))
+        if len(lines) >= chunk_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+class _Echo:
+    """File-like object whose write() just returns the line, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(queryset, chunk_size):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    lines = []
+    for pk, title, description, completed, created_at, updated_at in iter_rows(queryset, chunk_size):
+        lines.append(writer.writerow([
+            pk, title, description, "true" if completed else "false",
+            format_datetime(created_at), format_datetime(updated_at),
+        ]))
+        if len(lines) >= chunk_size:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+def gzip_stream(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,21 @@
+from django_filters import rest_framework as filters
+
+from .models import Task
+from .search import search
+
+
+class TaskFilter(filters.FilterSet):
+    completed = filters.BooleanFilter(method="filter_completed")
+    q = filters.CharFilter(method="filter_search")
+
+    class Meta:
+        model = Task
+        fields = ["completed"]
+
+    def filter_completed(self, queryset, name, value):
+        # Django renders `completed=True` as a bare `WHERE "completed"`, which SQLite
+        # cannot seek task_completed_created_idx with; `IN (?)` is an equality probe.
+        return queryset.filter(completed__in=[value])
+
+    def filter_search(self, queryset, name, value):
+        return search(queryset, value)
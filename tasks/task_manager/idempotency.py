@@ -0,0 +1,202 @@
+"""
+`Idempotency-Key` handling for task writes.
+
+The first request with a given key (per user, method and path) runs under a
+lock taken with `cache.add`. The lock holds a per-request token and is
+released with a compare-and-delete (see `_release`), so a request whose lock
+expired mid-handler never releases a lock another request now holds, and the
+stored response is checked again once the lock is taken, in
+case the previous holder finished in between. Its response is stored for
+`TASK_IDEMPOTENCY_TTL` seconds and replayed, marked `Idempotent-Replayed`,
+for every retry. A retry that arrives while the first request is still
+running waits for its response (up to `TASK_IDEMPOTENCY_WAIT` seconds, then
+409), so only one insert ever runs. Reusing a key with a different body is a
+422. 5xx responses are not stored, so those can be retried.
+
+State lives in the task cache (`TASK_CACHE_ALIAS`), i.e. Redis when
+`REDIS_URL` is set.
+"""
+import asyncio
+import hashlib
+import json
+import pickle
+import time
+import uuid
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.http import HttpResponse
+from rest_framework.response import Response
+
+from .cache import get_cache
+from .renderers import FastJSONRenderer
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+# Compare-and-delete for the lock, so no other request can take it in between.
+RELEASE_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _settings():
+    return (
+        getattr(settings, "TASK_IDEMPOTENCY_TTL", 86400),
+        getattr(settings, "TASK_IDEMPOTENCY_LOCK_TIMEOUT", 30),
+        getattr(settings, "TASK_IDEMPOTENCY_WAIT", 5),
+    )
+
+
+def _keys(request, key):
+    scope = hashlib.sha256(f"{request.user.pk}:{request.method}:{request.path}:{key}".encode()).hexdigest()
+    return f"tasks:idem:{scope}", f"tasks:idem:{scope}:lock"
+
+
+def fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _invalid_key():
+    return Response({"error": f"{HEADER} must be 1-{MAX_KEY_LENGTH} characters"}, status=400)
+
+
+def _replay(entry, request_fingerprint):
+    if entry["fingerprint"] != request_fingerprint:
+        return Response({"error": f"{HEADER} was already used with a different request body"}, status=422)
+    return Response(entry["data"], status=entry["status"], headers={"Idempotent-Replayed": "true"})
+
+
+def _in_progress():
+    return Response({"error": f"A request with this {HEADER} is still in progress"}, status=409)
+
+
+def _render(response):
+    # Async views answer with plain HttpResponses.
+    rendered = HttpResponse(FastJSONRenderer().render(response.data), status=response.status_code,
+                            content_type="application/json")
+    for header, value in response.items():
+        if header != "Content-Type":
+            rendered[header] = value
+    return rendered
+
+
+def _entry(response, request_fingerprint):
+    return {"status": response.status_code, "data": response.data, "fingerprint": request_fingerprint}
+
+
+def _release(cache, lock_key, token):
+    """
+    Delete the lock only while it still holds `token`, as one step: a Lua
+    script on Redis, under the cache's own lock on LocMemCache. Other backends
+    fall back to get-then-delete, which can drop a lock another request took
+    in between.
+    """
+    key = cache.make_and_validate_key(lock_key)
+    if isinstance(cache, RedisCache):
+        client = cache._cache.get_client(key, write=True)
+        client.register_script(RELEASE_LUA)(keys=[key], args=[token])
+    elif isinstance(cache, LocMemCache):
+        with cache._lock:
+            if not cache._has_expired(key) and pickle.loads(cache._cache[key]) == token:
+                cache._delete(key)
+    elif cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+async def _arelease(cache, lock_key, token):
+    await sync_to_async(_release)(cache, lock_key, token)
+
+
+def run_idempotent(request, handler):
+    """Run `handler()` at most once per Idempotency-Key; without the header just run it."""
+    key = request.headers.get(HEADER)
+    if key is None:
+        return handler()
+    if not 0 < len(key) <= MAX_KEY_LENGTH:
+        return _invalid_key()
+
+    ttl, lock_timeout, wait = _settings()
+    cache = get_cache()
+    response_key, lock_key = _keys(request, key)
+    request_fingerprint = fingerprint(request.data)
+    token = uuid.uuid4().int  # an int is stored unpickled, so the release script can compare it
+
+    deadline = time.monotonic() + wait
+    while True:
+        entry = cache.get(response_key)
+        if entry is None and cache.add(lock_key, token, timeout=lock_timeout):
+            # The holder we waited for may have stored its response just before releasing.
+            entry = cache.get(response_key)
+            if entry is None:
+                break
+            _release(cache, lock_key, token)
+        if entry is not None:
+            return _replay(entry, request_fingerprint)
+        if time.monotonic() >= deadline:
+            return _in_progress()
+        time.sleep(POLL_INTERVAL)
+
+    try:
+        response = handler()
+        if response.status_code < 500:
+            cache.set(response_key, _entry(response, request_fingerprint), timeout=ttl)
+        return response
+    finally:
+        _release(cache, lock_key, token)
+
+
+async def arun_idempotent(request, handler):
+    """`run_idempotent` for async views; `handler` is a coroutine function returning a JSON HttpResponse."""
+    key = request.headers.get(HEADER)
+    if key is None:
+        return await handler()
+    if not 0 < len(key) <= MAX_KEY_LENGTH:
+        return _render(_invalid_key())
+
+    ttl, lock_timeout, wait = _settings()
+    cache = get_cache()
+    response_key, lock_key = _keys(request, key)
+    request_fingerprint = fingerprint(request.data)
+    token = uuid.uuid4().int
+
+    deadline = time.monotonic() + wait
+    while True:
+        entry = await cache.aget(response_key)
+        if entry is None and await cache.aadd(lock_key, token, timeout=lock_timeout):
+            entry = await cache.aget(response_key)
+            if entry is None:
+                break
+            await _arelease(cache, lock_key, token)
+        if entry is not None:
+            return _render(_replay(entry, request_fingerprint))
+        if time.monotonic() >= deadline:
+            return _render(_in_progress())
+        await asyncio.sleep(POLL_INTERVAL)
+
+    try:
+        response = await handler()
+        if response.status_code < 500:
+            data = json.loads(response.content) if response.content else None
+            entry = {"status": response.status_code, "data": data, "fingerprint": request_fingerprint}
+            await cache.aset(response_key, entry, timeout=ttl)
+        return response
+    finally:
+        await _arelease(cache, lock_key, token)
+
+
+def idempotent(method):
+    """Decorator for APIView write methods honouring the Idempotency-Key header."""
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        return run_idempotent(request, lambda: method(self, request, *args, **kwargs))
+
+    return wrapper
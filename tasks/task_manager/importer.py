@@ -0,0 +1,196 @@
+"""
+Streaming NDJSON/CSV importer for tasks.
+
+Shared by `manage.py import_tasks` and `POST /api/tasks/import/`. Input is read
+one record at a time, validated with `validate_task_row` (a plain-Python
+mirror of `TaskSerializer`'s rules) and inserted with `bulk_create` once a
+chunk fills up, so memory is bounded by the chunk size, not the file size.
+"""
+import csv
+import gzip
+import json
+import time
+import zlib
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from rest_framework import serializers
+
+from tasks import queries
+
+from .models import Task
+
+TITLE_MAX_LENGTH = Task._meta.get_field("title").max_length
+FORMATS = ("ndjson", "csv")
+# Raised while reading a non-UTF-8, corrupt or truncated (gzip) input.
+READ_ERRORS = (UnicodeDecodeError, gzip.BadGzipFile, EOFError, zlib.error)
+
+
+class UnreadableInput(Exception):
+    """The input stopped decoding part way through; `result` covers the chunks written before."""
+
+    def __init__(self, result, error):
+        super().__init__(f"Could not read the input: {error} ({result.created} tasks were imported before it)")
+        self.result = result
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def processed(self):
+        return self.created + self.failed
+
+    @property
+    def rows_per_second(self):
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "created": self.created,
+            "failed": self.failed,
+            "errors": self.errors,
+            "elapsed": round(self.elapsed, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+        }
+
+
+def guess_format(filename):
+    name = filename.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    return "csv" if name.endswith(".csv") else "ndjson"
+
+
+def iter_records(stream, import_format):
+    """Yield `(line_number, record_or_None, parse_error_or_None)` from a text stream."""
+    if import_format == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            # CSV cannot omit a column per row: treat empty optional cells as absent.
+            record = {key: value for key, value in record.items() if value != "" or key == "title"}
+            yield reader.line_num, record, None
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield line_number, None, f"Invalid JSON: {exc}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, "Expected a JSON object"
+            continue
+        yield line_number, record, None
+
+
+def _clean_string(value, allow_blank, max_length=None):
+    if value is None:
+        return None, "This field may not be null."
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        return None, "Not a valid string."
+    value = str(value).strip()
+    if "\x00" in value:
+        return None, "Null characters are not allowed."
+    if not value and not allow_blank:
+        return None, "This field may not be blank."
+    if max_length is not None and len(value) > max_length:
+        return None, f"Ensure this field has no more than {max_length} characters."
+    return value, None
+
+
+def _clean_boolean(value):
+    try:
+        if value in serializers.BooleanField.TRUE_VALUES:
+            return True, None
+        if value in serializers.BooleanField.FALSE_VALUES:
+            return False, None
+    except TypeError:  # unhashable, e.g. a JSON list
+        pass
+    if value is None:
+        return None, "This field may not be null."
+    return None, "Must be a valid boolean."
+
+
+def validate_task_row(record):
+    """
+    Validate one input record the way `TaskSerializer(data=record)` would.
+
+    Returns `(data, errors)`; `data` holds model field values when `errors`
+    is empty. Read-only and unknown keys are ignored, as DRF does.
+    """
+    data, errors = {}, {}
+
+    if "title" not in record:
+        errors["title"] = "This field is required."
+    else:
+        data["title"], error = _clean_string(record["title"], False, TITLE_MAX_LENGTH)
+        if error:
+            errors["title"] = error
+
+    if "description" in record:
+        data["description"], error = _clean_string(record["description"], True)
+        if error:
+            errors["description"] = error
+
+    if "completed" in record:
+        data["completed"], error = _clean_boolean(record["completed"])
+        if error:
+            errors["completed"] = error
+
+    return data, errors
+
+
+def import_tasks(records, chunk_size=1000, max_errors=100, progress=None):
+    """
+    Validate and insert `records` (as produced by `iter_records`) in chunks.
+
+    Each full chunk is inserted with one `bulk_create` in its own transaction,
+    so a failure part way through keeps the chunks already written; an input
+    that cannot be decoded raises `UnreadableInput`. At most `max_errors` row
+    errors are kept; `progress(result)` runs after each chunk.
+    """
+    result = ImportResult()
+    started = time.perf_counter()
+    pending = []
+
+    def flush():
+        queries.allow_queries(2)  # the chunk's BEGIN, or SAVEPOINT and RELEASE
+        queries.allow_bulk_create(pending)
+        with transaction.atomic():
+            Task.objects.bulk_create(pending)
+        result.created += len(pending)
+        pending.clear()
+        result.elapsed = time.perf_counter() - started
+        if progress:
+            progress(result)
+
+    try:
+        for line_number, record, parse_error in records:
+            if parse_error:
+                errors = {"non_field_errors": parse_error}
+            else:
+                data, errors = validate_task_row(record)
+            if errors:
+                result.failed += 1
+                if len(result.errors) < max_errors:
+                    result.errors.append({"line": line_number, "errors": errors})
+                continue
+
+            pending.append(Task(**data))
+            if len(pending) >= chunk_size:
+                flush()
+    except READ_ERRORS as exc:
+        result.elapsed = time.perf_counter() - started
+        raise UnreadableInput(result, exc) from exc
+
+    if pending:
+        flush()
+    result.elapsed = time.perf_counter() - started
+    return result
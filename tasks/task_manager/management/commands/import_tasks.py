@@ -0,0 +1,64 @@
+import gzip
+import io
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from task_manager.importer import FORMATS, UnreadableInput, guess_format, import_tasks, iter_records
+
+
+class Command(BaseCommand):
+    help = "Stream tasks from an NDJSON or CSV file (optionally .gz, or '-' for stdin) into the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, or '-' to read stdin")
+        parser.add_argument("--format", choices=FORMATS, dest="import_format",
+                            help="Input format (default: guessed from the file name, else ndjson)")
+        parser.add_argument("--chunk-size", type=int,
+                            default=getattr(settings, "TASK_IMPORT_CHUNK_SIZE", 1000),
+                            help="Rows per bulk_create / transaction")
+        parser.add_argument("--max-errors", type=int, default=100,
+                            help="Number of row errors to print")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        import_format = options["import_format"] or guess_format(path)
+        if options["chunk_size"] <= 0:
+            raise CommandError("--chunk-size must be positive")
+
+        try:
+            stream = self.open(path)
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        def progress(result):
+            self.stdout.write(
+                f"{result.processed} rows ({result.created} created, {result.failed} failed) "
+                f"- {result.rows_per_second:.0f} rows/s"
+            )
+
+        with stream:
+            try:
+                result = import_tasks(
+                    iter_records(stream, import_format),
+                    chunk_size=options["chunk_size"],
+                    max_errors=options["max_errors"],
+                    progress=progress,
+                )
+            except UnreadableInput as exc:
+                raise CommandError(str(exc))
+
+        for error in result.errors:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} tasks, {result.failed} rows failed, "
+            f"in {result.elapsed:.2f}s ({result.rows_per_second:.0f} rows/s)"
+        ))
+
+    def open(self, path):
+        if path == "-":
+            return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+        if path.endswith(".gz"):
+            return gzip.open(path, "rt", encoding="utf-8", newline="")
+        return open(path, encoding="utf-8", newline="")
@@ -0,0 +1,26 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from task_manager.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete task tombstones older than the delta-sync retention period, in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-days", type=int,
+                            help="Override TASK_TOMBSTONE_RETENTION_DAYS")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        older_than = options["older_than_days"]
+        started = time.perf_counter()
+        removed = prune_tombstones(
+            older_than=timedelta(days=older_than) if older_than is not None else None,
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {removed} tombstones in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from task_manager.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text index behind ?q= from the task table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+        parser.add_argument("--optimize", action="store_true",
+                            help="Also merge the FTS5 index into one segment (SQLite)")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        outcome = rebuild_index(using=options["database"], optimize=options["optimize"])
+        self.stdout.write(self.style.SUCCESS(f"{outcome.capitalize()} in {time.perf_counter() - started:.2f}s"))
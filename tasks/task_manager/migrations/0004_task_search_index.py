@@ -0,0 +1,91 @@
+from django.db import migrations
+
+SQLITE_FORWARDS = [
+    """
+    CREATE VIRTUAL TABLE task_manager_task_fts USING fts5(
+        title, description,
+        content='task_manager_task', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER task_manager_task_fts_insert AFTER INSERT ON task_manager_task BEGIN
+        INSERT INTO task_manager_task_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER task_manager_task_fts_delete AFTER DELETE ON task_manager_task BEGIN
+        INSERT INTO task_manager_task_fts(task_manager_task_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER task_manager_task_fts_update AFTER UPDATE OF title, description ON task_manager_task BEGIN
+        INSERT INTO task_manager_task_fts(task_manager_task_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO task_manager_task_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    # Default `rank` = bm25 with title matches weighted 10x over description.
+    "INSERT INTO task_manager_task_fts(task_manager_task_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",
+    "INSERT INTO task_manager_task_fts(task_manager_task_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARDS = [
+    "DROP TRIGGER IF EXISTS task_manager_task_fts_insert",
+    "DROP TRIGGER IF EXISTS task_manager_task_fts_delete",
+    "DROP TRIGGER IF EXISTS task_manager_task_fts_update",
+    "DROP TABLE IF EXISTS task_manager_task_fts",
+]
+
+POSTGRES_FORWARDS = [
+    """
+    CREATE INDEX IF NOT EXISTS task_search_idx ON task_manager_task USING GIN (
+        (setweight(to_tsvector('english'::regconfig, title), 'A') ||
+         setweight(to_tsvector('english'::regconfig, description), 'B'))
+    )
+    """,
+]
+
+POSTGRES_BACKWARDS = ["DROP INDEX IF EXISTS task_search_idx"]
+
+
+def _has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def _run(schema_editor, statements):
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def forwards(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite" and _has_fts5(connection):
+        _run(schema_editor, SQLITE_FORWARDS)
+    elif connection.vendor == "postgresql":
+        _run(schema_editor, POSTGRES_FORWARDS)
+
+
+def backwards(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        _run(schema_editor, SQLITE_BACKWARDS)
+    elif connection.vendor == "postgresql":
+        _run(schema_editor, POSTGRES_BACKWARDS)
+
+
+class Migration(migrations.Migration):
+    """Full-text index over task title/description for ?q= (see task_manager/search.py)."""
+
+    dependencies = [
+        ('task_manager', '0003_task_tombstone'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
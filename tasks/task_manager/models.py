@@ -1,4 +1,48 @@
 from django.db import models
+from django.utils import timezone
+
+from tasks import queries
+
+from .cache import invalidate_task_cache
+
+
+class TaskQuerySet(models.QuerySet):
+    """Bulk writes skip model signals, so they invalidate the response cache themselves."""
+
+    def bulk_create(self, *args, **kwargs):
+        objs = super().bulk_create(*args, **kwargs)
+        invalidate_task_cache()
+        return objs
+
+    def bulk_update(self, *args, **kwargs):
+        rows = super().bulk_update(*args, **kwargs)
+        invalidate_task_cache()
+        return rows
+
+    def update(self, **kwargs):
+        # Keep updated_at moving so delta sync (and ETags) see queryset updates too.
+        kwargs.setdefault("updated_at", timezone.now())
+        rows = super().update(**kwargs)
+        invalidate_task_cache()
+        return rows
+
+    def fast_delete(self):
+        """
+        Delete with a single `DELETE ... WHERE id IN (...)` and return the deleted ids.
+
+        Unlike `delete()`, no model instances are built and no per-row signals
+        are sent; nothing references Task, so there are no cascades to collect.
+        Tombstones are written in one bulk insert instead.
+        """
+        ids = list(self.values_list("pk", flat=True))
+        if ids:
+            self.model._base_manager.using(self.db).filter(pk__in=ids)._raw_delete(self.db)
+            tombstones = [TaskTombstone(task_id=pk) for pk in ids]
+            queries.allow_bulk_create(tombstones, self.db)
+            TaskTombstone.objects.using(self.db).bulk_create(tombstones)
+            invalidate_task_cache()
+        return ids
+
 
 # Create your models here.
 class Task(models.Model):
@@ -8,5 +52,28 @@ class Task(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["completed", "created_at", "id"], name="task_completed_created_idx"),
+            models.Index(fields=["created_at", "id"], name="task_created_idx"),
+            models.Index(fields=["updated_at", "id"], name="task_updated_idx"),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class TaskTombstone(models.Model):
+    """Marks a deleted task so delta sync clients can drop it; pruned after a retention period."""
+    task_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["deleted_at", "id"], name="tombstone_deleted_idx"),
+        ]
+
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return f"Task {self.task_id} deleted at {self.deleted_at}"
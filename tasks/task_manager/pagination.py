@@ -0,0 +1,184 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime
+
+from django.conf import settings
+from django.core.paginator import InvalidPage, Page
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class TaskPagination(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = "page_size"
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """`paginate_queryset` for async views: COUNT and the page slice go through the async ORM."""
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        if page_number in self.last_page_strings:
+            page_number = paginator.num_pages
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+
+        bottom = (number - 1) * page_size
+        objects = [obj async for obj in queryset[bottom:bottom + page_size]]
+        self.page = Page(objects, number, paginator)
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return objects
+
+
+class TaskCursorPagination(BasePagination):
+    """
+    Keyset pagination over (created_at, id), newest first.
+
+    Each page is fetched with an index seek past the last row seen instead of
+    `OFFSET n`, and no `COUNT(*)` is issued, so deep pages cost the same as the
+    first one. The seek is spelled `created_at <= ? AND NOT (created_at = ? AND
+    id >= ?)` rather than the equivalent OR form, which SQLite cannot turn into
+    an index range.
+    """
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self._set_page(list(self._page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self._set_page([obj async for obj in self._page_queryset(queryset, request)])
+
+    def _page_queryset(self, queryset, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.cursor = self.decode_cursor(request)
+
+        if self.cursor is None:
+            queryset = queryset.order_by("-created_at", "-id")
+        else:
+            created_at, pk, reverse = self.cursor
+            if reverse:
+                queryset = queryset.filter(
+                    Q(created_at__gte=created_at) & ~Q(created_at=created_at, id__lte=pk)
+                ).order_by("created_at", "id")
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__lte=created_at) & ~Q(created_at=created_at, id__gte=pk)
+                ).order_by("-created_at", "-id")
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, results):
+        reverse = self.cursor is not None and self.cursor[2]
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], reverse=True)
+
+    def _link(self, task, reverse):
+        # `task` may be a model instance or a named `values_list` row.
+        token = encode_cursor(task.created_at, task.id, reverse)
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            return decode_cursor(token)
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+def encode_token(payload):
+    """Opaque URL-safe token for a small JSON payload."""
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_token(token):
+    """Inverse of `encode_token`; raises ValueError (or KeyError/TypeError downstream) when malformed."""
+    padded = token + "=" * (-len(token) % 4)
+    payload = json.loads(urlsafe_b64decode(padded.encode()))
+    if not isinstance(payload, dict):
+        raise ValueError("token payload must be an object")
+    return payload
+
+
+def encode_cursor(created_at, pk, reverse=False):
+    payload = {"c": created_at.isoformat(), "i": pk}
+    if reverse:
+        payload["r"] = 1
+    return encode_token(payload)
+
+
+def decode_cursor(token):
+    payload = decode_token(token)
+    created_at = datetime.fromisoformat(payload["c"])
+    return created_at, int(payload["i"]), bool(payload.get("r"))
+
+
+def get_task_paginator(request):
+    """Pick the paginator for a list request: `?pagination=` wins over settings."""
+    mode = request.query_params.get("pagination") or getattr(settings, "TASK_PAGINATION_MODE", "page")
+    if mode == "cursor" or TaskCursorPagination.cursor_query_param in request.query_params:
+        return TaskCursorPagination()
+    return TaskPagination()
@@ -0,0 +1,105 @@
+"""
+Full-text search for `?q=` on the task list.
+
+SQLite: an external-content FTS5 table (`task_manager_task_fts`, created by
+migration 0004) indexes title and description. Triggers on the task table
+keep it in sync, including for `bulk_create` and queryset updates. Matches are
+ranked by bm25 with title hits weighted 10x. Every word is a prefix match,
+so `?q=rep` finds "report".
+
+PostgreSQL: a GIN index on a weighted `tsvector` of the same columns,
+queried with `websearch_to_tsquery` and ranked with `ts_rank`.
+
+Any other database (or SQLite built without FTS5) falls back to
+`icontains` on both columns, unranked.
+"""
+import re
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Task
+
+TABLE = Task._meta.db_table
+FTS_TABLE = f"{TABLE}_fts"
+PG_INDEX = "task_search_idx"
+PG_DOCUMENT = (
+    "(setweight(to_tsvector('english'::regconfig, title), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, description), 'B'))"
+)
+
+_fts_available = {}
+
+
+def has_fts(using="default"):
+    if using not in _fts_available:
+        with connections[using].cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            _fts_available[using] = cursor.fetchone() is not None
+    return _fts_available[using]
+
+
+async def ahas_fts(using="default"):
+    """`has_fts` for the async views: the first lookup runs its query in a worker thread."""
+    if using not in _fts_available:
+        await sync_to_async(has_fts)(using)
+    return _fts_available[using]
+
+
+def terms(text):
+    return re.findall(r"\w+", text)
+
+
+def fts_query(text):
+    """User input -> FTS5 query: every word a quoted prefix term, all required."""
+    return " ".join(f'"{term}"*' for term in terms(text))
+
+
+def search(queryset, text):
+    """Restrict `queryset` to tasks matching `text`, best matches first (then newest)."""
+    vendor = connections[queryset.db].vendor
+    if vendor == "sqlite" and has_fts(queryset.db):
+        match = fts_query(text)
+        if not match:
+            return queryset
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f"{FTS_TABLE}.rowid = {TABLE}.id", f"{FTS_TABLE} MATCH %s"],
+            params=[match],
+            order_by=[f"{FTS_TABLE}.rank", "-created_at", "-id"],
+        )
+    if vendor == "postgresql":
+        if not terms(text):
+            return queryset
+        query = "websearch_to_tsquery('english'::regconfig, %s)"
+        return queryset.extra(
+            where=[f"{PG_DOCUMENT} @@ {query}"], params=[text],
+        ).annotate(
+            search_rank=RawSQL(f"ts_rank({PG_DOCUMENT}, {query})", [text]),
+        ).order_by("-search_rank", "-created_at", "-id")
+
+    return icontains_search(queryset, text)
+
+
+def icontains_search(queryset, text):
+    """The unindexed fallback: every word must appear in the title or the description."""
+    for term in terms(text):
+        queryset = queryset.filter(Q(title__icontains=term) | Q(description__icontains=term))
+    return queryset
+
+
+def rebuild_index(using="default", optimize=False):
+    """Re-read every task into the search index; returns a short description of what ran."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite" and has_fts(using):
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            if optimize:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+            return f"rebuilt {FTS_TABLE}"
+        if connection.vendor == "postgresql":
+            cursor.execute(f"REINDEX INDEX {PG_INDEX}")
+            return f"reindexed {PG_INDEX}"
+    return "no search index on this database; ?q= uses icontains"
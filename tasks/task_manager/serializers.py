@@ -1,11 +1,31 @@
+from django.conf import settings
 from rest_framework import serializers
+from tasks.profiling import section
+
 from .models import Task
 
+TASK_FIELDS = ("id", "title", "description", "completed", "created_at", "updated_at")
+# Always selected for list pages: the cursor paginator builds its links from them.
+PAGE_KEY_FIELDS = ("id", "created_at")
+
+
+class TimedDataMixin:
+
+    @property
+    def data(self):
+        with section("serialize"):
+            return super().data
+
+
+class TaskListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
 
-class TaskSerializer(serializers.ModelSerializer):
+
+class TaskSerializer(TimedDataMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Task
+        list_serializer_class = TaskListSerializer
         fields = [
             'id',
             'title',
@@ -14,3 +34,69 @@ class TaskSerializer(serializers.ModelSerializer):
             'created_at',
             'updated_at',
         ]
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+def parse_fields(request):
+    """The `?fields=title,completed` selection as a tuple in response order, or None for every field."""
+    raw = request.query_params.get("fields")
+    if not raw:
+        return None
+    requested = {name.strip() for name in raw.split(",") if name.strip()}
+    unknown = requested - set(TASK_FIELDS)
+    if unknown:
+        raise serializers.ValidationError({"fields": [f"Unknown field(s): {', '.join(sorted(unknown))}"]})
+    return tuple(name for name in TASK_FIELDS if name in requested) or None
+
+
+class TaskPageSerializer:
+    """
+    Serializes list pages, limited to `fields` both in SQL and in the output.
+
+    By default (`TASK_FAST_SERIALIZER`) the page is read with `values_list`
+    and each row is turned into a dict directly, skipping the per-field
+    machinery of `TaskSerializer`; the rendered JSON is identical. With the setting
+    off, model instances are loaded with `.only()` and run through
+    `TaskSerializer`.
+    """
+
+    def __init__(self, fields=None, fast=None):
+        self.fields = fields or TASK_FIELDS
+        self.columns = self.fields + tuple(name for name in PAGE_KEY_FIELDS if name not in self.fields)
+        self.fast = getattr(settings, "TASK_FAST_SERIALIZER", True) if fast is None else fast
+
+    def prepare(self, queryset):
+        if self.fast:
+            # Named rows keep `.created_at` / `.id` available to the cursor paginator.
+            return queryset.values_list(*self.columns, named=True)
+        return queryset.only(*self.columns)
+
+    def serialize(self, page):
+        if not self.fast:
+            # TaskListSerializer.data records the "serialize" section itself.
+            return TaskSerializer(page, many=True, fields=self.fields).data
+        with section("serialize"):
+            return rows_to_dicts(page, self.fields)
+
+
+def rows_to_dicts(rows, fields):
+    """
+    `values_list` rows (in `fields` order, possibly with trailing extras) to
+    TaskSerializer-shaped dicts. Datetimes are left as they are; the JSON
+    renderer (`renderers.FastJSONRenderer`) formats them like TaskSerializer.
+    """
+    count = len(fields)
+    return [dict(zip(fields, row[:count])) for row in rows]
+
+class TaskBulkDeleteSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+
+class TaskImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    import_format = serializers.ChoiceField(choices=["ndjson", "csv"], required=False)
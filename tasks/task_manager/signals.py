@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_task_cache
+from .models import Task, TaskTombstone
+
+
+@receiver(post_save, sender=Task)
+def task_saved(sender, instance, **kwargs):
+    invalidate_task_cache()
+
+
+@receiver(post_delete, sender=Task)
+def task_deleted(sender, instance, **kwargs):
+    TaskTombstone.objects.create(task_id=instance.pk)
+    invalidate_task_cache()
@@ -0,0 +1,136 @@
+"""
+Delta sync: tasks changed and tasks deleted since a client-held watermark.
+
+The watermark is an opaque token holding a keyset position over Task
+(updated_at, id), the id of the last tombstone the client has seen, and the
+time it was issued. Both walks are index range scans, so a sync costs
+O(changes), not O(table).
+
+`updated_at` is stamped before the writing transaction commits, so the task
+walk stops `TASK_SYNC_LAG_SECONDS` short of now: a row stamped just before a
+sync but committed just after it is picked up by the next one instead of
+falling behind the watermark. Tombstones are walked by id, which only grows.
+
+A watermark is stale only when it was issued before the retention window and
+tombstones it has not seen may have been pruned.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Task, TaskTombstone
+from .pagination import decode_token, encode_token
+
+
+class StaleWatermark(Exception):
+    """The watermark predates tombstone retention; the client must resync from scratch."""
+
+
+def get_retention():
+    return timedelta(days=getattr(settings, "TASK_TOMBSTONE_RETENTION_DAYS", 30))
+
+
+def get_lag():
+    return timedelta(seconds=getattr(settings, "TASK_SYNC_LAG_SECONDS", 5))
+
+
+def encode_watermark(watermark):
+    updated_at, task_id, synced_at, tombstone_id = watermark
+    return encode_token({
+        "u": updated_at and updated_at.isoformat(),
+        "i": task_id,
+        "d": synced_at.isoformat(),
+        "t": tombstone_id,
+    })
+
+
+def _aware(value):
+    moment = datetime.fromisoformat(value)
+    if timezone.is_naive(moment):
+        raise ValueError("Watermark times must carry a UTC offset")
+    return moment
+
+
+def decode_watermark(token):
+    payload = decode_token(token)
+    updated_at = payload["u"] and _aware(payload["u"])
+    return updated_at, int(payload["i"]), _aware(payload["d"]), int(payload["t"])
+
+
+def initial_watermark(now):
+    """Position before every task and after every existing tombstone."""
+    latest = TaskTombstone.objects.order_by("-id").values_list("id", flat=True).first()
+    return None, 0, now, latest or 0
+
+
+def is_stale(synced_at, tombstone_id, now):
+    """
+    True when tombstones after `tombstone_id` may already be pruned: the
+    watermark was issued before the retention window and the oldest tombstone
+    still kept is not the next one it would see. A gap in ids (a rolled back
+    delete) errs on the side of a resync.
+    """
+    if synced_at >= now - get_retention():
+        return False
+    oldest = TaskTombstone.objects.order_by("id").values_list("id", flat=True).first()
+    return oldest is None or oldest > tombstone_id + 1
+
+
+def _after(queryset, time_field, position, pk):
+    return queryset.filter(
+        Q(**{f"{time_field}__gte": position}) & ~Q(**{time_field: position, "id__lte": pk})
+    )
+
+
+def changes_since(watermark, limit):
+    """
+    Return `(changed_tasks, deleted_task_ids, next_watermark, has_more)`.
+
+    A `watermark` of None is an initial sync. Each stream returns at most
+    `limit` rows in keyset order; `has_more` tells the client to call again
+    with `next_watermark` straight away.
+    """
+    now = timezone.now()
+    if watermark is None:
+        watermark = initial_watermark(now)
+    elif is_stale(watermark[2], watermark[3], now):
+        raise StaleWatermark()
+    updated_at, task_id, _, tombstone_id = watermark
+
+    tasks = Task.objects.filter(updated_at__lt=now - get_lag())
+    if updated_at is not None:
+        tasks = _after(tasks, "updated_at", updated_at, task_id)
+    changed = list(tasks.order_by("updated_at", "id")[:limit + 1])
+
+    deleted = list(
+        TaskTombstone.objects.filter(id__gt=tombstone_id)
+        .order_by("id").values_list("id", "task_id")[:limit + 1]
+    )
+
+    has_more = len(changed) > limit or len(deleted) > limit
+    changed, deleted = changed[:limit], deleted[:limit]
+
+    if changed:
+        updated_at, task_id = changed[-1].updated_at, changed[-1].pk
+    if deleted:
+        tombstone_id = deleted[-1][0]
+
+    next_watermark = (updated_at, task_id, now, tombstone_id)
+    return changed, [pk for _, pk in deleted], next_watermark, has_more
+
+
+def prune_tombstones(older_than=None, batch_size=1000):
+    """Delete tombstones past retention in short batches; return how many were removed."""
+    cutoff = timezone.now() - (older_than if older_than is not None else get_retention())
+    removed = 0
+    while True:
+        ids = list(
+            TaskTombstone.objects.filter(deleted_at__lt=cutoff)
+            .order_by("deleted_at", "id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return removed
+        removed += TaskTombstone.objects.filter(id__in=ids).delete()[0]
@@ -1,10 +1,51 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import pstats
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncClient, AsyncRequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from .models import Task
+from auth.blacklist import token_counts
+from auth.tokens import StampedRefreshToken
+from tasks import compression, metrics, profiling, queries
+
+from .async_views import AsyncTaskDetailView, AsyncTaskListCreateView
+from .models import Task, TaskTombstone
+from .serializers import TaskPageSerializer, TaskSerializer
+from .views import TaskDetailAPI, TaskListCreateAPI
+from . import cache as task_cache
+from . import conditional
+from . import events
+from . import idempotency
+from . import importer
+from . import renderers
+from . import search
+from . import sync
 
 User = get_user_model()
 
@@ -123,3 +164,1551 @@ class TaskAPITests(APITestCase):
         response = self.user_client.delete(self.detail_url(self.task2.pk))
         self.assertEqual(response.status_code, 403)
         self.assertTrue(Task.objects.filter(pk=self.task2.pk).exists())
+
+
+class TaskCursorPaginationTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="reader@example.com",
+            email="reader@example.com",
+            password="reader123",
+        )
+        refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.cookies["access_token"] = str(refresh.access_token)
+
+        self.tasks = [
+            Task.objects.create(title=f"Task {i}", completed=bool(i % 2))
+            for i in range(7)
+        ]
+        self.list_url = "/api/tasks/"
+
+    def _walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.data)
+            seen.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+        return seen
+
+    def test_cursor_mode_walks_every_task_once_newest_first(self):
+        seen = self._walk(self.list_url + "?pagination=cursor&page_size=3")
+        self.assertEqual(seen, [t.pk for t in reversed(self.tasks)])
+
+    def test_cursor_mode_combines_with_completed_filter(self):
+        seen = self._walk(self.list_url + "?pagination=cursor&page_size=2&completed=true")
+        expected = [t.pk for t in reversed(self.tasks) if t.completed]
+        self.assertEqual(seen, expected)
+
+    def test_previous_link_returns_preceding_page(self):
+        first = self.client.get(self.list_url + "?pagination=cursor&page_size=3")
+        self.assertIsNone(first.data["previous"])
+        second = self.client.get(first.data["next"])
+        back = self.client.get(second.data["previous"])
+        self.assertEqual(
+            [item["id"] for item in back.data["results"]],
+            [item["id"] for item in first.data["results"]],
+        )
+
+    @override_settings(TASK_PAGINATION_MODE="cursor")
+    def test_cursor_mode_can_be_enabled_in_settings(self):
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("next", response.data)
+        self.assertNotIn("count", response.data)
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(self.list_url + "?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN output is SQLite specific")
+class TaskListQueryPlanTests(APITestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username="plan@example.com", password="plan123")
+        refresh = RefreshToken.for_user(user)
+        self.client = APIClient()
+        self.client.cookies["access_token"] = str(refresh.access_token)
+        Task.objects.bulk_create(Task(title=f"Task {i}", completed=bool(i % 2)) for i in range(30))
+
+    def _task_query_plans(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        plans = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                sql = query["sql"]
+                # Skips the paginator's COUNT(*) and the list ETag lookup (see test_list_etag_is_an_index_seek).
+                if "task_manager_task" not in sql or "COUNT(*)" in sql or "task_manager_tasktombstone" in sql:
+                    continue
+                cursor.execute("EXPLAIN QUERY PLAN " + sql)
+                plans.append([row[-1] for row in cursor.fetchall()])
+        self.assertTrue(plans, "no task query was captured")
+        return plans
+
+    def assertUsesIndex(self, url, index=None):
+        for plan in self._task_query_plans(url):
+            for step in plan:
+                self.assertNotIn("TEMP B-TREE", step, plan)
+                if step.startswith("SCAN"):
+                    self.assertIn("USING", step, plan)
+            if index:
+                self.assertIn(index, " ".join(plan))
+
+    def test_list_is_served_from_an_index(self):
+        self.assertUsesIndex("/api/tasks/", "task_created_idx")
+
+    def test_completed_filter_is_served_from_an_index(self):
+        self.assertUsesIndex("/api/tasks/?completed=true", "task_completed_created_idx")
+        self.assertUsesIndex("/api/tasks/?completed=false", "task_completed_created_idx")
+
+    def test_cursor_pages_are_served_from_an_index(self):
+        first = self.client.get("/api/tasks/?pagination=cursor&completed=false&page_size=5")
+        self.assertUsesIndex(first.data["next"], "task_completed_created_idx")
+        self.assertUsesIndex("/api/tasks/?pagination=cursor&page_size=5")
+
+    def test_cursor_seek_is_an_index_range_not_a_scan(self):
+        first = self.client.get("/api/tasks/?pagination=cursor&page_size=5")
+        for plan in self._task_query_plans(first.data["next"]):
+            self.assertTrue(plan[0].startswith("SEARCH"), plan)
+
+    def test_list_etag_is_an_index_seek(self):
+        sql, params = conditional._list_state()[:1].query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        self.assertIn("USING COVERING INDEX task_updated_idx", plan[0])
+        self.assertTrue(all("TEMP B-TREE" not in step for step in plan), plan)
+        self.assertTrue(plan[-1].startswith("SEARCH"), plan)  # MAX(id) over the tombstones' rowid
+
+
+class TaskSparseFieldsetTests(APITestCase):
+
+    def setUp(self):
+        task_cache.get_cache().clear()
+        user = User.objects.create_user(username="fields@example.com", password="pass")
+        refresh = RefreshToken.for_user(user)
+        self.client = APIClient()
+        self.client.cookies["access_token"] = str(refresh.access_token)
+        for i in range(3):
+            Task.objects.create(title=f"Task {i}", description="x" * 1000, completed=bool(i % 2))
+
+    def test_fast_path_matches_model_serializer(self):
+        expected = TaskSerializer(Task.objects.order_by("-created_at", "-id"), many=True).data
+        response = self.client.get("/api/tasks/")
+        self.assertEqual(response.json()["results"], json.loads(json.dumps(expected)))
+
+        with self.settings(TASK_FAST_SERIALIZER=False):
+            task_cache.get_cache().clear()
+            response = self.client.get("/api/tasks/")
+        self.assertEqual(response.json()["results"], json.loads(json.dumps(expected)))
+
+    def test_fields_limit_output_and_columns(self):
+        for fast in (True, False):
+            task_cache.get_cache().clear()
+            with self.settings(TASK_FAST_SERIALIZER=fast), CaptureQueriesContext(connection) as queries:
+                response = self.client.get("/api/tasks/?fields=title,completed")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual({tuple(task) for task in response.data["results"]}, {("title", "completed")})
+            page_query = next(query["sql"] for query in queries.captured_queries
+                              if query["sql"].startswith("SELECT") and "LIMIT" in query["sql"])
+            self.assertNotIn('"description"', page_query)
+            self.assertNotIn('"updated_at"', page_query.split(" FROM ")[0])
+
+    def test_fields_with_cursor_pagination(self):
+        response = self.client.get("/api/tasks/?pagination=cursor&page_size=2&fields=title")
+        self.assertEqual([list(task) for task in response.data["results"]], [["title"], ["title"]])
+        response = self.client.get(response.data["next"])
+        self.assertEqual(response.data["results"], [{"title": "Task 0"}])
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get("/api/tasks/?fields=title,secret")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("fields", response.data)
+
+
+class TaskJSONRendererTests(SimpleTestCase):
+
+    payload = {
+        "results": [{
+            "id": 1,
+            "title": "Caf\u00e9",
+            "created_at": datetime(2024, 5, 1, 12, 0, 0, 123456, tzinfo=dt_timezone.utc),
+            "updated_at": datetime(2024, 5, 1, 12, 0, tzinfo=dt_timezone.utc),
+            "estimate": Decimal("1.50"),
+        }],
+    }
+
+    def test_orjson_and_stdlib_render_alike(self):
+        fast = renderers.FastJSONRenderer().render(self.payload)
+        with mock.patch.object(renderers, "orjson", None):
+            fallback = renderers.FastJSONRenderer().render(self.payload)
+        self.assertEqual(json.loads(fast), json.loads(fallback))
+        self.assertEqual(json.loads(fast)["results"][0]["created_at"], "2024-05-01T12:00:00.123456Z")
+        self.assertEqual(json.loads(fast)["results"][0]["updated_at"], "2024-05-01T12:00:00Z")
+        self.assertEqual(json.loads(fast)["results"][0]["estimate"], 1.5)
+
+    def test_datetimes_match_task_serializer(self):
+        task = Task(id=1, title="t", description="", completed=False,
+                    created_at=self.payload["results"][0]["created_at"], updated_at=timezone.now())
+        rendered = json.loads(renderers.FastJSONRenderer().render({"created_at": task.created_at}))
+        self.assertEqual(rendered["created_at"], TaskSerializer(task).data["created_at"])
+
+    def test_parser_falls_back_and_rejects_bad_json(self):
+        for orjson_module in (renderers.orjson, None):
+            with mock.patch.object(renderers, "orjson", orjson_module):
+                parser = renderers.FastJSONParser()
+                self.assertEqual(parser.parse(io.BytesIO(b'{"title": "x"}')), {"title": "x"})
+                with self.assertRaises(ParseError):
+                    parser.parse(io.BytesIO(b'{"title": '))
+                with self.assertRaises(ParseError):
+                    parser.parse(io.BytesIO(b'{"n": NaN}'))
+
+
+class TaskSearchTests(APITestCase):
+
+    def setUp(self):
+        if not search.has_fts():
+            self.skipTest("SQLite was built without FTS5")
+        task_cache.get_cache().clear()
+        admin = User.objects.create_user(username="search@example.com", password="admin123", is_staff=True)
+        self.client = APIClient()
+        self.client.cookies["access_token"] = str(RefreshToken.for_user(admin).access_token)
+        self.report = Task.objects.create(title="Quarterly report", description="numbers")
+        self.mention = Task.objects.create(title="Team lunch", description="after the report is sent",
+                                           completed=True)
+        Task.objects.bulk_create(Task(title=f"Filler {i}", description="nothing to see") for i in range(5))
+
+    def titles(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [task["title"] for task in response.data["results"]]
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.titles("/api/tasks/?q=report"), ["Quarterly report", "Team lunch"])
+
+    def test_prefix_and_stemmed_terms(self):
+        self.assertEqual(self.titles("/api/tasks/?q=quart"), ["Quarterly report"])
+        self.assertEqual(self.titles("/api/tasks/?q=reports"), ["Quarterly report", "Team lunch"])
+        self.assertEqual(self.titles("/api/tasks/?q=report%20lunch"), ["Team lunch"])
+        self.assertEqual(self.titles('/api/tasks/?q="); DROP TABLE x; --'), [])
+
+    def test_combines_with_filters_and_pagination(self):
+        self.assertEqual(self.titles("/api/tasks/?q=report&completed=true"), ["Team lunch"])
+        response = self.client.get("/api/tasks/?q=filler&page_size=2&page=2&fields=title")
+        self.assertEqual(response.data["count"], 5)
+        self.assertEqual(len(response.data["results"]), 2)
+        response = self.client.get("/api/tasks/?q=filler&pagination=cursor&page_size=4")
+        self.assertEqual(len(self.client.get(response.data["next"]).data["results"]), 1)
+
+    def test_index_follows_writes(self):
+        self.client.put(f"/api/tasks/{self.report.pk}/", {"title": "Budget"}, format="json")
+        self.assertEqual(self.titles("/api/tasks/?q=quarterly"), [])
+        self.assertEqual(self.titles("/api/tasks/?q=budget"), ["Budget"])
+        self.mention.delete()
+        self.assertEqual(self.titles("/api/tasks/?q=lunch"), [])
+        Task.objects.filter(title__startswith="Filler").update(description="now about lunch")
+        self.assertEqual(len(self.titles("/api/tasks/?q=lunch")), 5)
+
+    def test_search_uses_the_fts_index(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/api/tasks/?q=report")
+        sql = next(q["sql"] for q in ctx.captured_queries if "MATCH" in q["sql"] and "LIMIT" in q["sql"])
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            plan = " ".join(row[-1] for row in cursor.fetchall())
+        self.assertIn("VIRTUAL TABLE INDEX", plan)
+        self.assertNotIn("SCAN task_manager_task ", plan + " ")
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {search.FTS_TABLE}")  # simulate a corrupted index
+        out = io.StringIO()
+        call_command("rebuild_task_search", "--optimize", stdout=out)
+        self.assertIn("Rebuilt", out.getvalue())
+        self.assertEqual(self.titles("/api/tasks/?q=report"), ["Quarterly report", "Team lunch"])
+
+    def test_icontains_fallback(self):
+        with mock.patch.dict(search._fts_available, {"default": False}):
+            self.assertEqual(set(self.titles("/api/tasks/?q=report")), {"Quarterly report", "Team lunch"})
+
+
+@override_settings(PROFILING_ENABLED=True)
+class TaskProfilingTests(APITestCase):
+
+    def setUp(self):
+        task_cache.get_cache().clear()
+        self.user = User.objects.create_user(username="profile@example.com", password="pass")
+        self.client = APIClient()
+        self.client.cookies["access_token"] = str(RefreshToken.for_user(self.user).access_token)
+        Task.objects.bulk_create(Task(title=f"Task {i}") for i in range(3))
+
+    def timings(self, response):
+        return {
+            metric.split(";")[0].strip(): metric
+            for metric in response["Server-Timing"].split(",")
+        }
+
+    def test_server_timing_header_and_log_line(self):
+        with self.assertLogs("tasks.profiling", "INFO") as logs, CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/tasks/")
+        timings = self.timings(response)
+        self.assertEqual(set(timings) >= {"total", "db", "auth", "serialize", "render"}, True, timings)
+        self.assertIn(f'desc="{len(queries.captured_queries)} queries"', timings["db"])
+
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record["path"], "/api/tasks/")
+        self.assertEqual(record["status"], 200)
+        self.assertEqual(record["db_queries"], len(queries.captured_queries))
+        self.assertIn("serialize_ms", record)
+
+    def test_list_page_is_serialized_under_one_section(self):
+        for fast in (True, False):
+            page_serializer = TaskPageSerializer(fast=fast)
+            page = list(page_serializer.prepare(Task.objects.all()))
+            with self.subTest(fast=fast), profiling.tracking() as timings, \
+                    mock.patch.object(timings, "add", wraps=timings.add) as add:
+                page_serializer.serialize(page)
+            self.assertEqual([call.args[0] for call in add.call_args_list], ["serialize"])
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled_by_default(self):
+        response = APIClient().get("/api/tasks/")
+        self.assertFalse(response.has_header("Server-Timing"))
+
+    def test_slow_requests_are_profiled_into_a_ring_buffer(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_SLOW_MS=0,
+                               PROFILING_DIR=directory, PROFILING_MAX_FILES=2):
+                client = APIClient()
+                client.cookies["access_token"] = self.client.cookies["access_token"].value
+                with self.assertLogs("tasks.profiling", "INFO") as logs:
+                    for _ in range(3):
+                        client.get("/api/tasks/")
+            dumps = sorted(os.listdir(directory))
+            self.assertEqual(len(dumps), 2)
+            self.assertIn(json.loads(logs.records[-1].getMessage())["profile"],
+                          [os.path.join(directory, name) for name in dumps])
+            stats = pstats.Stats(os.path.join(directory, dumps[-1]))
+            self.assertTrue(stats.total_calls)
+
+    def test_async_requests_are_timed(self):
+        client = AsyncClient()
+        client.cookies["access_token"] = self.client.cookies["access_token"].value
+        with self.assertLogs("tasks.profiling", "INFO") as logs:
+            response = async_to_sync(client.get)(f"/api/tasks/{Task.objects.first().pk}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("auth", self.timings(response))
+        self.assertGreater(json.loads(logs.records[-1].getMessage())["db_queries"], 0)
+
+
+class TaskMetricsTests(APITestCase):
+
+    def setUp(self):
+        task_cache.get_cache().clear()
+        self.user = User.objects.create_user(username="metrics@example.com", password="pass")
+        self.client = APIClient()
+        self.client.cookies["access_token"] = str(RefreshToken.for_user(self.user).access_token)
+        self.task = Task.objects.create(title="Task")
+
+    def scrape(self, client=None):
+        response = (client or APIClient()).get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        return response.content.decode()
+
+    def sample(self, text, name, **labels):
+        """The value of the sample `name{labels...}` in an exposition, or None."""
+        for line in text.splitlines():
+            if line.startswith("#"):
+                continue
+            key, _, value = line.rpartition(" ")
+            sample_name, _, rendered = key.partition("{")
+            found = dict(pair.split("=", 1) for pair in rendered.rstrip("}").split(",") if pair)
+            if sample_name == name and found == {k: f'"{v}"' for k, v in labels.items()}:
+                return float(value)
+        return None
+
+    def test_per_view_latency_status_and_query_histograms(self):
+        before = self.scrape()
+        self.client.get("/api/tasks/")
+        self.client.get(f"/api/tasks/{self.task.pk}/")
+        APIClient().get("/api/tasks/")
+        text = self.scrape()
+
+        def delta(name, **labels):
+            return (self.sample(text, name, **labels) or 0) - (self.sample(before, name, **labels) or 0)
+
+        self.assertEqual(delta("http_responses_total", view="TaskListCreateAPI", method="GET", status="200"), 1)
+        self.assertEqual(delta("http_responses_total", view="TaskListCreateAPI", method="GET", status="401"), 1)
+        self.assertEqual(delta("http_responses_total", view="TaskDetailAPI", method="GET", status="200"), 1)
+        self.assertEqual(
+            delta("http_request_duration_seconds_bucket", view="TaskListCreateAPI", method="GET", le="+Inf"), 2,
+        )
+        self.assertEqual(delta("db_queries_per_request_count", view="TaskDetailAPI"), 1)
+        self.assertGreater(delta("db_queries_per_request_sum", view="TaskDetailAPI"), 0)
+        self.assertIn("# TYPE http_request_duration_seconds histogram", text)
+
+    def test_cache_and_token_gauges(self):
+        RefreshToken.for_user(self.user).blacklist()
+        token_counts(refresh=True)  # the gauges are cached between prunes
+        self.client.get("/api/tasks/")
+        self.client.get("/api/tasks/")
+        text = self.scrape()
+        self.assertEqual(self.sample(text, "jwt_blacklisted_tokens", expired="false"), 1)
+        self.assertGreaterEqual(self.sample(text, "jwt_outstanding_tokens"), 1)
+        hits = self.sample(text, "task_cache_requests_total", result="hit")
+        misses = self.sample(text, "task_cache_requests_total", result="miss")
+        self.assertGreater(hits, 0)
+        self.assertAlmostEqual(self.sample(text, "task_cache_hit_ratio"), hits / (hits + misses))
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_token_required_when_configured(self):
+        self.assertEqual(APIClient().get("/metrics").status_code, 401)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertIn("http_responses_total", self.scrape(client))
+
+    def test_multiprocess_totals_are_summed(self):
+        other_worker = {
+            "http_responses_total": metrics.family("counter", "Responses sent, by view and status.", [
+                ["http_responses_total", {"view": "LoginAPI", "method": "POST", "status": "200"}, 40],
+            ]),
+            "task_cache_requests_total": metrics.family("counter", "Task response cache lookups, by result.", [
+                ["task_cache_requests_total", {"result": "hit"}, 1000],
+                ["task_cache_requests_total", {"result": "miss"}, 0],
+            ]),
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "metrics-1.json"), "w") as f:
+                json.dump(other_worker, f)
+            with self.settings(METRICS_MULTIPROC_DIR=directory):
+                local = self.sample(metrics.exposition(metrics.collect()), "task_cache_requests_total", result="hit")
+                text = self.scrape()
+                self.assertIn(f"metrics-{os.getpid()}.json", os.listdir(directory))
+        self.assertGreaterEqual(
+            self.sample(text, "http_responses_total", view="LoginAPI", method="POST", status="200"), 40,
+        )
+        self.assertGreaterEqual(local, 1000)
+        self.assertGreater(self.sample(text, "task_cache_hit_ratio"), 0.5)
+
+    def test_exited_threads_are_folded_into_retired_totals(self):
+        counter = metrics.Counter("test_thread_events_total", "Events counted by short-lived threads.")
+        self.addCleanup(metrics._metrics.remove, counter)
+        threads = [threading.Thread(target=counter.inc) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+            thread.join()
+
+        self.assertEqual(counter.collect()["samples"], [["test_thread_events_total", {}, 5]])
+        self.assertFalse(set(threads) & set(metrics._shards))
+
+    def test_unknown_methods_share_one_label(self):
+        self.client.generic("BREW", "/api/tasks/")
+        text = self.scrape()
+        self.assertEqual(self.sample(text, "http_responses_total", view="TaskListCreateAPI", method="other",
+                                     status="405"), 1)
+        self.assertNotIn('method="BREW"', text)
+
+    def test_unwritable_multiproc_dir_is_logged_not_raised(self):
+        with tempfile.NamedTemporaryFile() as not_a_directory, \
+                self.settings(METRICS_MULTIPROC_DIR=not_a_directory.name), \
+                self.assertLogs("tasks.metrics", "ERROR"):
+            metrics.flush(force=True)
+            response = self.client.get("/api/tasks/")
+        self.assertEqual(response.status_code, 200)
+
+
+class TaskQueryInspectionTests(APITestCase):
+
+    def setUp(self):
+        task_cache.get_cache().clear()
+        self.user = User.objects.create_user(username="queries@example.com", password="pass")
+        self.client = APIClient()
+        self.client.cookies["access_token"] = str(RefreshToken.for_user(self.user).access_token)
+        Task.objects.bulk_create(Task(title=f"Task {i}") for i in range(30))
+
+    def test_shape_ignores_literals_and_parameter_lists(self):
+        self.assertEqual(
+            queries.shape("SELECT * FROM t WHERE id IN (%s, %s, %s) AND title = 'x' LIMIT 21"),
+            queries.shape("SELECT * FROM t WHERE id IN (%s)  AND title = 'it''s' LIMIT 5"),
+        )
+        self.assertNotEqual(queries.shape("SELECT a FROM t"), queries.shape("SELECT b FROM t"))
+
+    def test_list_and_detail_stay_within_budget_without_repeats(self):
+        with queries.assert_max_queries(TaskListCreateAPI.query_budget["GET"], repeat_threshold=2):
+            self.assertEqual(self.client.get("/api/tasks/?page_size=30").status_code, 200)
+        with queries.assert_max_queries(TaskDetailAPI.query_budget["GET"], repeat_threshold=2):
+            self.assertEqual(self.client.get(f"/api/tasks/{Task.objects.first().pk}/").status_code, 200)
+
+    def test_repeated_queries_are_reported(self):
+        with self.assertRaisesMessage(queries.QueryBudgetExceeded, "repeated 30x"):
+            with queries.assert_max_queries(100, repeat_threshold=5):
+                for pk in Task.objects.values_list("pk", flat=True):
+                    Task.objects.get(pk=pk)
+
+    def test_view_over_budget_fails_in_strict_mode(self):
+        with mock.patch.object(TaskDetailAPI, "query_budget", {"GET": 0}):
+            with self.assertRaisesMessage(queries.QueryBudgetExceeded, "over its budget of 0"):
+                self.client.get(f"/api/tasks/{Task.objects.first().pk}/")
+
+            with self.settings(QUERY_BUDGET_STRICT=False), self.assertLogs("tasks.queries", "WARNING") as logs:
+                response = self.client.get(f"/api/tasks/{Task.objects.last().pk}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(logs.records[-1].getMessage())["event"], "query_budget")
+
+    @override_settings(QUERY_SLOW_MS=0)
+    def test_slow_queries_are_logged_with_their_plan(self):
+        with self.assertLogs("tasks.queries", "WARNING") as logs:
+            self.client.get("/api/tasks/")
+        records = [json.loads(record.getMessage()) for record in logs.records]
+        selects = [r for r in records if r["event"] == "slow_query" and r["sql"].startswith("SELECT")]
+        self.assertTrue(selects)
+        self.assertTrue(all(r["plan"] for r in selects), selects)
+
+    @override_settings(QUERY_REPEAT_THRESHOLD=2)
+    def test_repeated_shapes_in_a_request_are_logged(self):
+        def lookup_each(view):
+            def wrapper(request, *args, **kwargs):
+                for pk in Task.objects.values_list("pk", flat=True)[:3]:
+                    Task.objects.filter(pk=pk).exists()
+                return view(request, *args, **kwargs)
+            return wrapper
+
+        with mock.patch.object(TaskListCreateAPI, "get", lookup_each(TaskListCreateAPI.get)), \
+                self.settings(QUERY_BUDGET_STRICT=False), self.assertLogs("tasks.queries", "WARNING") as logs:
+            self.client.get("/api/tasks/")
+        repeats = [json.loads(r.getMessage()) for r in logs.records]
+        self.assertIn(3, [r["count"] for r in repeats if r["event"] == "repeated_query"])
+
+
+class TaskResponseCacheTests(APITestCase):
+
+    def setUp(self):
+        task_cache.get_cache().clear()
+        task_cache.stats.reset()
+
+        admin = User.objects.create_user(username="cacheadmin@example.com", password="admin123", is_staff=True)
+        refresh = StampedRefreshToken.for_user(admin)
+        self.client = APIClient()
+        self.client.cookies["access_token"] = str(refresh.access_token)
+
+        self.task = Task.objects.create(title="Cached", completed=False)
+        self.list_url = "/api/tasks/"
+        self.detail_url = f"/api/tasks/{self.task.pk}/"
+
+    def test_second_list_request_is_served_from_cache(self):
+        self.client.get(self.list_url)
+        with self.assertNumQueries(0):  # stateless JWT auth: no user lookup either
+            response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(task_cache.stats.as_dict(), {"hits": 1, "misses": 1})
+
+    def test_cache_key_covers_filter_page_and_page_size(self):
+        self.client.get(self.list_url + "?completed=false&page=1&page_size=5")
+        self.client.get(self.list_url + "?completed=true&page=1&page_size=5")
+        self.client.get(self.list_url + "?completed=false&page=1&page_size=10")
+        self.client.get(self.list_url + "?page_size=5&page=1&completed=false")
+        self.assertEqual(task_cache.stats.as_dict(), {"hits": 1, "misses": 3})
+
+    def test_post_invalidates_list_cache(self):
+        first = self.client.get(self.list_url)
+        self.client.post(self.list_url, {"title": "Another"}, format="json")
+        second = self.client.get(self.list_url)
+        self.assertEqual(second.data["count"], first.data["count"] + 1)
+
+    def test_put_and_delete_invalidate_detail_cache(self):
+        self.client.get(self.detail_url)
+        self.client.put(self.detail_url, {"title": "Renamed"}, format="json")
+        self.assertEqual(self.client.get(self.detail_url).data["title"], "Renamed")
+
+        self.client.delete(self.detail_url)
+        self.assertEqual(self.client.get(self.detail_url).status_code, 404)
+
+    def test_bulk_writes_invalidate_cache(self):
+        self.client.get(self.detail_url)
+        Task.objects.filter(pk=self.task.pk).update(title="Bulk renamed")
+        self.assertEqual(self.client.get(self.detail_url).data["title"], "Bulk renamed")
+
+    @override_settings(TASK_CACHE_ENABLED=False)
+    def test_cache_can_be_disabled(self):
+        self.client.get(self.list_url)
+        self.client.get(self.list_url)
+        self.assertEqual(task_cache.stats.as_dict(), {"hits": 0, "misses": 0})
+
+
+class TaskConditionalGetTests(APITestCase):
+
+    def setUp(self):
+        task_cache.get_cache().clear()
+        admin = User.objects.create_user(username="etag@example.com", password="admin123", is_staff=True)
+        refresh = RefreshToken.for_user(admin)
+        self.client = APIClient()
+        self.client.cookies["access_token"] = str(refresh.access_token)
+
+        self.task = Task.objects.create(title="Polled")
+        self.list_url = "/api/tasks/"
+        self.detail_url = f"/api/tasks/{self.task.pk}/"
+
+    def test_detail_returns_304_for_matching_etag(self):
+        first = self.client.get(self.detail_url)
+        self.assertIn("ETag", first)
+        self.assertIn("Last-Modified", first)
+
+        task_cache.get_cache().clear()
+        with self.assertNumQueries(2):  # JWT user lookup + updated_at probe
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], first["ETag"])
+
+    def test_detail_etag_changes_after_update(self):
+        first = self.client.get(self.detail_url)
+        self.client.put(self.detail_url, {"completed": True}, format="json")
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], first["ETag"])
+
+    def test_detail_if_modified_since(self):
+        first = self.client.get(self.detail_url)
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_returns_304_for_matching_etag(self):
+        first = self.client.get(self.list_url + "?completed=false")
+        response = self.client.get(self.list_url + "?completed=false", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        task_cache.get_cache().clear()
+        response = self.client.get(self.list_url + "?completed=false", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_etag_depends_on_query_and_rows(self):
+        first = self.client.get(self.list_url)
+        other_page_size = self.client.get(self.list_url + "?page_size=5")
+        self.assertNotEqual(first["ETag"], other_page_size["ETag"])
+
+        self.client.delete(self.detail_url)
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_has_no_last_modified(self):
+        kept = Task.objects.create(title="Kept")
+        first = self.client.get(self.list_url)
+        self.assertNotIn("Last-Modified", first)
+
+        self.client.delete(self.detail_url)
+        response = self.client.get(self.list_url, HTTP_IF_MODIFIED_SINCE=http_date(kept.updated_at.timestamp() + 60))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 1)
+
+    def test_list_validators_add_no_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.list_url + "?pagination=cursor")
+        self.assertFalse([q["sql"] for q in ctx.captured_queries if "COUNT(" in q["sql"]])
+
+    def test_list_304_skips_the_page(self):
+        first = self.client.get(self.list_url)
+        task_cache.get_cache().clear()
+        with self.assertNumQueries(2):  # JWT user lookup + list ETag lookup
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_etag_changes_when_a_row_leaves_another_page(self):
+        first = self.client.get(self.list_url + "?completed=true")
+        self.client.put(self.detail_url, {"completed": True}, format="json")
+        response = self.client.get(self.list_url + "?completed=true", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 1)
+
+    def test_missing_task_with_conditional_headers_is_404(self):
+        response = self.client.get("/api/tasks/999999/", HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, 404)
+
+
+class TaskOptimisticConcurrencyTests(APITestCase):
+
+    def setUp(self):
+        task_cache.get_cache().clear()
+        admin = User.objects.create_user(username="occ@example.com", password="admin123", is_staff=True)
+        refresh = RefreshToken.for_user(admin)
+        self.client = APIClient()
+        self.client.cookies["access_token"] = str(refresh.access_token)
+
+        self.task = Task.objects.create(title="Shared", description="Edited by two people")
+        self.detail_url = f"/api/tasks/{self.task.pk}/"
+
+    def test_update_with_current_etag(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+        response = self.client.put(self.detail_url, {"completed": True}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["completed"])
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response["ETag"], self.client.get(self.detail_url)["ETag"])
+
+    def test_stale_etag_is_rejected(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+        self.client.put(self.detail_url, {"title": "First writer"}, format="json", HTTP_IF_MATCH=etag)
+
+        response = self.client.put(self.detail_url, {"title": "Second writer"}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(response["ETag"], self.client.get(self.detail_url)["ETag"])
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.title, "First writer")
+
+    def test_concurrent_write_between_read_and_update_is_rejected(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+        task = Task.objects.get(pk=self.task.pk)
+        original_get = Task.objects.get
+
+        def get_then_race(*args, **kwargs):
+            # Another writer commits after the view loaded the row but before its UPDATE.
+            loaded = original_get(*args, **kwargs)
+            Task.objects.filter(pk=task.pk).update(title="Racer")
+            return loaded
+
+        Task.objects.get = get_then_race
+        try:
+            response = self.client.put(self.detail_url, {"title": "Loser"}, format="json", HTTP_IF_MATCH=etag)
+        finally:
+            del Task.objects.get
+        self.assertEqual(response.status_code, 412)
+        task.refresh_from_db()
+        self.assertEqual(task.title, "Racer")
+
+    def test_etag_for_another_task_does_not_match(self):
+        other = Task.objects.create(title="Other")
+        etag = self.client.get(f"/api/tasks/{other.pk}/")["ETag"]
+        response = self.client.put(self.detail_url, {"completed": True}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+
+    def test_wildcard_and_missing_if_match_update_unconditionally(self):
+        response = self.client.put(self.detail_url, {"completed": True}, format="json", HTTP_IF_MATCH="*")
+        self.assertEqual(response.status_code, 200)
+        response = self.client.put(self.detail_url, {"completed": False}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_update_writes_only_changed_columns_in_one_statement(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.put(self.detail_url, {"title": "Renamed", "description": "Edited by two people"},
+                            format="json", HTTP_IF_MATCH=etag)
+        updates = [query["sql"] for query in queries.captured_queries if query["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        set_clause, where_clause = updates[0].split(" WHERE ")
+        self.assertIn('"title"', set_clause)
+        self.assertIn('"updated_at"', set_clause)
+        self.assertNotIn('"description"', set_clause)
+        self.assertNotIn('"completed"', set_clause)
+        self.assertIn('"updated_at"', where_clause)
+
+    def test_unchanged_body_skips_the_write(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(self.detail_url, {"title": "Shared"}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], etag)
+        self.assertFalse(any(query["sql"].startswith("UPDATE") for query in queries.captured_queries))
+
+
+class TaskBulkAPITests(APITestCase):
+
+    def setUp(self):
+        admin = User.objects.create_user(username="bulkadmin@example.com", password="admin123", is_staff=True)
+        user = User.objects.create_user(username="bulkuser@example.com", password="user123")
+        self.admin_client = APIClient()
+        self.admin_client.cookies["access_token"] = str(RefreshToken.for_user(admin).access_token)
+        self.user_client = APIClient()
+        self.user_client.cookies["access_token"] = str(RefreshToken.for_user(user).access_token)
+        self.url = "/api/tasks/bulk/"
+
+    def test_bulk_create_reports_each_item(self):
+        payload = [{"title": "A"}, {"description": "missing title"}, {"title": "C", "completed": True}]
+        response = self.admin_client.post(self.url, payload, format="json")
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data["succeeded"], 2)
+        statuses = [r["status"] for r in response.data["results"]]
+        self.assertEqual(statuses, ["created", "invalid", "created"])
+        self.assertIn("title", response.data["results"][1]["errors"])
+        created_id = response.data["results"][2]["id"]
+        self.assertTrue(Task.objects.get(pk=created_id).completed)
+
+    def test_bulk_create_uses_a_single_insert(self):
+        payload = [{"title": f"Task {i}"} for i in range(50)]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.admin_client.post(self.url, payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        inserts = [q for q in ctx.captured_queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Task.objects.count(), 50)
+
+    def test_bulk_update_only_touches_valid_items(self):
+        a = Task.objects.create(title="A")
+        b = Task.objects.create(title="B")
+        payload = [
+            {"id": a.pk, "completed": True},
+            {"id": b.pk, "title": ""},
+            {"id": 999999, "title": "ghost"},
+        ]
+        response = self.admin_client.put(self.url, payload, format="json")
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([r["status"] for r in response.data["results"]], ["updated", "invalid", "not_found"])
+        a.refresh_from_db()
+        b.refresh_from_db()
+        self.assertTrue(a.completed)
+        self.assertEqual(b.title, "B")
+
+    def test_bulk_delete_issues_one_delete(self):
+        tasks = Task.objects.bulk_create(Task(title=f"Task {i}") for i in range(5))
+        ids = [t.pk for t in tasks[:3]] + [999999]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.admin_client.delete(self.url, {"ids": ids}, format="json")
+        self.assertEqual(response.status_code, 207)
+        deletes = [q for q in ctx.captured_queries if q["sql"].startswith("DELETE")]
+        self.assertEqual(len(deletes), 1)
+        self.assertEqual(Task.objects.count(), 2)
+
+    def test_largest_batch_stays_within_the_query_budget(self):
+        size = settings.TASK_BULK_MAX_BATCH_SIZE
+        with self.settings(QUERY_BUDGET_STRICT=True, QUERY_SLOW_MS=None), self.assertNoLogs("tasks.queries", "WARNING"):
+            response = self.admin_client.post(self.url, [{"title": f"Task {i}"} for i in range(size)], format="json")
+            self.assertEqual(response.status_code, 201)
+            ids = [result["id"] for result in response.data["results"]]
+
+            response = self.admin_client.put(self.url, [{"id": pk, "completed": True} for pk in ids], format="json")
+            self.assertEqual(response.status_code, 200)
+
+            response = self.admin_client.delete(self.url, {"ids": ids}, format="json")
+            self.assertEqual(response.status_code, 200)
+        self.assertFalse(Task.objects.exists())
+
+    @override_settings(TASK_BULK_MAX_BATCH_SIZE=2)
+    def test_batch_size_is_limited(self):
+        response = self.admin_client.post(self.url, [{"title": "x"}] * 3, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Task.objects.exists())
+
+    def test_normal_user_cannot_bulk_write(self):
+        response = self.user_client.post(self.url, [{"title": "x"}], format="json")
+        self.assertEqual(response.status_code, 403)
+        response = self.user_client.delete(self.url, {"ids": [1]}, format="json")
+        self.assertEqual(response.status_code, 403)
+
+
+class TaskExportAPITests(APITestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username="export@example.com", password="user123")
+        self.client = APIClient()
+        self.client.cookies["access_token"] = str(RefreshToken.for_user(user).access_token)
+        self.tasks = [
+            Task.objects.create(title=f"Task {i}", description="line one\nline, two", completed=bool(i % 2))
+            for i in range(5)
+        ]
+        self.url = "/api/tasks/export/"
+
+    def _body(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content)
+
+    @override_settings(TASK_EXPORT_CHUNK_SIZE=2)
+    def test_ndjson_export_matches_serializer_output(self):
+        body = self._body(self.client.get(self.url))
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        expected = json.loads(json.dumps(TaskSerializer(self.tasks, many=True).data))
+        self.assertEqual(rows, expected)
+
+    def test_csv_export_honors_completed_filter(self):
+        response = self.client.get(self.url + "?export_format=csv&completed=true")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.DictReader(io.StringIO(self._body(response).decode())))
+        self.assertEqual([int(r["id"]) for r in rows], [t.pk for t in self.tasks if t.completed])
+        self.assertEqual(rows[0]["description"], "line one\nline, two")
+
+    def test_gzip_export(self):
+        response = self.client.get(self.url + "?gzip=true")
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn("tasks.ndjson.gz", response["Content-Disposition"])
+        lines = gzip.decompress(self._body(response)).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get(self.url + "?export_format=xml")
+        self.assertEqual(response.status_code, 400)
+
+
+class TaskCompressionTests(APITestCase):
+
+    def setUp(self):
+        task_cache.get_cache().clear()
+        compression.stats.reset()
+        admin = User.objects.create_user(username="gzip@example.com", password="admin123", is_staff=True)
+        self.client = APIClient()
+        self.client.cookies["access_token"] = str(RefreshToken.for_user(admin).access_token)
+        self.tasks = [Task.objects.create(title=f"Task {i}", description="long text " * 200) for i in range(5)]
+
+    def test_large_list_page_is_gzipped(self):
+        response = self.client.get("/api/tasks/", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertTrue(response["ETag"].startswith('W/"'))
+        body = gzip.decompress(response.content)
+        self.assertEqual(response["Content-Length"], str(len(response.content)))
+        self.assertEqual(len(json.loads(body)["results"]), 5)
+
+        totals = compression.stats.snapshot()["gzip"]
+        self.assertEqual(totals["responses"], 1)
+        self.assertEqual(totals["bytes_in"], len(body))
+        self.assertGreater(totals["ratio"], 10)
+
+    def test_small_or_unaccepted_responses_are_left_alone(self):
+        response = self.client.get("/api/tasks/?fields=id", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+        response = self.client.get("/api/tasks/", HTTP_ACCEPT_ENCODING="gzip;q=0, identity")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+    def test_not_modified_is_not_compressed(self):
+        etag = self.client.get("/api/tasks/", HTTP_ACCEPT_ENCODING="gzip")["ETag"]
+        response = self.client.get("/api/tasks/", HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    @override_settings(TASK_EXPORT_CHUNK_SIZE=2)
+    def test_streaming_export_is_compressed_per_chunk(self):
+        plain = b"".join(self.client.get("/api/tasks/export/").streaming_content)
+        response = self.client.get("/api/tasks/export/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertFalse(response.has_header("Content-Length"))
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual(gzip.decompress(b"".join(chunks)), plain)
+
+    def test_already_compressed_export_is_skipped(self):
+        response = self.client.get("/api/tasks/export/?gzip=true", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(len(gzip.decompress(b"".join(response.streaming_content)).splitlines()), 5)
+
+    def test_if_match_accepts_weakened_etag(self):
+        task = self.tasks[0]
+        etag = self.client.get(f"/api/tasks/{task.pk}/", HTTP_ACCEPT_ENCODING="gzip")["ETag"]
+        self.assertTrue(etag.startswith("W/"))
+        response = self.client.put(f"/api/tasks/{task.pk}/", {"completed": True}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_encoding_negotiation(self):
+        with mock.patch.object(compression, "brotli", object()):
+            self.assertEqual(compression.choose_encoding("gzip, deflate, br"), "br")
+            self.assertEqual(compression.choose_encoding("br;q=0.5, gzip"), "gzip")
+            self.assertEqual(compression.choose_encoding("*"), "br")
+        with mock.patch.object(compression, "brotli", None):
+            self.assertEqual(compression.choose_encoding("br, gzip;q=0.1"), "gzip")
+            self.assertIsNone(compression.choose_encoding("br"))
+            self.assertEqual(compression.choose_encoding("br;q=0, *;q=0.5"), "gzip")
+        with mock.patch.object(compression, "brotli", object()):
+            self.assertEqual(compression.choose_encoding("br;q=0, *"), "gzip")
+        self.assertIsNone(compression.choose_encoding("gzip;q=0"))
+        self.assertIsNone(compression.choose_encoding("gzip;q=0, *"))
+        self.assertIsNone(compression.choose_encoding("identity, *;q=0"))
+        self.assertIsNone(compression.choose_encoding(""))
+
+    @skipUnless(compression.brotli, "brotli is not installed")
+    def test_brotli(self):
+        response = self.client.get("/api/tasks/", HTTP_ACCEPT_ENCODING="br, gzip")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(len(json.loads(compression.brotli.decompress(response.content))["results"]), 5)
+
+
+class TaskImportTests(APITestCase):
+
+    def setUp(self):
+        admin = User.objects.create_user(username="importer@example.com", password="admin123", is_staff=True)
+        self.client = APIClient()
+        self.client.cookies["access_token"] = str(RefreshToken.for_user(admin).access_token)
+        self.url = "/api/tasks/import/"
+
+    def test_row_validator_matches_task_serializer(self):
+        records = [
+            {"title": "ok"},
+            {"title": "  padded  ", "description": "  text ", "completed": "yes"},
+            {"title": ""},
+            {"title": "   "},
+            {"title": "x" * 256},
+            {"title": None},
+            {"title": ["list"]},
+            {"title": 42, "completed": 1},
+            {"description": "no title"},
+            {"title": "bad bool", "completed": "maybe"},
+            {"title": "list bool", "completed": []},
+            {"title": "null bool", "completed": None},
+            {"title": "null description", "description": None},
+            {"title": "nul\x00char"},
+            {"title": "read-only fields", "id": 5, "created_at": "yesterday"},
+        ]
+        for record in records:
+            with self.subTest(record=record):
+                serializer = TaskSerializer(data=record)
+                data, errors = importer.validate_task_row(record)
+                self.assertEqual(serializer.is_valid(), not errors)
+                if errors:
+                    self.assertEqual(set(errors), set(serializer.errors))
+                    for name, message in errors.items():
+                        self.assertEqual(message, str(serializer.errors[name][0]))
+                else:
+                    self.assertEqual(data, dict(serializer.validated_data))
+
+    def test_import_command_streams_ndjson_in_chunks(self):
+        lines = [json.dumps({"title": f"Task {i}", "completed": i % 2 == 0}) for i in range(7)]
+        lines.insert(3, "{not json")
+        lines.insert(5, json.dumps({"title": ""}))
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False) as handle:
+            handle.write("\n".join(lines) + "\n")
+        self.addCleanup(os.remove, handle.name)
+
+        out, err = io.StringIO(), io.StringIO()
+        with CaptureQueriesContext(connection) as ctx:
+            call_command("import_tasks", handle.name, "--chunk-size", "3", stdout=out, stderr=err)
+
+        self.assertEqual(Task.objects.count(), 7)
+        inserts = [q for q in ctx.captured_queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 3)
+        self.assertIn("Imported 7 tasks, 2 rows failed", out.getvalue())
+        self.assertIn("line 4", err.getvalue())
+        self.assertIn("line 6", err.getvalue())
+
+    def test_import_command_reads_gzipped_csv(self):
+        content = "title,description,completed\nFirst,,true\nSecond,two,\n"
+        with tempfile.NamedTemporaryFile(suffix=".csv.gz", delete=False) as handle:
+            handle.write(gzip.compress(content.encode()))
+        self.addCleanup(os.remove, handle.name)
+
+        call_command("import_tasks", handle.name, stdout=io.StringIO())
+        self.assertEqual(
+            list(Task.objects.order_by("id").values_list("title", "description", "completed")),
+            [("First", "", True), ("Second", "two", False)],
+        )
+
+    def test_upload_endpoint_reports_summary(self):
+        upload = SimpleUploadedFile("tasks.csv", b"title,completed\nA,false\n,true\nC,1\n")
+        response = self.client.post(self.url, {"file": upload}, format="multipart")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual(response.data["failed"], 1)
+        self.assertEqual(response.data["errors"][0]["line"], 3)
+        self.assertIn("rows_per_second", response.data)
+
+    def test_multi_chunk_upload_stays_within_the_query_budget(self):
+        rows = "".join(json.dumps({"title": f"Task {i}"}) + "\n" for i in range(5000))
+        upload = SimpleUploadedFile("tasks.ndjson", rows.encode())
+        with self.settings(QUERY_BUDGET_STRICT=True, QUERY_SLOW_MS=None, TASK_IMPORT_CHUNK_SIZE=1000), \
+                self.assertNoLogs("tasks.queries", "WARNING"):
+            response = self.client.post(self.url, {"file": upload}, format="multipart")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Task.objects.count(), 5000)
+
+    def test_unreadable_uploads_are_rejected(self):
+        uploads = {
+            "latin-1": ("tasks.csv", "title\nCafé\n".encode("latin-1")),
+            "not gzip": ("tasks.ndjson.gz", b'{"title": "A"}\n'),
+            "truncated gzip": ("tasks.ndjson.gz", gzip.compress(b'{"title": "A"}\n' * 100)[:30]),
+        }
+        for case, (name, content) in uploads.items():
+            with self.subTest(case):
+                response = self.client.post(self.url, {"file": SimpleUploadedFile(name, content)}, format="multipart")
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("Could not read the input", response.data["file"][0])
+
+    def test_import_command_reports_unreadable_input(self):
+        with tempfile.NamedTemporaryFile(suffix=".ndjson.gz", delete=False) as handle:
+            handle.write(b"plain text")
+        self.addCleanup(os.remove, handle.name)
+
+        with self.assertRaisesMessage(CommandError, "Could not read the input"):
+            call_command("import_tasks", handle.name, stdout=io.StringIO())
+
+    def test_upload_requires_admin(self):
+        user = User.objects.create_user(username="noimport@example.com", password="user123")
+        client = APIClient()
+        client.cookies["access_token"] = str(RefreshToken.for_user(user).access_token)
+        upload = SimpleUploadedFile("tasks.ndjson", b'{"title": "A"}\n')
+        response = client.post(self.url, {"file": upload}, format="multipart")
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(TASK_SYNC_LAG_SECONDS=0)
+class TaskSyncAPITests(APITestCase):
+
+    def setUp(self):
+        admin = User.objects.create_user(username="sync@example.com", password="admin123", is_staff=True)
+        self.client = APIClient()
+        self.client.cookies["access_token"] = str(RefreshToken.for_user(admin).access_token)
+        self.tasks = [Task.objects.create(title=f"Task {i}") for i in range(3)]
+        self.url = "/api/tasks/sync/"
+
+    def _sync(self, since=None, **params):
+        if since:
+            params["since"] = since
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_initial_sync_returns_everything_then_nothing(self):
+        first = self._sync()
+        self.assertEqual([t["id"] for t in first["changed"]], [t.pk for t in self.tasks])
+        self.assertEqual(first["deleted"], [])
+        self.assertFalse(first["has_more"])
+
+        second = self._sync(first["since"])
+        self.assertEqual(second["changed"], [])
+        self.assertEqual(second["deleted"], [])
+
+    def test_sync_reports_creates_updates_and_deletes(self):
+        since = self._sync()["since"]
+
+        self.client.put(f"/api/tasks/{self.tasks[0].pk}/", {"completed": True}, format="json")
+        self.client.delete(f"/api/tasks/{self.tasks[1].pk}/")
+        self.client.delete("/api/tasks/bulk/", {"ids": [self.tasks[2].pk]}, format="json")
+        created = Task.objects.create(title="New")
+
+        delta = self._sync(since)
+        self.assertEqual([t["id"] for t in delta["changed"]], [self.tasks[0].pk, created.pk])
+        self.assertEqual(delta["deleted"], [self.tasks[1].pk, self.tasks[2].pk])
+
+    def test_limit_pages_through_changes(self):
+        seen, since = [], None
+        while True:
+            data = self._sync(since, limit=2)
+            seen.extend(t["id"] for t in data["changed"])
+            since = data["since"]
+            if not data["has_more"]:
+                break
+        self.assertEqual(seen, [t.pk for t in self.tasks])
+
+    def test_expired_watermark_returns_410(self):
+        since = self._sync()["since"]
+        with override_settings(TASK_TOMBSTONE_RETENTION_DAYS=0):
+            response = self.client.get(self.url, {"since": since})
+        self.assertEqual(response.status_code, 410)
+
+    def test_old_unpruned_tombstone_does_not_expire_syncs(self):
+        self.tasks[0].delete()
+        TaskTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=40))
+
+        first = self._sync()
+        self.assertEqual(first["deleted"], [])
+        self.assertEqual(self._sync(first["since"])["deleted"], [])
+
+    def test_sync_without_deletes_reissues_the_watermark(self):
+        self.tasks[0].delete()
+        TaskTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=29))
+        since = self._sync()["since"]
+        watermark = sync.decode_watermark(since)
+        old = sync.encode_watermark(watermark[:2] + (timezone.now() - timedelta(days=29), watermark[3]))
+
+        advanced = sync.decode_watermark(self._sync(old)["since"])
+        self.assertGreater(advanced[2], timezone.now() - timedelta(minutes=1))
+
+    def test_watermark_past_retention_is_valid_while_its_tombstones_are_kept(self):
+        seen, pruned, kept = (task.pk for task in self.tasks)
+        for task in self.tasks:
+            task.delete()
+        tombstone = TaskTombstone.objects.get(task_id=seen)
+        since = sync.encode_watermark((None, 0, timezone.now() - timedelta(days=40), tombstone.pk))
+
+        self.assertEqual(self._sync(since)["deleted"], [pruned, kept])
+
+        TaskTombstone.objects.filter(task_id__in=[seen, pruned]).delete()
+        response = self.client.get(self.url, {"since": since})
+        self.assertEqual(response.status_code, 410)
+
+    def test_tombstone_stamped_before_a_sync_but_committed_after_is_not_skipped(self):
+        since = self._sync()["since"]
+        late = Task.objects.create(title="Late")
+        late_pk = late.pk
+        late.delete()
+        TaskTombstone.objects.update(deleted_at=timezone.now() - timedelta(minutes=5))
+
+        self.assertEqual(self._sync(since)["deleted"], [late_pk])
+
+    def test_rows_inside_the_lag_wait_for_the_next_sync(self):
+        with override_settings(TASK_SYNC_LAG_SECONDS=60):
+            first = self._sync()
+        self.assertEqual(first["changed"], [])
+
+        # Committed after that sync, but stamped before the rows it held back.
+        late = Task.objects.create(title="Late")
+        Task.objects.filter(pk=late.pk).update(updated_at=timezone.now() - timedelta(seconds=30))
+
+        delta = self._sync(first["since"])
+        self.assertEqual([t["id"] for t in delta["changed"]], [late.pk] + [t.pk for t in self.tasks])
+
+    def test_invalid_watermark_returns_400(self):
+        response = self.client.get(self.url, {"since": "garbage"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_naive_watermark_returns_400(self):
+        since = sync.encode_watermark((datetime(2024, 1, 1), 0, datetime(2024, 1, 1), 0))
+        response = self.client.get(self.url, {"since": since})
+        self.assertEqual(response.status_code, 400)
+
+    def test_prune_command_removes_old_tombstones_only(self):
+        old_pk, recent_pk = self.tasks[0].pk, self.tasks[1].pk
+        self.tasks[0].delete()
+        self.tasks[1].delete()
+        TaskTombstone.objects.filter(task_id=old_pk).update(deleted_at=timezone.now() - timedelta(days=60))
+
+        out = io.StringIO()
+        call_command("prune_task_tombstones", "--batch-size", "1", stdout=out)
+        self.assertIn("Removed 1 tombstones", out.getvalue())
+        self.assertEqual(list(TaskTombstone.objects.values_list("task_id", flat=True)), [recent_pk])
+
+
+class TaskEventBrokerTests(SimpleTestCase):
+
+    def test_replay_after_last_event_id(self):
+        broker = events.InProcessBroker(replay_size=3)
+        for i in range(5):
+            broker.publish("created", {"id": i})
+
+        replayed = async_to_sync(broker.replay)("3")
+        self.assertEqual([e.id for e in replayed], ["4", "5"])
+        # Event 2 was already dropped from the 3-event history.
+        self.assertIsNone(async_to_sync(broker.replay)("1"))
+
+    def test_ids_from_before_a_restart_are_not_resumed(self):
+        restarted = events.InProcessBroker()
+        self.assertIsNone(async_to_sync(restarted.replay)("50"))
+
+        restarted.publish("created", {"id": 1})
+        self.assertIsNone(async_to_sync(restarted.replay)("50"))
+        self.assertEqual(async_to_sync(restarted.replay)("1"), [])
+
+    def test_stream_after_restart_resets_and_delivers_new_events(self):
+        async def scenario():
+            broker = events.InProcessBroker()
+            subscription = await broker.subscribe()
+            frames = events.stream(subscription, broker, "50", heartbeat=5)
+            received = [await anext(frames), await anext(frames)]
+            broker.publish("created", {"id": 1})
+            received.append(await anext(frames))
+            await frames.aclose()
+            return received
+
+        _, reset, created = async_to_sync(scenario)()
+        self.assertEqual(reset, "event: reset\ndata: {}\n\n")
+        self.assertIn("id: 1\nevent: created", created)
+
+    def test_slow_subscriber_is_cut_off_with_overflow_event(self):
+        async def scenario():
+            broker = events.InProcessBroker(queue_size=2)
+            subscription = await broker.subscribe()
+            for i in range(5):
+                broker.publish("created", {"id": i})
+            await asyncio.sleep(0)
+            frames = [frame async for frame in events.stream(subscription, broker, heartbeat=0.01)]
+            return broker, frames
+
+        broker, frames = async_to_sync(scenario)()
+        self.assertEqual(frames[0], "retry: 10\n\n")
+        self.assertEqual([f.split("\n")[0] for f in frames[1:3]], ["id: 1", "id: 2"])
+        self.assertTrue(frames[-1].startswith("event: overflow"))
+        self.assertEqual(len(broker.hub), 0)
+
+
+class TaskEventStreamTests(TransactionTestCase):
+
+    def setUp(self):
+        events.reset_broker()
+        admin = User.objects.create_user(username="sse@example.com", password="admin123", is_staff=True)
+        self.access = str(RefreshToken.for_user(admin).access_token)
+        self.client = APIClient()
+        self.client.cookies["access_token"] = self.access
+        self.async_client = AsyncClient()
+        self.async_client.cookies["access_token"] = self.access
+
+    async def _frames(self, response, count):
+        frames = []
+        iterator = aiter(response.streaming_content)
+        while len(frames) < count:
+            frames.append((await asyncio.wait_for(anext(iterator), 5)).decode())
+        return frames
+
+    def test_writes_are_pushed_to_subscribers(self):
+        async def scenario():
+            response = await self.async_client.get("/api/tasks/events/")
+            self.assertEqual(response["Content-Type"], "text/event-stream")
+            await self._frames(response, 1)  # retry hint
+
+            await sync_to_async(self.client.post)("/api/tasks/", {"title": "Live"}, format="json")
+            [frame] = await self._frames(response, 1)
+            await response.streaming_content.aclose()
+            return frame
+
+        frame = async_to_sync(scenario)()
+        self.assertIn("event: created", frame)
+        self.assertIn('"title": "Live"', frame)
+
+    def test_last_event_id_resumes_missed_events(self):
+        task = Task.objects.create(title="Before")
+        self.client.put(f"/api/tasks/{task.pk}/", {"completed": True}, format="json")
+        self.client.delete(f"/api/tasks/{task.pk}/")
+
+        async def scenario():
+            response = await self.async_client.get("/api/tasks/events/", headers={"Last-Event-ID": "1"})
+            frames = await self._frames(response, 2)
+            await response.streaming_content.aclose()
+            return frames
+
+        retry, deleted = async_to_sync(scenario)()
+        self.assertIn("id: 2\nevent: deleted", deleted)
+
+    def test_malformed_last_event_id_resets(self):
+        async def scenario():
+            response = await self.async_client.get("/api/tasks/events/", headers={"Last-Event-ID": "not-a-number"})
+            frames = await self._frames(response, 2)
+            await response.streaming_content.aclose()
+            return response.status_code, frames
+
+        status_code, (retry, reset) = async_to_sync(scenario)()
+        self.assertEqual(status_code, 200)
+        self.assertEqual(reset, "event: reset\ndata: {}\n\n")
+
+    def test_stream_requires_authentication(self):
+        response = async_to_sync(AsyncClient().get)("/api/tasks/events/")
+        self.assertEqual(response.status_code, 401)
+
+    def test_broker_outage_does_not_fail_committed_writes(self):
+        task = Task.objects.create(title="Doomed")
+        broker = events.get_broker()
+        with mock.patch.object(broker, "publish", side_effect=ConnectionError("broker down")), \
+                self.assertLogs("task_manager.events", "ERROR"):
+            created = self.client.post("/api/tasks/", {"title": "Kept"}, format="json")
+            deleted = self.client.delete(f"/api/tasks/{task.pk}/")
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(deleted.status_code, 204)
+        self.assertFalse(Task.objects.filter(pk=task.pk).exists())
+
+
+class TaskAsyncViewTests(TransactionTestCase):
+    """The ASGI-native stack (TASK_API_STACK = "async") answers like the DRF views."""
+
+    def setUp(self):
+        task_cache.get_cache().clear()
+        self.admin = User.objects.create_user(username="async-admin@example.com", password="x", is_staff=True)
+        self.user = User.objects.create_user(username="async-user@example.com", password="x")
+        self.factory = AsyncRequestFactory()
+        Task.objects.create(title="Open")
+        Task.objects.create(title="Done", completed=True)
+
+    def call(self, view, method, user=None, data=None, path="/api/tasks/", headers=None, **kwargs):
+        if data is not None:
+            request = getattr(self.factory, method)(path, json.dumps(data), content_type="application/json",
+                                                    headers=headers)
+        else:
+            request = getattr(self.factory, method)(path, headers=headers)
+        if user is not None:
+            request.COOKIES["access_token"] = str(RefreshToken.for_user(user).access_token)
+        response = async_to_sync(view)(request, **kwargs)
+        return response, (json.loads(response.content) if response.content else None)
+
+    def test_list_matches_sync_stack(self):
+        list_view = AsyncTaskListCreateView.as_view()
+        response, body = self.call(list_view, "get", self.user)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body["count"], 2)
+        self.assertEqual([task["title"] for task in body["results"]], ["Done", "Open"])
+        self.assertIn("ETag", response)
+
+        response, body = self.call(list_view, "get", self.user, path="/api/tasks/?completed=true")
+        self.assertEqual([task["title"] for task in body["results"]], ["Done"])
+
+        response, body = self.call(list_view, "get", self.user, path="/api/tasks/?page=9")
+        self.assertEqual(response.status_code, 404)
+
+    def test_requires_authentication(self):
+        response, body = self.call(AsyncTaskListCreateView.as_view(), "get")
+        self.assertEqual(response.status_code, 401)
+
+    def test_search_probes_fts_off_the_event_loop(self):
+        # A fresh process has no cached FTS flag; the probe must not run on the loop.
+        with mock.patch.dict(search._fts_available, clear=True):
+            response, body = self.call(AsyncTaskListCreateView.as_view(), "get", self.user, path="/api/tasks/?q=done")
+            self.assertIn("default", search._fts_available)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([task["title"] for task in body["results"]], ["Done"])
+
+    def test_create_update_delete(self):
+        list_view, detail_view = AsyncTaskListCreateView.as_view(), AsyncTaskDetailView.as_view()
+
+        response, body = self.call(list_view, "post", self.user, {"title": ""})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("title", body)
+
+        response, created = self.call(list_view, "post", self.user, {"title": "New"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(created, TaskSerializer(Task.objects.get(pk=created["id"])).data)
+
+        response, body = self.call(detail_view, "put", self.user, {"completed": True}, pk=created["id"])
+        self.assertEqual(response.status_code, 403)
+
+        response, body = self.call(detail_view, "put", self.admin, {"completed": True}, pk=created["id"])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Task.objects.get(pk=created["id"]).completed)
+
+        response, body = self.call(detail_view, "get", self.user, pk=created["id"])
+        self.assertTrue(body["completed"])
+
+        response, body = self.call(detail_view, "delete", self.admin, pk=created["id"])
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Task.objects.filter(pk=created["id"]).exists())
+        self.assertTrue(TaskTombstone.objects.filter(task_id=created["id"]).exists())
+
+        response, body = self.call(detail_view, "get", self.user, pk=created["id"])
+        self.assertEqual(response.status_code, 404)
+
+    def test_update_honours_if_match(self):
+        detail_view = AsyncTaskDetailView.as_view()
+        task = Task.objects.get(title="Open")
+        response, body = self.call(detail_view, "get", self.admin, pk=task.pk)
+        etag = response["ETag"]
+
+        response, body = self.call(detail_view, "put", self.admin, {"completed": True}, pk=task.pk,
+                                   headers={"If-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+        response, body = self.call(detail_view, "put", self.admin, {"title": "Stale"}, pk=task.pk,
+                                   headers={"If-Match": etag})
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(Task.objects.get(pk=task.pk).title, "Open")
+
+    def test_create_honours_idempotency_key(self):
+        list_view = AsyncTaskListCreateView.as_view()
+        headers = {"Idempotency-Key": "async-key"}
+        first, created = self.call(list_view, "post", self.user, {"title": "Async once"}, headers=headers)
+        replay, replayed = self.call(list_view, "post", self.user, {"title": "Async once"}, headers=headers)
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertEqual(replayed, created)
+        self.assertEqual(Task.objects.filter(title="Async once").count(), 1)
+
+
+class TaskIdempotencyTests(APITestCase):
+
+    def setUp(self):
+        task_cache.get_cache().clear()
+        self.admin = User.objects.create_user(username="idem@example.com", password="admin123", is_staff=True)
+        self.client = APIClient()
+        self.client.cookies["access_token"] = str(RefreshToken.for_user(self.admin).access_token)
+
+    def post(self, payload, key, url="/api/tasks/", client=None):
+        return (client or self.client).post(url, payload, format="json", headers={"Idempotency-Key": key})
+
+    def test_retry_replays_first_response_without_inserting(self):
+        first = self.post({"title": "Once"}, "key-1")
+        second = self.post({"title": "Once"}, "key-1")
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(Task.objects.filter(title="Once").count(), 1)
+
+    def test_requests_without_key_are_not_deduplicated(self):
+        self.client.post("/api/tasks/", {"title": "Twice"}, format="json")
+        self.client.post("/api/tasks/", {"title": "Twice"}, format="json")
+        self.assertEqual(Task.objects.filter(title="Twice").count(), 2)
+
+    def test_key_reused_with_different_body_is_rejected(self):
+        self.post({"title": "First"}, "key-2")
+        response = self.post({"title": "Second"}, "key-2")
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(Task.objects.filter(title="Second").exists())
+
+    def test_keys_are_scoped_per_user(self):
+        other = User.objects.create_user(username="idem2@example.com", password="x", is_staff=True)
+        other_client = APIClient()
+        other_client.cookies["access_token"] = str(RefreshToken.for_user(other).access_token)
+        self.post({"title": "Shared key"}, "key-3")
+        response = self.post({"title": "Shared key"}, "key-3", client=other_client)
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(Task.objects.filter(title="Shared key").count(), 2)
+
+    @override_settings(TASK_IDEMPOTENCY_WAIT=0.1)
+    def test_concurrent_duplicate_waits_then_conflicts(self):
+        request = SimpleNamespace(user=self.admin, method="POST", path="/api/tasks/")
+        _, lock_key = idempotency._keys(request, "key-4")
+        task_cache.get_cache().add(lock_key, 1)  # first request still running
+
+        response = self.post({"title": "Racing"}, "key-4")
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Task.objects.filter(title="Racing").exists())
+
+    def test_response_stored_before_lock_is_taken_is_replayed(self):
+        self.post({"title": "Finished"}, "key-6")
+        cache = task_cache.get_cache()
+        real_get = cache.get
+        calls = []
+
+        def get(key, *args, **kwargs):
+            calls.append(key)
+            # The first check misses, as if the holder stored its response just after it.
+            return None if len(calls) == 1 else real_get(key, *args, **kwargs)
+
+        with mock.patch.object(cache, "get", side_effect=get):
+            response = self.post({"title": "Finished"}, "key-6")
+        self.assertEqual(response["Idempotent-Replayed"], "true")
+        self.assertEqual(Task.objects.filter(title="Finished").count(), 1)
+
+    def test_expired_lock_taken_over_is_not_released(self):
+        request = SimpleNamespace(user=self.admin, method="POST", path="/api/tasks/", data={"title": "Slow"},
+                                  headers={"Idempotency-Key": "key-7"})
+        _, lock_key = idempotency._keys(request, "key-7")
+        cache = task_cache.get_cache()
+
+        def handler():
+            cache.set(lock_key, "another request")  # ours expired and someone else took it
+            return Response({}, status=201)
+
+        idempotency.run_idempotent(request, handler)
+        self.assertEqual(cache.get(lock_key), "another request")
+
+    def test_release_compares_and_deletes_in_one_step(self):
+        cache = task_cache.get_cache()
+        if not isinstance(cache, LocMemCache):
+            self.skipTest("checks the LocMemCache path")
+
+        class CountingLock:
+            def __init__(self, lock):
+                self.lock, self.acquired = lock, 0
+
+            def __enter__(self):
+                self.acquired += 1
+                return self.lock.__enter__()
+
+            def __exit__(self, *exc):
+                return self.lock.__exit__(*exc)
+
+        cache.set("idempotency-test-lock", 42)
+        lock = CountingLock(cache._lock)
+        with mock.patch.object(cache, "_lock", lock):
+            idempotency._release(cache, "idempotency-test-lock", 7)
+            async_to_sync(idempotency._arelease)(cache, "idempotency-test-lock", 42)
+        # One hold of the cache's lock per release: nobody can take the lock between check and delete.
+        self.assertEqual(lock.acquired, 2)
+        self.assertIsNone(cache.get("idempotency-test-lock"))
+
+    def test_bulk_writes_honour_key(self):
+        payload = [{"title": "Bulk A"}, {"title": "Bulk B"}]
+        self.post(payload, "key-5", url="/api/tasks/bulk/")
+        replay = self.post(payload, "key-5", url="/api/tasks/bulk/")
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertEqual(Task.objects.filter(title__startswith="Bulk").count(), 2)
@@ -1,7 +1,27 @@
+from django.conf import settings
 from django.urls import path
-from .views import TaskListCreateAPI, TaskDetailAPI
+from .views import (
+    TaskListCreateAPI,
+    TaskDetailAPI,
+    TaskBulkAPI,
+    TaskExportAPI,
+    TaskImportAPI,
+    TaskSyncAPI,
+    task_events,
+)
+from .async_views import AsyncTaskListCreateView, AsyncTaskDetailView
+
+if getattr(settings, "TASK_API_STACK", "sync") == "async":
+    task_list_view, task_detail_view = AsyncTaskListCreateView.as_view(), AsyncTaskDetailView.as_view()
+else:
+    task_list_view, task_detail_view = TaskListCreateAPI.as_view(), TaskDetailAPI.as_view()
 
 urlpatterns = [
-    path("", TaskListCreateAPI.as_view(), name="task_list"),
-    path("<int:pk>/", TaskDetailAPI.as_view(), name="task_detail"),
+    path("", task_list_view, name="task_list"),
+    path("events/", task_events, name="task_events"),
+    path("sync/", TaskSyncAPI.as_view(), name="task_sync"),
+    path("export/", TaskExportAPI.as_view(), name="task_export"),
+    path("import/", TaskImportAPI.as_view(), name="task_import"),
+    path("bulk/", TaskBulkAPI.as_view(), name="task_bulk"),
+    path("<int:pk>/", task_detail_view, name="task_detail"),
 ]
@@ -3,71 +3,258 @@ from django.shortcuts import render
 # Create your views here.
 # task_manager/views.py
 
+import gzip
+import io
+
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.generics import GenericAPIView
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
 
 from .models import Task
-from .serializers import TaskSerializer
+from .serializers import (
+    TaskSerializer, TaskBulkDeleteSerializer, TaskImportSerializer, TaskPageSerializer, parse_fields,
+)
 from .permissions import IsAdminOrReadOnly
-from auth.auth import CookieJWTAuthentication   
-
+from .filters import TaskFilter
+from .pagination import TaskPagination, get_task_paginator
+from . import cache as task_cache
+from . import conditional
+from . import events
+from . import export
+from . import importer
+from .idempotency import idempotent
+from . import sync
+from auth.auth import CookieAuthenticationMixin, get_cookie_authentication_class
+from auth.throttling import WriteRateThrottle
+from tasks import queries
 
+IF_MATCH_PARAMETER = OpenApiParameter(
+    "If-Match", str, OpenApiParameter.HEADER,
+    description="ETag from a previous read; the update is refused with 412 if the task changed since",
+)
+IDEMPOTENCY_KEY_PARAMETER = OpenApiParameter(
+    "Idempotency-Key", str, OpenApiParameter.HEADER,
+    description="Retry-safe key: repeats of the request replay the first response instead of writing again",
+)
 
-class TaskPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = "page_size"
 
 
-
-class TaskListCreateAPI(GenericAPIView):
-    authentication_classes = [CookieJWTAuthentication]
+class TaskListCreateAPI(CookieAuthenticationMixin, GenericAPIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [WriteRateThrottle]
+    query_budget = {"GET": 4, "POST": 2}  # see tasks/queries.py
     serializer_class = TaskSerializer
-    queryset = Task.objects.all()
+    # Matches task_completed_created_idx / task_created_idx so ordered pages are index scans.
+    queryset = Task.objects.order_by("-created_at", "-id")
     pagination_class = TaskPagination
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ["completed"]   
+    filterset_class = TaskFilter
 
     @extend_schema(
         parameters=[
             OpenApiParameter("completed", bool, OpenApiParameter.QUERY,
                              description="Filter by completion status (true/false)"),
+            OpenApiParameter("q", str, OpenApiParameter.QUERY,
+                             description="Full-text search over title and description; results are ranked"),
             OpenApiParameter("page", int, OpenApiParameter.QUERY,
                              description="Page number"),
+            OpenApiParameter("pagination", str, OpenApiParameter.QUERY, enum=["page", "cursor"],
+                             description="Pagination mode; defaults to TASK_PAGINATION_MODE"),
+            OpenApiParameter("cursor", str, OpenApiParameter.QUERY,
+                             description="Opaque keyset cursor (cursor mode only)"),
+            OpenApiParameter("fields", str, OpenApiParameter.QUERY,
+                             description="Comma-separated subset of task fields to return, e.g. id,title"),
         ],
-        responses={200: TaskSerializer(many=True)},
+        responses={
+            200: TaskSerializer(many=True),
+            304: OpenApiResponse(description="Not modified (If-None-Match)"),
+        },
         description="List all tasks (paginated & filterable)"
     )
     def get(self, request):
-        queryset = self.filter_queryset(self.get_queryset())
+        cache_key = task_cache.list_key(request) if task_cache.is_enabled() else None
+        entry = task_cache.lookup(cache_key) if cache_key else None
+
+        if entry is None:
+            etag = conditional.list_etag(request)
+        else:
+            etag = entry["etag"]
 
-        paginator = TaskPagination()
-        paginated_qs = paginator.paginate_queryset(queryset, request)
+        # Checked before the page is counted, fetched or serialized.
+        not_modified = conditional.not_modified(request, etag, None)
+        if not_modified is not None:
+            return not_modified
 
-        serializer = TaskSerializer(paginated_qs, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        if entry is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            page_serializer = TaskPageSerializer(parse_fields(request))
+            paginator = get_task_paginator(request)
+            page = paginator.paginate_queryset(page_serializer.prepare(queryset), request)
+            response = paginator.get_paginated_response(page_serializer.serialize(page))
+            if cache_key:
+                task_cache.store(cache_key, {"data": response.data, "etag": etag})
+        else:
+            response = Response(entry["data"])
+        return conditional.add_validators(response, etag, None)
 
     @extend_schema(
         request=TaskSerializer,
         responses={201: TaskSerializer},
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
         description="Create a new task"
     )
+    @idempotent
     def post(self, request):
         serializer = TaskSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
+            events.publish_on_commit("created", serializer.data)
             return Response(serializer.data, status=201)
         return Response(serializer.errors, status=400)
 
 
 
-class TaskDetailAPI(GenericAPIView):
-    authentication_classes = [CookieJWTAuthentication]
+class TaskExportAPI(CookieAuthenticationMixin, GenericAPIView):
+    permission_classes = [IsAuthenticated]
+    query_budget = 1  # the rows themselves stream after the view returns
+    serializer_class = TaskSerializer
+    queryset = Task.objects.order_by("id")
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = TaskFilter
+
+    content_types = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+    writers = {"ndjson": export.iter_ndjson, "csv": export.iter_csv}
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("completed", bool, OpenApiParameter.QUERY,
+                             description="Filter by completion status (true/false)"),
+            OpenApiParameter("export_format", str, OpenApiParameter.QUERY, enum=["ndjson", "csv"],
+                             description="Output format (default ndjson)"),
+            OpenApiParameter("gzip", bool, OpenApiParameter.QUERY,
+                             description="Return a gzip-compressed file"),
+        ],
+        responses={200: OpenApiResponse(description="Streamed NDJSON or CSV file")},
+        description="Stream every task as NDJSON or CSV"
+    )
+    def get(self, request):
+        export_format = request.query_params.get("export_format", "ndjson")
+        if export_format not in self.writers:
+            return Response({"error": "export_format must be 'ndjson' or 'csv'"}, status=400)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        chunk_size = getattr(settings, "TASK_EXPORT_CHUNK_SIZE", 2000)
+        stream = self.writers[export_format](queryset, chunk_size)
+
+        filename = f"tasks.{export_format}"
+        content_type = self.content_types[export_format]
+        if request.query_params.get("gzip") in ("1", "true", "True"):
+            stream = export.gzip_stream(stream)
+            filename += ".gz"
+            content_type = "application/gzip"
+
+        response = StreamingHttpResponse(stream, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+
+class TaskImportAPI(CookieAuthenticationMixin, GenericAPIView):
+    """Upload counterpart of `manage.py import_tasks`."""
+    permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    throttle_classes = [WriteRateThrottle]
+    query_budget = 1  # plus each chunk, which the importer adds as it writes
+    parser_classes = [MultiPartParser]
+    serializer_class = TaskImportSerializer
+
+    @extend_schema(
+        request={"multipart/form-data": TaskImportSerializer},
+        responses={
+            201: OpenApiResponse(description="Import summary: created/failed counts, row errors, throughput"),
+            400: OpenApiResponse(description="Missing file, unknown format, or a file that is not UTF-8 / valid gzip"),
+        },
+        description="Import tasks from an uploaded NDJSON or CSV file (admin only)"
+    )
+    def post(self, request):
+        serializer = TaskImportSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        upload = serializer.validated_data["file"]
+        import_format = serializer.validated_data.get("import_format") or importer.guess_format(upload.name)
+        # Django spools large uploads to a temp file; wrapping it keeps reads streaming.
+        raw = gzip.GzipFile(fileobj=upload) if upload.name.endswith(".gz") else upload
+        stream = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+
+        try:
+            result = importer.import_tasks(
+                importer.iter_records(stream, import_format),
+                chunk_size=getattr(settings, "TASK_IMPORT_CHUNK_SIZE", 1000),
+            )
+        except importer.UnreadableInput as exc:
+            return Response({"file": [str(exc)]}, status=400)
+        return Response(result.as_dict(), status=201)
+
+
+
+class TaskSyncAPI(CookieAuthenticationMixin, GenericAPIView):
+    permission_classes = [IsAuthenticated]
+    query_budget = 4
+    serializer_class = TaskSerializer
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("since", str, OpenApiParameter.QUERY,
+                             description="Watermark from the previous sync; omit for a full initial sync"),
+            OpenApiParameter("limit", int, OpenApiParameter.QUERY,
+                             description="Maximum changed tasks and deletions returned per call"),
+        ],
+        responses={
+            200: OpenApiResponse(description="`changed` tasks, `deleted` task ids, next `since` watermark and `has_more`"),
+            400: OpenApiResponse(description="Invalid watermark"),
+            410: OpenApiResponse(description="Watermark is older than tombstone retention; resync from scratch"),
+        },
+        description="Tasks created, updated or deleted since a watermark"
+    )
+    def get(self, request):
+        token = request.query_params.get("since")
+        try:
+            watermark = sync.decode_watermark(token) if token else None
+        except (TypeError, ValueError, KeyError):
+            return Response({"error": "Invalid watermark"}, status=400)
+
+        max_limit = getattr(settings, "TASK_SYNC_MAX_LIMIT", 1000)
+        try:
+            limit = min(max(int(request.query_params.get("limit", max_limit)), 1), max_limit)
+        except ValueError:
+            limit = max_limit
+
+        try:
+            changed, deleted, watermark, has_more = sync.changes_since(watermark, limit)
+        except sync.StaleWatermark:
+            return Response({"error": "Watermark expired, sync again without `since`"}, status=410)
+
+        return Response({
+            "changed": TaskSerializer(changed, many=True).data,
+            "deleted": deleted,
+            "since": sync.encode_watermark(watermark),
+            "has_more": has_more,
+        })
+
+
+
+class TaskDetailAPI(CookieAuthenticationMixin, GenericAPIView):
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    throttle_classes = [WriteRateThrottle]
+    query_budget = {"GET": 3, "PUT": 5, "DELETE": 5}
     serializer_class = TaskSerializer
     queryset = Task.objects.all()
     lookup_field = "pk"
@@ -79,18 +266,51 @@ class TaskDetailAPI(GenericAPIView):
             return None
 
     @extend_schema(
-        responses={200: TaskSerializer, 404: OpenApiResponse(description="Task not found")},
+        responses={
+            200: TaskSerializer,
+            304: OpenApiResponse(description="Not modified (If-None-Match / If-Modified-Since)"),
+            404: OpenApiResponse(description="Task not found"),
+        },
         description="Retrieve details of a specific task"
     )
     def get(self, request, pk):
-        task = self.get_object()
-        if not task:
-            return Response({"error": "Task not found"}, status=404)
-        return Response(TaskSerializer(task).data)
+        cache_key = task_cache.detail_key(pk) if task_cache.is_enabled() else None
+        entry = task_cache.lookup(cache_key) if cache_key else None
+
+        if entry is None:
+            if conditional.has_conditional_headers(request):
+                # Answer unchanged polls from updated_at alone, without loading the row.
+                etag, last_modified = conditional.detail_validators(pk)
+                if etag is None:
+                    return Response({"error": "Task not found"}, status=404)
+                response = conditional.not_modified(request, etag, last_modified)
+                if response is not None:
+                    return response
+
+            task = self.get_object()
+            if not task:
+                return Response({"error": "Task not found"}, status=404)
+
+            etag, last_modified = conditional.task_validators(task)
+            data = TaskSerializer(task).data
+            if cache_key:
+                task_cache.store(cache_key, {"data": data, "etag": etag, "last_modified": last_modified})
+        else:
+            data, etag, last_modified = entry["data"], entry["etag"], entry["last_modified"]
+            response = conditional.not_modified(request, etag, last_modified)
+            if response is not None:
+                return response
+
+        return conditional.add_validators(Response(data), etag, last_modified)
 
     @extend_schema(
         request=TaskSerializer,
-        responses={200: TaskSerializer, 403: OpenApiResponse(description="Forbidden")},
+        parameters=[IF_MATCH_PARAMETER],
+        responses={
+            200: TaskSerializer,
+            403: OpenApiResponse(description="Forbidden"),
+            412: OpenApiResponse(description="If-Match does not name the current version of the task"),
+        },
         description="Update a task (admin only)"
     )
     def put(self, request, pk):
@@ -98,12 +318,33 @@ class TaskDetailAPI(GenericAPIView):
         if not task:
             return Response({"error": "Task not found"}, status=404)
 
+        expected = conditional.if_match(request, task.pk)
+        if expected is not None and task.updated_at not in expected:
+            return conditional.precondition_failed(*conditional.task_validators(task))
+
         serializer = TaskSerializer(task, data=request.data, partial=True)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
 
-        return Response(serializer.errors, status=400)
+        changes = conditional.changed_fields(task, serializer.validated_data)
+        if changes:
+            queryset = Task.objects.filter(pk=task.pk)
+            if expected is not None:
+                # Re-check the version in the UPDATE itself so a concurrent write can't slip in between.
+                queryset = queryset.filter(updated_at=task.updated_at)
+            changes["updated_at"] = timezone.now()
+            if not queryset.update(**changes):
+                etag, last_modified = conditional.detail_validators(task.pk)
+                if etag is None:
+                    return Response({"error": "Task not found"}, status=404)
+                return conditional.precondition_failed(etag, last_modified)
+            for field, value in changes.items():
+                setattr(task, field, value)
+
+        data = TaskSerializer(task).data
+        if changes:
+            events.publish_on_commit("updated", data)
+        return conditional.add_validators(Response(data), *conditional.task_validators(task))
 
     @extend_schema(
         responses={204: OpenApiResponse(description="Task deleted"), 404: OpenApiResponse(description="Task not found")},
@@ -115,4 +356,206 @@ class TaskDetailAPI(GenericAPIView):
             return Response({"error": "Task not found"}, status=404)
 
         task.delete()
+        events.publish_on_commit("deleted", {"id": pk})
         return Response(status=204)
+
+
+
+class TaskBulkAPI(CookieAuthenticationMixin, GenericAPIView):
+    """
+    Create, update or delete many tasks per request.
+
+    Every item is validated on its own and reported back by index; the valid
+    ones are written together in one transaction with `bulk_create`,
+    `bulk_update` or a single `DELETE ... WHERE id IN (...)`.
+    """
+    permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    throttle_classes = [WriteRateThrottle]
+    query_budget = {"POST": 3, "PUT": 3, "DELETE": 5}  # plus the batches, added per request
+    serializer_class = TaskSerializer
+    queryset = Task.objects.all()
+
+    def get_max_batch_size(self):
+        return getattr(settings, "TASK_BULK_MAX_BATCH_SIZE", 1000)
+
+    def check_batch(self, items):
+        if not isinstance(items, list) or not items:
+            return Response({"error": "Expected a non-empty list of items"}, status=400)
+        max_batch_size = self.get_max_batch_size()
+        if len(items) > max_batch_size:
+            return Response({"error": f"At most {max_batch_size} items are allowed per request"}, status=400)
+        return None
+
+    def bulk_response(self, results, success_status):
+        failed = sum(1 for result in results if "errors" in result)
+        if not failed:
+            status = success_status
+        elif failed == len(results):
+            status = 400
+        else:
+            status = 207
+        return Response({"succeeded": len(results) - failed, "failed": failed, "results": results}, status=status)
+
+    @extend_schema(
+        request=TaskSerializer(many=True),
+        responses={
+            201: OpenApiResponse(description="All tasks created"),
+            207: OpenApiResponse(description="Some items failed validation; the rest were created"),
+            400: OpenApiResponse(description="No item was valid, or the batch is empty or too large"),
+        },
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
+        description="Create many tasks (admin only)"
+    )
+    @idempotent
+    def post(self, request):
+        error = self.check_batch(request.data)
+        if error:
+            return error
+
+        results, tasks = [], []
+        for index, item in enumerate(request.data):
+            serializer = TaskSerializer(data=item)
+            if serializer.is_valid():
+                tasks.append(Task(**serializer.validated_data))
+                results.append({"index": index, "status": "created"})
+            else:
+                results.append({"index": index, "status": "invalid", "errors": serializer.errors})
+
+        if tasks:
+            queries.allow_bulk_create(tasks)
+            with transaction.atomic():
+                Task.objects.bulk_create(tasks)
+
+        created = iter(tasks)
+        for result in results:
+            if result["status"] == "created":
+                result["id"] = next(created).pk
+        for task in tasks:
+            events.publish_on_commit("created", TaskSerializer(task).data)
+        return self.bulk_response(results, 201)
+
+    @extend_schema(
+        request=TaskSerializer(many=True),
+        responses={
+            200: OpenApiResponse(description="All tasks updated"),
+            207: OpenApiResponse(description="Some items failed; the rest were updated"),
+            400: OpenApiResponse(description="No item was valid, or the batch is empty or too large"),
+        },
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
+        description="Partially update many tasks, each item identified by `id` (admin only)"
+    )
+    @idempotent
+    def put(self, request):
+        error = self.check_batch(request.data)
+        if error:
+            return error
+
+        ids = [item.get("id") for item in request.data if isinstance(item, dict)]
+        ids = [pk for pk in ids if isinstance(pk, int) and not isinstance(pk, bool)]
+        queries.allow_in_bulk(ids)
+        with transaction.atomic():
+            existing = Task.objects.select_for_update().in_bulk(ids)
+
+            results, changed, fields = [], {}, set()
+            for index, item in enumerate(request.data):
+                pk = item.get("id") if isinstance(item, dict) else None
+                task = existing.get(pk) if isinstance(pk, int) and not isinstance(pk, bool) else None
+                if task is None:
+                    results.append({"index": index, "id": pk, "status": "not_found",
+                                    "errors": {"id": "Task not found"}})
+                    continue
+
+                serializer = TaskSerializer(task, data=item, partial=True)
+                if not serializer.is_valid():
+                    results.append({"index": index, "id": pk, "status": "invalid", "errors": serializer.errors})
+                    continue
+
+                for field, value in serializer.validated_data.items():
+                    setattr(task, field, value)
+                    fields.add(field)
+                changed[pk] = task
+                results.append({"index": index, "id": pk, "status": "updated"})
+
+            if changed:
+                now = timezone.now()
+                for task in changed.values():
+                    task.updated_at = now
+                fields = [*sorted(fields), "updated_at"]
+                queries.allow_bulk_update(list(changed.values()), fields)
+                Task.objects.bulk_update(changed.values(), fields)
+                for task in changed.values():
+                    events.publish_on_commit("updated", TaskSerializer(task).data)
+
+        return self.bulk_response(results, 200)
+
+    @extend_schema(
+        request=TaskBulkDeleteSerializer,
+        responses={
+            200: OpenApiResponse(description="All tasks deleted"),
+            207: OpenApiResponse(description="Some ids were not found; the rest were deleted"),
+            400: OpenApiResponse(description="No id was found, or the batch is empty or too large"),
+        },
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
+        description="Delete many tasks by id (admin only)"
+    )
+    @idempotent
+    def delete(self, request):
+        serializer = TaskBulkDeleteSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        ids = serializer.validated_data["ids"]
+        error = self.check_batch(ids)
+        if error:
+            return error
+
+        with transaction.atomic():
+            found = set(Task.objects.filter(id__in=ids).fast_delete())
+            for pk in found:
+                events.publish_on_commit("deleted", {"id": pk})
+
+        results = [
+            {"index": index, "id": pk, "status": "deleted"} if pk in found
+            else {"index": index, "id": pk, "status": "not_found", "errors": {"id": "Task not found"}}
+            for index, pk in enumerate(ids)
+        ]
+        return self.bulk_response(results, 200)
+
+
+async def task_events(request):
+    """
+    Server-Sent Events feed of task changes (needs an ASGI server, see tasks/asgi.py).
+
+    Resume after a disconnect with the `Last-Event-ID` header (browsers send it
+    automatically) or `?last_event_id=`. An `overflow` event means the client
+    fell too far behind and should reconnect with its last id; `reset` means
+    the id is malformed or no longer replayable and the client should resync.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    try:
+        authentication = get_cookie_authentication_class()()
+        authenticated = await authentication.aauthenticate(request)
+    except AuthenticationFailed as exc:
+        return JsonResponse({"detail": str(exc.detail)}, status=401)
+    if authenticated is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+    broker = events.get_broker()
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    reset = False
+    if last_event_id:
+        try:
+            broker.id_key(last_event_id)
+        except ValueError:
+            last_event_id, reset = None, True  # not an id we handed out; resync
+    subscription = await broker.subscribe()
+    response = StreamingHttpResponse(
+        events.stream(
+            subscription, broker, last_event_id,
+            heartbeat=getattr(settings, "TASK_EVENTS_HEARTBEAT", 15), reset=reset,
+        ),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
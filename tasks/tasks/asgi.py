@@ -3,14 +3,28 @@ ASGI config for tasks project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Long-lived streams such as the task change feed (/api/tasks/events/) need
+this entrypoint, e.g. ``uvicorn tasks.asgi:application``; under WSGI an
+async streaming response would be buffered. With DEBUG on, static files are
+served too, as ``runserver`` would.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tasks.settings')
 
 application = get_asgi_application()
+
+if settings.DEBUG:
+    application = ASGIStaticFilesHandler(application)
+
+from auth.blacklist import warm_blacklist_filter  # noqa: E402  (needs the app registry)
+
+warm_blacklist_filter()
@@ -0,0 +1,231 @@
+"""
+Response compression (gzip, and brotli when the `brotli` package is installed).
+
+Like Django's `GZipMiddleware`, but with a configurable level and minimum
+size, q-value aware `Accept-Encoding` negotiation (brotli wins ties), and
+per-chunk flushing for streaming responses so exports still reach the client
+incrementally. Responses are left alone when they are 304s, already carry a
+`Content-Encoding`, are of an already-compressed type (e.g. the gzipped
+export), or are an SSE stream.
+
+Responses, bytes in/out and the CPU time spent compressing are tallied per
+encoding and exported on /metrics as `http_compressed_responses_total`,
+`http_compression_*_total` and the `http_compression_ratio` gauge, summed
+across worker processes.
+"""
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+SKIP_CONTENT_TYPES = (
+    "application/gzip", "application/x-gzip", "application/zip", "application/octet-stream",
+    "image/", "audio/", "video/", "font/woff",
+    "text/event-stream",  # buffering inside the compressor would stall the feed
+)
+
+
+def _settings():
+    return (
+        getattr(settings, "COMPRESSION_MIN_SIZE", 1024),
+        getattr(settings, "COMPRESSION_GZIP_LEVEL", 6),
+        getattr(settings, "COMPRESSION_BROTLI_QUALITY", 5),
+    )
+
+
+class CompressionStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def record(self, encoding, size_in, size_out, cpu_seconds):
+        with self._lock:
+            totals = self._totals.setdefault(
+                encoding, {"responses": 0, "bytes_in": 0, "bytes_out": 0, "cpu_seconds": 0.0}
+            )
+            totals["responses"] += 1
+            totals["bytes_in"] += size_in
+            totals["bytes_out"] += size_out
+            totals["cpu_seconds"] += cpu_seconds
+
+    def snapshot(self):
+        """{encoding: {responses, bytes_in, bytes_out, cpu_seconds, ratio}}; ratio is bytes_in / bytes_out."""
+        with self._lock:
+            totals = {encoding: dict(values) for encoding, values in self._totals.items()}
+        for values in totals.values():
+            values["ratio"] = values["bytes_in"] / values["bytes_out"] if values["bytes_out"] else 0.0
+        return totals
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+
+stats = CompressionStats()
+
+
+@metrics.register_process_collector
+def _compression_metrics():
+    snapshot = stats.snapshot()
+    counters = {
+        "http_compressed_responses_total": ("responses", "Responses compressed, by encoding."),
+        "http_compression_input_bytes_total": ("bytes_in", "Bytes fed to the compressor, by encoding."),
+        "http_compression_output_bytes_total": ("bytes_out", "Compressed bytes sent, by encoding."),
+        "http_compression_cpu_seconds_total": ("cpu_seconds", "Thread CPU time spent compressing, by encoding."),
+    }
+    return {
+        name: metrics.family("counter", documentation, [
+            [name, {"encoding": encoding}, totals[key]] for encoding, totals in snapshot.items()
+        ])
+        for name, (key, documentation) in counters.items()
+    }
+
+
+@metrics.register_collector
+def _compression_ratio(families):
+    bytes_in = {s[1]["encoding"]: s[2] for s in families["http_compression_input_bytes_total"]["samples"]}
+    bytes_out = {s[1]["encoding"]: s[2] for s in families["http_compression_output_bytes_total"]["samples"]}
+    return {
+        "http_compression_ratio": metrics.family("gauge", "Uncompressed / compressed bytes, by encoding.", [
+            ["http_compression_ratio", {"encoding": encoding}, size / bytes_out[encoding]]
+            for encoding, size in bytes_in.items() if bytes_out.get(encoding)
+        ]),
+    }
+
+
+def accepted_encodings(header):
+    """
+    `Accept-Encoding` -> {coding: q}, keeping explicit `q=0` entries: they
+    refuse a coding even when `*` would accept it.
+    """
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(header):
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get("*", 0)
+    candidates = [("br", accepted.get("br", wildcard))] if brotli is not None else []
+    candidates.append(("gzip", accepted.get("gzip", wildcard)))
+    encoding, q = max(candidates, key=lambda candidate: candidate[1])  # max() keeps the first (br) on ties
+    return encoding if q > 0 else None
+
+
+class _Compressor:
+    """One response's compressor; `compress` / `flush` / `finish` return bytes and add to the totals."""
+
+    def __init__(self, encoding, gzip_level, brotli_quality):
+        self.encoding = encoding
+        self.size_in = self.size_out = 0
+        self.cpu_seconds = 0.0
+        if encoding == "br":
+            self._impl = brotli.Compressor(quality=brotli_quality)
+            self._compress, self._flush, self._finish = self._impl.process, self._impl.flush, self._impl.finish
+        else:
+            self._impl = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._compress = self._impl.compress
+            self._flush = lambda: self._impl.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = self._impl.flush
+
+    def _timed(self, fn, *args):
+        start = time.thread_time()
+        data = fn(*args)
+        self.cpu_seconds += time.thread_time() - start
+        self.size_out += len(data)
+        return data
+
+    def compress(self, data):
+        self.size_in += len(data)
+        return self._timed(self._compress, data)
+
+    def flush(self):
+        return self._timed(self._flush)
+
+    def finish(self):
+        data = self._timed(self._finish)
+        stats.record(self.encoding, self.size_in, self.size_out, self.cpu_seconds)
+        return data
+
+
+def _as_bytes(chunk):
+    return chunk.encode() if isinstance(chunk, str) else bytes(chunk)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+
+    def process_response(self, request, response):
+        if response.status_code == 304 or response.has_header("Content-Encoding"):
+            return response
+        content_type = response.get("Content-Type", "").lower()
+        if content_type.startswith(SKIP_CONTENT_TYPES):
+            return response
+
+        min_size, gzip_level, brotli_quality = _settings()
+        if not response.streaming and len(response.content) < min_size:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        compressor = _Compressor(encoding, gzip_level, brotli_quality)
+        if response.streaming:
+            response.streaming_content = (
+                self._acompress_stream(compressor, response.streaming_content) if response.is_async
+                else self._compress_stream(compressor, response.streaming_content)
+            )
+            del response.headers["Content-Length"]
+        else:
+            compressed = compressor.compress(response.content) + compressor.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        # The bytes differ from the identity encoding, so a strong ETag must become weak (RFC 9110 8.8.1).
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    @staticmethod
+    def _compress_stream(compressor, chunks):
+        for chunk in chunks:
+            data = compressor.compress(_as_bytes(chunk)) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+
+    @staticmethod
+    async def _acompress_stream(compressor, chunks):
+        async for chunk in chunks:
+            data = compressor.compress(_as_bytes(chunk)) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
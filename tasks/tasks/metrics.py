@@ -0,0 +1,340 @@
+"""
+Prometheus metrics for the API, served in the text exposition format at /metrics.
+
+`MetricsMiddleware` records, per view (`TaskListCreateAPI`, `LoginAPI`, ...):
+- `http_request_duration_seconds` (histogram);
+- `http_responses_total` by status;
+- `db_queries_per_request` and `db_query_duration_seconds_per_request`
+  (histograms; queries are counted the same way as for `tasks.profiling`).
+
+Apps add process-local counters (cache hits, compression bytes) with
+`register_process_collector` and scrape-time gauges (blacklist sizes) with
+`register_collector`.
+
+Collectors are lock-light: each thread updates its own shard of values
+without a lock, and a scrape sums the shards. The shards of threads that have
+exited are folded into one retired total, so a thread-per-connection server
+keeps one shard per live thread rather than one per thread ever started.
+
+Several worker processes: set `METRICS_MULTIPROC_DIR` to a directory shared
+by the workers. Each process then writes its totals there at most every
+`METRICS_FLUSH_INTERVAL` seconds, and whichever worker serves /metrics sums
+every process's file. Totals of a worker that exits stay in the sum. A
+restarted worker reusing a pid shows up as a counter reset, which `rate()`
+handles.
+"""
+import glob
+import hmac
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+
+from . import profiling
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+# Anything else a client sends is labelled "other", so the label can't grow without bound.
+METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+logger = logging.getLogger(__name__)
+
+_metrics = []
+_process_collectors = []
+_collectors = []
+
+_local = threading.local()
+_shards = {}  # thread -> its shard
+_retired = {}  # summed values of exited threads' shards
+_shards_lock = threading.Lock()
+
+
+def _shard():
+    try:
+        return _local.shard
+    except AttributeError:
+        shard = _local.shard = {}
+        with _shards_lock:
+            _retire_exited_threads()
+            _shards[threading.current_thread()] = shard
+        return shard
+
+
+def _combine(a, b):
+    # Counter values are numbers, histogram states lists of numbers.
+    return [x + y for x, y in zip(a, b)] if isinstance(a, list) else a + b
+
+
+def _retire_exited_threads():
+    # Caller holds _shards_lock. An exited thread no longer writes to its shard.
+    for thread in [thread for thread in _shards if not thread.is_alive()]:
+        for key, value in _shards.pop(thread).items():
+            _retired[key] = _combine(_retired[key], value) if key in _retired else value
+
+
+def family(kind, documentation, samples):
+    """A metric family as collected: `samples` are `[sample_name, {label: value}, number]`."""
+    return {"type": kind, "help": documentation, "samples": samples}
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _metrics.append(self)
+
+    def _merged(self):
+        merged = {}
+        with _shards_lock:
+            _retire_exited_threads()
+            shards = [dict(_retired), *_shards.values()]
+        for shard in shards:
+            for (metric, labelvalues), value in dict(shard).items():
+                if metric is self:
+                    merged[labelvalues] = _combine(merged[labelvalues], value) if labelvalues in merged else value
+        return merged
+
+    def _labels(self, labelvalues, **extra):
+        return {**dict(zip(self.labelnames, labelvalues)), **extra}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labelvalues, amount=1):
+        shard = _shard()
+        key = (self, labelvalues)
+        shard[key] = shard.get(key, 0) + amount
+
+    def collect(self):
+        merged = self._merged()
+        return family(self.kind, self.documentation, [
+            [self.name, self._labels(labelvalues), value] for labelvalues, value in merged.items()
+        ])
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labelvalues):
+        shard = _shard()
+        key = (self, labelvalues)
+        state = shard.get(key)
+        if state is None:
+            # One count per bucket plus the +Inf overflow, then the running sum.
+            state = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def collect(self):
+        merged = self._merged()
+        samples = []
+        for labelvalues, state in merged.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), state):
+                cumulative += count
+                samples.append([f"{self.name}_bucket", self._labels(labelvalues, le=_format_bound(bound)), cumulative])
+            samples.append([f"{self.name}_count", self._labels(labelvalues), cumulative])
+            samples.append([f"{self.name}_sum", self._labels(labelvalues), state[-1]])
+        return family(self.kind, self.documentation, samples)
+
+
+def _format_bound(bound):
+    return bound if isinstance(bound, str) else repr(float(bound))
+
+
+def register_process_collector(fn):
+    """`fn()` -> {name: family} of this process's counters; summed across processes."""
+    _process_collectors.append(fn)
+    return fn
+
+
+def register_collector(fn):
+    """`fn(families)` -> {name: family} computed at scrape time (gauges over shared state or totals)."""
+    _collectors.append(fn)
+    return fn
+
+
+def process_families():
+    families = {metric.name: metric.collect() for metric in _metrics}
+    for collector in _process_collectors:
+        families.update(collector())
+    return families
+
+
+def merge(snapshots):
+    """Sum several processes' families sample by sample."""
+    merged = {}
+    for families in snapshots:
+        for name, fam in families.items():
+            target = merged.setdefault(name, {"type": fam["type"], "help": fam["help"], "samples": {}})
+            for sample_name, labels, value in fam["samples"]:
+                key = (sample_name, tuple(sorted(labels.items())))
+                target["samples"][key] = target["samples"].get(key, 0) + value
+    return {
+        name: family(fam["type"], fam["help"], [
+            [sample_name, dict(labels), value] for (sample_name, labels), value in fam["samples"].items()
+        ])
+        for name, fam in merged.items()
+    }
+
+
+_flush_lock = threading.Lock()
+_last_flush = 0.0
+
+
+def flush(force=False):
+    """
+    Write this process's totals to METRICS_MULTIPROC_DIR (at most every
+    METRICS_FLUSH_INTERVAL s). A write error is logged, not raised: it runs
+    inside every request.
+    """
+    global _last_flush
+    directory = getattr(settings, "METRICS_MULTIPROC_DIR", None)
+    if not directory:
+        return
+    now = time.monotonic()
+    if not force and now - _last_flush < getattr(settings, "METRICS_FLUSH_INTERVAL", 5):
+        return
+    if not _flush_lock.acquire(blocking=force):
+        return
+    try:
+        _last_flush = now
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(process_families(), f)
+            os.replace(tmp, os.path.join(directory, f"metrics-{os.getpid()}.json"))
+        except OSError:
+            os.unlink(tmp)
+            raise
+    except OSError:
+        logger.exception("Could not write metrics to %s", directory)
+    finally:
+        _flush_lock.release()
+
+
+def collect():
+    directory = getattr(settings, "METRICS_MULTIPROC_DIR", None)
+    if directory:
+        flush(force=True)
+        snapshots = []
+        for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # being replaced or truncated; next scrape will see it
+        families = merge(snapshots)
+    else:
+        families = merge([process_families()])
+    for collector in _collectors:
+        families.update(collector(families))
+    return families
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_value(value):
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def exposition(families):
+    lines = []
+    for name in sorted(families):
+        fam = families[name]
+        lines.append(f"# HELP {name} {fam['help']}")
+        lines.append(f"# TYPE {name} {fam['type']}")
+        for sample_name, labels, value in fam["samples"]:
+            if labels:
+                rendered = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+                lines.append(f"{sample_name}{{{rendered}}} {_format_value(value)}")
+            else:
+                lines.append(f"{sample_name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponse(status=401)
+    return HttpResponse(exposition(collect()), content_type=CONTENT_TYPE)
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time spent handling a request, by view.", ["view", "method"],
+)
+RESPONSES = Counter("http_responses_total", "Responses sent, by view and status.", ["view", "method", "status"])
+DB_QUERIES = Histogram(
+    "db_queries_per_request", "Database queries issued per request.", ["view"], buckets=QUERY_COUNT_BUCKETS,
+)
+DB_TIME = Histogram(
+    "db_query_duration_seconds_per_request", "Total time spent in database queries per request.", ["view"],
+)
+
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    view_class = getattr(match.func, "view_class", None) or getattr(match.func, "cls", None)
+    return (view_class or match.func).__name__
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        profiling.install_query_timer()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with profiling.tracking() as timings:
+            start = time.perf_counter()
+            response = self.get_response(request)
+        self._record(request, response, timings, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        with profiling.tracking() as timings:
+            start = time.perf_counter()
+            response = await self.get_response(request)
+        self._record(request, response, timings, time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def _record(request, response, timings, elapsed):
+        view = view_name(request)
+        method = request.method if request.method in METHODS else "other"
+        REQUEST_DURATION.observe(elapsed, view, method)
+        RESPONSES.inc(view, method, str(response.status_code))
+        DB_QUERIES.observe(timings.queries, view)
+        DB_TIME.observe(timings.query_seconds, view)
+        flush()
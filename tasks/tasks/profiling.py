@@ -0,0 +1,240 @@
+"""
+Opt-in per-request timing (`PROFILING_ENABLED`, or the PROFILING environment variable).
+
+For every request the middleware records the wall time, the number and total
+time of DB queries (through the connections' execute wrappers), and the time spent
+in sections marked with `section()` / `@timed()`: "auth" (cookie JWT
+authentication), "serialize" (task serializers) and "render" (JSON
+encoding). The numbers go out as a `Server-Timing` header, which browser
+devtools display, and as one JSON log line on the `tasks.profiling` logger.
+
+Sampling: with `PROFILING_SAMPLE_RATE > 0` that fraction of sync requests
+also runs under cProfile. When such a request takes at least
+`PROFILING_SLOW_MS`, its profile is written to `PROFILING_DIR` as a `.prof`
+file (open it with `python -m pstats` or snakeviz). Only the newest
+`PROFILING_MAX_FILES` files are kept. One request is profiled at a time.
+"""
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_started
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sections = {}
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def add(self, name, seconds):
+        self.sections[name] = self.sections.get(name, 0.0) + seconds
+
+    def add_query(self, seconds):
+        self.queries += 1
+        self.query_seconds += seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, total):
+        metrics = [f"total;dur={total * 1000:.1f}",
+                   f'db;dur={self.query_seconds * 1000:.1f};desc="{self.queries} queries"']
+        metrics += [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.sections.items()]
+        return ", ".join(metrics)
+
+
+def current():
+    """The timings of the request being handled, or None outside a profiled request."""
+    return _current.get()
+
+
+@contextmanager
+def tracking():
+    """Collect `RequestTimings` for the block, or join the ones an outer middleware already started."""
+    timings = _current.get()
+    if timings is not None:
+        yield timings
+        return
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def section(name):
+    """Add the time spent in the block to `name` for the current request (no-op when not profiling)."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """Decorator form of `section()`, for plain and async functions."""
+
+    def decorator(fn):
+        if iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with section(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with section(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def install_query_timer():
+    """Count and time DB queries into the current `RequestTimings` from now on."""
+    request_started.connect(_install_query_timer, dispatch_uid="tasks.profiling.query_timer")
+
+
+def _install_query_timer(**kwargs):
+    # Sent on the thread that will run the request's queries (for ASGI too), so
+    # this reaches the right connection objects. The timer is inert outside
+    # profiled requests, so it can stay installed.
+    for alias in connections:
+        wrappers = connections[alias].execute_wrappers
+        if _record_query not in wrappers:
+            wrappers.append(_record_query)
+
+
+def _record_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(time.perf_counter() - start)
+
+
+class ProfileRing:
+    """At most `max_files` `.prof` dumps in `directory`; the oldest are deleted first."""
+
+    def __init__(self, directory, max_files):
+        self.directory = Path(directory)
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def save(self, profile, request, total):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", request.path).strip("_")[:60] or "root"
+        name = f"{time.time_ns()}-{request.method}-{slug}-{total * 1000:.0f}ms.prof"
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        profile.dump_stats(tmp)
+        path = self.directory / name
+        os.replace(tmp, path)
+        with self._lock:
+            dumps = sorted(self.directory.glob("*.prof"))
+            for old in dumps[:max(0, len(dumps) - self.max_files)]:
+                old.unlink(missing_ok=True)
+        return path
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "PROFILING_SAMPLE_RATE", 0.0)
+        self.slow_seconds = getattr(settings, "PROFILING_SLOW_MS", 500) / 1000
+        self.ring = ProfileRing(
+            getattr(settings, "PROFILING_DIR", Path(tempfile.gettempdir()) / "task-profiles"),
+            getattr(settings, "PROFILING_MAX_FILES", 50),
+        )
+        self._profiler_lock = threading.Lock()
+        install_query_timer()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with tracking() as timings:
+            if self.sample_rate and random.random() < self.sample_rate \
+                    and self._profiler_lock.acquire(blocking=False):
+                try:
+                    response = self._profiled(request, timings)
+                finally:
+                    self._profiler_lock.release()
+            else:
+                response = self.get_response(request)
+        return self._finish(request, response, timings)
+
+    async def __acall__(self, request):
+        # Not sampled: cProfile would also charge other requests running on the event loop.
+        with tracking() as timings:
+            response = await self.get_response(request)
+        return self._finish(request, response, timings)
+
+    def _profiled(self, request, timings):
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.disable()
+        total = timings.elapsed()
+        if total >= self.slow_seconds:
+            try:
+                request.profile_path = self.ring.save(profile, request, total)
+            except OSError:
+                logger.exception("could not save request profile")
+        return response
+
+    def _finish(self, request, response, timings):
+        total = timings.elapsed()
+        response["Server-Timing"] = timings.server_timing(total)
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(total * 1000, 2),
+            "db_queries": timings.queries,
+            "db_ms": round(timings.query_seconds * 1000, 2),
+            **{f"{name}_ms": round(seconds * 1000, 2) for name, seconds in timings.sections.items()},
+        }
+        profile_path = getattr(request, "profile_path", None)
+        if profile_path is not None:
+            record["profile"] = str(profile_path)
+        logger.info(json.dumps(record))
+        return response
@@ -0,0 +1,259 @@
+"""
+Query inspection: slow-query log, repeated-query (N+1) detection and query budgets.
+
+Every statement goes through `_inspect_query`, an execute wrapper installed on
+each connection the same way as the `tasks.profiling` query timer.
+
+* Slow queries: a statement taking at least `QUERY_SLOW_MS` is logged on the
+  `tasks.queries` logger as one JSON line with its SQL, duration and (for
+  SELECTs, when `QUERY_EXPLAIN` is on) the database's `EXPLAIN` plan.
+* N+1: `QueryInspectorMiddleware` groups a request's statements by shape
+  (the SQL with literals and parameter lists replaced by `?`). A shape run
+  `QUERY_REPEAT_THRESHOLD` or more times in one request is logged as a
+  `repeated_query` warning, e.g. a per-task lookup inside a list view.
+* Budgets: a view may declare `query_budget`, either a number or
+  `{method: number}`, covering its fixed statements; work whose statement
+  count grows with the input (import chunks, bulk writes that the backend
+  splits into batches) adds to it as it goes with `allow_queries`,
+  `allow_bulk_create`, `allow_bulk_update` and `allow_in_bulk`. A request that goes over its budget is logged, or
+  raises `QueryBudgetExceeded` when `QUERY_BUDGET_STRICT` is on (the test
+  runner turns it on), so a test that exercises the view fails.
+
+In tests, `assert_max_queries(n)` checks a block directly and reports the
+statements and repeated shapes when it goes over.
+"""
+import json
+import logging
+import re
+import time
+from math import ceil
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import DatabaseError, connections
+from django.test.utils import CaptureQueriesContext
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar("request_queries", default=None)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def shape(sql):
+    """`sql` with literals and parameters replaced by `?`, so N+1 lookups compare equal."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _LIST.sub("(?)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+class RequestQueries:
+    def __init__(self):
+        self.statements = []
+        self.allowance = 0
+
+    def add(self, sql, seconds):
+        self.statements.append((sql, seconds))
+
+    def __len__(self):
+        return len(self.statements)
+
+    def repeated(self, threshold):
+        """[(shape, count)] for the shapes run at least `threshold` times, most frequent first."""
+        counts = Counter(shape(sql) for sql, _ in self.statements)
+        return [(sql, count) for sql, count in counts.most_common() if count >= threshold]
+
+
+@contextmanager
+def inspecting():
+    """Collect the statements run in the block, or join the collection an outer caller started."""
+    queries = _current.get()
+    if queries is not None:
+        yield queries
+        return
+    queries = RequestQueries()
+    token = _current.set(queries)
+    try:
+        yield queries
+    finally:
+        _current.reset(token)
+
+
+def allow_queries(count):
+    """Raise the running request's query budget by `count`; a no-op outside a request."""
+    queries = _current.get()
+    if queries is not None:
+        queries.allowance += count
+
+
+def allow_bulk_create(objs, using="default"):
+    """`allow_queries` for the INSERTs `bulk_create(objs)` is split into on `using`."""
+    if objs:
+        opts = objs[0]._meta
+        fields = [field for field in opts.concrete_fields if field is not opts.auto_field]
+        allow_queries(ceil(len(objs) / max(connections[using].ops.bulk_batch_size(fields, objs), 1)))
+
+
+def allow_bulk_update(objs, fields, using="default"):
+    """`allow_queries` for the UPDATEs `bulk_update(objs, fields)` is split into on `using`."""
+    if objs:
+        batch_size = connections[using].ops.bulk_batch_size(["pk", "pk", *fields], objs)
+        allow_queries(ceil(len(objs) / max(batch_size, 1)))
+
+
+def allow_in_bulk(ids, using="default"):
+    """`allow_queries` for the SELECTs `in_bulk(ids)` is split into on `using`."""
+    if ids:
+        batch_size = connections[using].features.max_query_params or len(ids)
+        allow_queries(ceil(len(ids) / batch_size))
+
+
+def install():
+    """Inspect every statement from now on (slow-query log, and per-request collection)."""
+    request_started.connect(_install_inspector, dispatch_uid="tasks.queries.inspector")
+
+
+def _install_inspector(**kwargs):
+    # Like profiling's query timer: request_started runs on the thread that owns the connections.
+    for alias in connections:
+        wrappers = connections[alias].execute_wrappers
+        if _inspect_query not in wrappers:
+            wrappers.append(_inspect_query)
+
+
+def _inspect_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - start
+        queries = _current.get()
+        if queries is not None:
+            queries.add(sql, seconds)
+        slow_ms = getattr(settings, "QUERY_SLOW_MS", 200)
+        if slow_ms is not None and seconds * 1000 >= slow_ms:
+            _log_slow(context["connection"], sql, None if many else params, seconds)
+
+
+def explain(connection, sql, params):
+    """The database's plan for a SELECT as a list of lines; [] when it can't be explained."""
+    if params is None or not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+        return []
+    # A raw backend cursor: it skips the execute wrappers, so the EXPLAIN is
+    # neither inspected again nor counted towards the request.
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+        return [str(row[-1]) for row in cursor.fetchall()]
+    except DatabaseError:
+        return []
+    finally:
+        cursor.close()
+
+
+def _log_slow(connection, sql, params, seconds):
+    record = {
+        "event": "slow_query",
+        "database": connection.alias,
+        "duration_ms": round(seconds * 1000, 2),
+        "sql": sql,
+    }
+    if getattr(settings, "QUERY_EXPLAIN", True):
+        record["plan"] = explain(connection, sql, params)
+    logger.warning(json.dumps(record))
+
+
+def view_budget(request):
+    """The `query_budget` the resolved view declares for this request's method, or None."""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return None
+    view_class = getattr(match.func, "view_class", None) or getattr(match.func, "cls", None)
+    budget = getattr(view_class or match.func, "query_budget", None)
+    if isinstance(budget, dict):
+        return budget.get(request.method)
+    return budget
+
+
+def _describe(statements, repeats):
+    lines = [f"  {sql}" for sql in statements]
+    lines += [f"  repeated {count}x: {sql}" for sql, count in repeats]
+    return "\n".join(lines)
+
+
+class QueryInspectorMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with inspecting() as queries:
+            response = self.get_response(request)
+        self._check(request, queries)
+        return response
+
+    async def __acall__(self, request):
+        with inspecting() as queries:
+            response = await self.get_response(request)
+        self._check(request, queries)
+        return response
+
+    @staticmethod
+    def _check(request, queries):
+        # Allowed statements are batches of one shape; don't report them as N+1.
+        repeats = queries.repeated(getattr(settings, "QUERY_REPEAT_THRESHOLD", 5) + queries.allowance)
+        for sql, count in repeats:
+            logger.warning(json.dumps({
+                "event": "repeated_query", "method": request.method, "path": request.path,
+                "count": count, "shape": sql,
+            }))
+        budget = view_budget(request)
+        if budget is None:
+            return
+        budget += queries.allowance
+        if len(queries) <= budget:
+            return
+        message = f"{request.method} {request.path} ran {len(queries)} queries, over its budget of {budget}"
+        if getattr(settings, "QUERY_BUDGET_STRICT", False):
+            statements = [sql for sql, _ in queries.statements]
+            raise QueryBudgetExceeded(f"{message}:\n{_describe(statements, repeats)}")
+        logger.warning(json.dumps({"event": "query_budget", "method": request.method, "path": request.path,
+                                   "queries": len(queries), "budget": budget}))
+
+
+@contextmanager
+def assert_max_queries(budget, using="default", repeat_threshold=None):
+    """Fail unless the block runs at most `budget` queries (and, if given, no shape `repeat_threshold`+ times)."""
+    with CaptureQueriesContext(connections[using]) as captured:
+        yield captured
+    queries = RequestQueries()
+    for query in captured.captured_queries:
+        queries.add(query["sql"], float(query["time"]))
+    repeats = queries.repeated(repeat_threshold) if repeat_threshold is not None else []
+    if len(queries) > budget or repeats:
+        statements = [sql for sql, _ in queries.statements]
+        raise QueryBudgetExceeded(
+            f"{len(queries)} queries (budget {budget}), {len(repeats)} repeated shapes:\n"
+            f"{_describe(statements, repeats)}"
+        )
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,6 +50,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'tasks.metrics.MetricsMiddleware',
+    'tasks.queries.QueryInspectorMiddleware',
+    'tasks.profiling.ProfilingMiddleware',
+    'tasks.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -56,6 +62,44 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Response compression (tasks/compression.py): gzip, or brotli when the
+# brotli package is installed and the client prefers it. Bodies smaller than
+# COMPRESSION_MIN_SIZE bytes are sent as is; streaming responses always qualify.
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Per-request timings as Server-Timing headers and JSON log lines
+# (tasks/profiling.py); off unless PROFILING=1. PROFILING_SAMPLE_RATE of sync
+# requests also run under cProfile, and those slower than PROFILING_SLOW_MS
+# are dumped to PROFILING_DIR, keeping the newest PROFILING_MAX_FILES.
+PROFILING_ENABLED = os.environ.get('PROFILING', '') == '1'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_SLOW_MS = 500
+PROFILING_DIR = Path(os.environ.get('PROFILING_DIR') or Path(tempfile.gettempdir()) / 'task-profiles')
+PROFILING_MAX_FILES = 50
+
+# Prometheus metrics at /metrics (tasks/metrics.py). With several worker
+# processes, point METRICS_MULTIPROC_DIR at a directory they share (and clear
+# it on deploy); each worker writes its totals there every
+# METRICS_FLUSH_INTERVAL seconds. When METRICS_TOKEN is set, scrapes must send
+# `Authorization: Bearer <token>`.
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR') or None
+METRICS_FLUSH_INTERVAL = 5
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
+# Query inspection (tasks/queries.py): statements slower than QUERY_SLOW_MS
+# are logged with their EXPLAIN plan (QUERY_EXPLAIN), and a statement shape
+# repeated QUERY_REPEAT_THRESHOLD times in one request is logged as a likely
+# N+1. Views over their `query_budget` are logged, or fail the request when
+# QUERY_BUDGET_STRICT is on (QUERY_BUDGET_STRICT=1, and always under
+# `manage.py test` via TEST_RUNNER).
+QUERY_SLOW_MS = int(os.environ.get('QUERY_SLOW_MS', 200))
+QUERY_EXPLAIN = True
+QUERY_REPEAT_THRESHOLD = 5
+QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', '') == '1'
+TEST_RUNNER = 'tasks.test_runner.QueryBudgetTestRunner'
+
 ROOT_URLCONF = 'tasks.urls'
 
 TEMPLATES = [
@@ -79,15 +123,50 @@ WSGI_APPLICATION = 'tasks.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+# SQLITE_PATH points the server at another database file, e.g. a dataset
+# generated by `python -m benchmarks.loadtest --generate-only`.
+# IMMEDIATE transactions take SQLite's write lock up front, so concurrent
+# writers wait for it (up to the busy timeout) instead of failing with
+# "database is locked" when a read transaction tries to upgrade.
 
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH') or BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Redis when REDIS_URL is set (docker-compose does this), otherwise an
+# in-process stand-in so tests and local runs need no Redis.
+
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Read-through cache for GET /api/tasks/ and /api/tasks/{id}/ (task_manager/cache.py).
+TASK_CACHE_ENABLED = True
+TASK_CACHE_ALIAS = 'default'
+TASK_CACHE_TIMEOUT = 300
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -129,11 +208,40 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Authorize API requests from the access token's is_staff claim instead of
+# loading the user, while the token's stamp (password, is_staff, is_active)
+# matches the cached one. Stamps are re-read from the database after
+# JWT_USER_STAMP_TIMEOUT seconds; with a per-process cache (no REDIS_URL) other
+# processes may honour stale claims for up to that long.
+JWT_STATELESS_AUTH = True
+JWT_USER_STAMP_CACHE_ALIAS = 'default'
+JWT_USER_STAMP_TIMEOUT = 60
+
+# Bloom filter answering "not blacklisted" for refresh tokens without a query
+# (auth/blacklist.py): 'redis' shares it across processes, None checks the
+# database. 'local' is per-process and misses other workers' logouts, so it
+# is only honoured with JWT_BLACKLIST_FILTER_SINGLE_PROCESS = True.
+JWT_BLACKLIST_FILTER = 'redis' if REDIS_URL else None
+JWT_BLACKLIST_FILTER_SINGLE_PROCESS = False
+JWT_BLACKLIST_FILTER_CAPACITY = 1_000_000
+JWT_BLACKLIST_FILTER_ERROR_RATE = 0.001
+
+# The jwt_outstanding_tokens / jwt_blacklisted_tokens gauges on /metrics are
+# recounted at most every JWT_TOKEN_METRICS_TTL seconds, and after each
+# prune_expired_tokens run.
+JWT_TOKEN_METRICS_TTL = 60
+
+# Password hashing for login/registration (auth/hashing.py): 0 hashes inline
+# in the request worker, N > 0 in a pool of N processes. Hashes beyond
+# PASSWORD_HASH_MAX_PENDING queued or running are refused with 503.
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))
+PASSWORD_HASH_MAX_PENDING = 32
+
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'auth.auth.CookieJWTAuthentication', 
+        'auth.auth.StatelessCookieJWTAuthentication' if JWT_STATELESS_AUTH else 'auth.auth.CookieJWTAuthentication',
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
 
@@ -145,10 +253,77 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
 
+    # orjson-backed JSON (task_manager/renderers.py); plain json when orjson isn't installed.
+    'DEFAULT_RENDERER_CLASSES': [
+        'task_manager.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'task_manager.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+
+    # Token buckets (auth/throttling.py): "N/period" allows bursts of N and
+    # refills N per period.
+    'DEFAULT_THROTTLE_RATES': {
+        'login': '10/min',  # per submitted email
+        'login_ip': '30/min',
+        'register': '5/min',
+        'refresh': '30/min',
+        'task_write': '300/min',  # per user, unsafe methods only
+    },
 }
 
+# Throttle buckets live in Redis (one Lua call per check) when REDIS_URL is
+# set, otherwise in process memory.
+THROTTLE_BACKEND = 'redis' if REDIS_URL else 'memory'
+
+# "page" (PageNumberPagination) or "cursor" (keyset on created_at, id).
+# Clients can override per request with ?pagination=.
+TASK_PAGINATION_MODE = 'page'
+
+# Build list pages straight from values_list rows instead of TaskSerializer(many=True).
+TASK_FAST_SERIALIZER = True
+
+# Largest batch accepted by /api/tasks/bulk/.
+TASK_BULK_MAX_BATCH_SIZE = 1000
+
+# Rows fetched per database round trip (and per streamed chunk) by /api/tasks/export/.
+TASK_EXPORT_CHUNK_SIZE = 2000
+
+# Rows per bulk_create / transaction for import_tasks and /api/tasks/import/.
+TASK_IMPORT_CHUNK_SIZE = 1000
+
+# Delta sync (/api/tasks/sync/): page size cap, how long deletions are
+# remembered, and how far behind now the task walk stops (keep it above the
+# longest write transaction). Run `manage.py prune_task_tombstones`
+# periodically to compact.
+TASK_SYNC_MAX_LIMIT = 1000
+TASK_SYNC_LAG_SECONDS = 5
+TASK_TOMBSTONE_RETENTION_DAYS = 30
+
+# SSE change feed (/api/tasks/events/): Redis pub/sub across processes when
+# REDIS_URL is set, otherwise an in-process broker.
+TASK_EVENTS_BROKER = 'redis' if REDIS_URL else 'inprocess'
+TASK_EVENTS_REPLAY_SIZE = 1000  # events kept for Last-Event-ID resume
+TASK_EVENTS_QUEUE_SIZE = 100  # per-connection backlog before the client is cut off
+TASK_EVENTS_HEARTBEAT = 15  # seconds
+
+# Views behind /api/tasks/ and /api/tasks/<pk>/: "sync" (DRF) or "async"
+# (ASGI-native, task_manager/async_views.py; only worth it under uvicorn).
+TASK_API_STACK = os.environ.get('TASK_API_STACK', 'sync')
+
+# Idempotency-Key on task POST and bulk writes: how long responses are
+# replayed, how long the in-flight lock lives, and how long a concurrent
+# retry waits for the first response before getting 409.
+TASK_IDEMPOTENCY_TTL = 86400
+TASK_IDEMPOTENCY_LOCK_TIMEOUT = 30
+TASK_IDEMPOTENCY_WAIT = 5
+
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -0,0 +1,17 @@
+"""
+Test runner for `manage.py test`: turns on `QUERY_BUDGET_STRICT`, so any test
+request that goes over its view's query budget fails (see tasks/queries.py).
+"""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._budget_strict = settings.QUERY_BUDGET_STRICT
+        settings.QUERY_BUDGET_STRICT = True
+
+    def teardown_test_environment(self, **kwargs):
+        settings.QUERY_BUDGET_STRICT = self._budget_strict
+        super().teardown_test_environment(**kwargs)
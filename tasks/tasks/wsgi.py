@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tasks.settings')
 
 application = get_wsgi_application()
+
+from auth.blacklist import warm_blacklist_filter  # noqa: E402  (needs the app registry)
+
+warm_blacklist_filter()